@@ -0,0 +1,49 @@
+"""Tabla incidencias_operativas
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'incidencias_operativas',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('fecha', sa.DateTime(), nullable=False),
+        sa.Column('troncal', sa.String(10)),
+        sa.Column('codigo_de_ruta', sa.String(10)),
+        sa.Column('ruta', sa.String(255)),
+        sa.Column('bus', sa.String(20)),
+        sa.Column('bus_de_cambio', sa.String(20)),
+        sa.Column('hora_programada', sa.String(20)),
+        sa.Column('hora_real', sa.String(20)),
+        sa.Column('ciclo', sa.String(20)),
+        sa.Column('hora_de_incidencia', sa.String(20)),
+        sa.Column('parada', sa.String(255)),
+        sa.Column('incidencia_primaria', sa.String(255)),
+        sa.Column('incidencia_secundaria', sa.String(255)),
+        sa.Column('codigo_de_conductor', sa.String(20)),
+        sa.Column('conductor', sa.String(255)),
+        sa.Column('operador', sa.String(255)),
+        sa.Column('observaciones', sa.Text()),
+        sa.Column('tipo_dia', sa.String(20)),
+        sa.Column('turno', sa.String(20)),
+        sa.Column('empresa', sa.String(100)),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('incidencias_operativas')
@@ -0,0 +1,32 @@
+"""Índices para los filtros y agrupaciones de /queries y /reports
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_incidencias_troncal_fecha', 'incidencias_operativas', ['troncal', 'fecha'])
+    op.create_index('ix_incidencias_empresa_fecha', 'incidencias_operativas', ['empresa', 'fecha'])
+    op.create_index('ix_incidencias_fecha_turno', 'incidencias_operativas', ['fecha', 'turno'])
+    op.create_index('ix_incidencias_incidencia_primaria', 'incidencias_operativas', ['incidencia_primaria'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_incidencias_incidencia_primaria', table_name='incidencias_operativas')
+    op.drop_index('ix_incidencias_fecha_turno', table_name='incidencias_operativas')
+    op.drop_index('ix_incidencias_empresa_fecha', table_name='incidencias_operativas')
+    op.drop_index('ix_incidencias_troncal_fecha', table_name='incidencias_operativas')
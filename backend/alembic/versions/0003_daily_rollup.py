@@ -0,0 +1,51 @@
+"""Tabla daily_rollup con conteos diarios pre-agregados
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'daily_rollup',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('turno', sa.String(20), nullable=False),
+        sa.Column('troncal', sa.String(10), nullable=False),
+        sa.Column('empresa', sa.String(100), nullable=False),
+        sa.Column('incidencia_primaria', sa.String(255), nullable=False),
+        sa.Column('tipo_dia', sa.String(20), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.UniqueConstraint(
+            'fecha', 'turno', 'troncal', 'empresa', 'incidencia_primaria', 'tipo_dia',
+            name='uq_daily_rollup_clave'
+        ),
+    )
+
+    # Backfill desde las filas existentes (las dimensiones nulas se guardan como '')
+    op.execute(
+        """
+        INSERT INTO daily_rollup (fecha, turno, troncal, empresa, incidencia_primaria, tipo_dia, total)
+        SELECT date(fecha), COALESCE(turno, ''), COALESCE(troncal, ''), COALESCE(empresa, ''),
+               COALESCE(incidencia_primaria, ''), COALESCE(tipo_dia, ''), COUNT(*)
+        FROM incidencias_operativas
+        GROUP BY 1, 2, 3, 4, 5, 6
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_rollup')
@@ -0,0 +1,26 @@
+"""Índice (fecha, id) para la paginación por clave de /queries/incidencias
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_incidencias_fecha_id', 'incidencias_operativas', ['fecha', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_incidencias_fecha_id', table_name='incidencias_operativas')
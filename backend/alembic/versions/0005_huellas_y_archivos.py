@@ -0,0 +1,88 @@
+"""Huella de fila única y registro de archivos cargados (re-cargas idempotentes)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copia fija de app.services.data_processor.calcular_huella al momento de la migración
+CAMPOS_HUELLA = ('fecha', 'bus', 'hora_programada', 'incidencia_primaria', 'codigo_de_conductor')
+
+incidencias = sa.table(
+    'incidencias_operativas',
+    sa.column('id', sa.Integer),
+    sa.column('fecha', sa.DateTime),
+    sa.column('bus', sa.String),
+    sa.column('hora_programada', sa.String),
+    sa.column('incidencia_primaria', sa.String),
+    sa.column('codigo_de_conductor', sa.String),
+    sa.column('huella', sa.String),
+)
+
+
+def calcular_huella(fila) -> str:
+    partes = []
+    for campo in CAMPOS_HUELLA:
+        valor = fila[campo]
+        if campo == 'fecha' and valor is not None:
+            valor = valor.strftime('%Y-%m-%d %H:%M:%S')
+        partes.append('' if valor is None else str(valor))
+    return hashlib.sha1('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
+
+def upgrade() -> None:
+    op.create_table(
+        'archivos_cargados',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('hash_sha256', sa.String(64), nullable=False, unique=True),
+        sa.Column('nombre', sa.String(255)),
+        sa.Column('filas_insertadas', sa.Integer(), nullable=False),
+        sa.Column('filas_duplicadas', sa.Integer(), nullable=False),
+        sa.Column('cargado', sa.DateTime(), nullable=False),
+    )
+    op.add_column('incidencias_operativas', sa.Column('huella', sa.String(40)))
+
+    # Backfill: la fila más antigua de cada huella la conserva; los duplicados ya
+    # existentes quedan con huella NULL (no se borran datos en la migración)
+    conexion = op.get_bind()
+    vistas = set()
+    pendientes = []
+    filas = conexion.execution_options(yield_per=5000).execute(
+        sa.select(incidencias).order_by(incidencias.c.id)
+    ).mappings()
+    for fila in filas:
+        huella = calcular_huella(fila)
+        if huella in vistas:
+            continue
+        vistas.add(huella)
+        pendientes.append({'fila_id': fila['id'], 'valor_huella': huella})
+
+    actualizacion = (
+        incidencias.update()
+        .where(incidencias.c.id == sa.bindparam('fila_id'))
+        .values(huella=sa.bindparam('valor_huella'))
+    )
+    for inicio in range(0, len(pendientes), 5000):
+        conexion.execute(actualizacion, pendientes[inicio:inicio + 5000])
+
+    op.create_index('ux_incidencias_huella', 'incidencias_operativas', ['huella'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_incidencias_huella', table_name='incidencias_operativas')
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        batch_op.drop_column('huella')
+    op.drop_table('archivos_cargados')
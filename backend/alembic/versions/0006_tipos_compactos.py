@@ -0,0 +1,156 @@
+"""Horas como segundos enteros y turno/tipo_dia/empresa como catálogos con FK
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# dimensión -> (tabla de catálogo, largo del nombre)
+CATALOGOS = {'turno': ('turnos', 20), 'tipo_dia': ('tipos_dia', 20), 'empresa': ('empresas', 100)}
+
+# ciclo queda como texto: en los archivos trae números de ciclo ('1', '2'), no horas
+COLUMNAS_HORA = ('hora_programada', 'hora_real', 'hora_de_incidencia')
+
+LOTE = 5000
+
+
+# Copias fijas de app.models.database.hora_a_segundos / segundos_a_hora al momento de la migración
+def hora_a_segundos(valor):
+    if valor is None:
+        return None
+    partes = str(valor).strip().split(' ')[-1].split(':')
+    if len(partes) not in (2, 3):
+        return None
+    try:
+        horas, minutos = int(partes[0]), int(partes[1])
+        segundos = int(float(partes[2])) if len(partes) == 3 else 0
+    except ValueError:
+        return None
+    if horas < 0 or not 0 <= minutos < 60 or not 0 <= segundos < 60:
+        return None
+    return horas * 3600 + minutos * 60 + segundos
+
+
+def segundos_a_hora(segundos):
+    if segundos is None:
+        return None
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+
+def _convertir_horas(conexion, origen: str, destino: str, convertir):
+    """Copia cada columna de hora de '<col><origen>' a '<col><destino>' aplicando convertir, por lotes de id"""
+    incidencias = sa.table(
+        'incidencias_operativas',
+        sa.column('id', sa.Integer),
+        *[sa.column(columna + sufijo) for columna in COLUMNAS_HORA for sufijo in (origen, destino)],
+    )
+    actualizacion = (
+        incidencias.update()
+        .where(incidencias.c.id == sa.bindparam('fila_id'))
+        .values({columna + destino: sa.bindparam('v_' + columna) for columna in COLUMNAS_HORA})
+    )
+    filas = conexion.execution_options(yield_per=LOTE).execute(
+        sa.select(incidencias.c.id, *[incidencias.c[columna + origen] for columna in COLUMNAS_HORA])
+        .where(sa.or_(*[incidencias.c[columna + origen].isnot(None) for columna in COLUMNAS_HORA]))
+    )
+    pendientes = []
+    for fila in filas:
+        pendientes.append({
+            'fila_id': fila[0],
+            **{'v_' + columna: convertir(valor) for columna, valor in zip(COLUMNAS_HORA, fila[1:])},
+        })
+        if len(pendientes) >= LOTE:
+            conexion.execute(actualizacion, pendientes)
+            pendientes = []
+    if pendientes:
+        conexion.execute(actualizacion, pendientes)
+
+
+def upgrade() -> None:
+    conexion = op.get_bind()
+
+    # Catálogos con los valores ya cargados
+    for dimension, (tabla, largo) in CATALOGOS.items():
+        op.create_table(
+            tabla,
+            # En SQLite solo INTEGER PRIMARY KEY es autoincremental
+            sa.Column('id', sa.SmallInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True, autoincrement=True),
+            sa.Column('nombre', sa.String(largo), nullable=False, unique=True),
+        )
+        op.execute(
+            f"INSERT INTO {tabla} (nombre) SELECT DISTINCT {dimension} FROM incidencias_operativas "
+            f"WHERE {dimension} IS NOT NULL"
+        )
+
+    op.drop_index('ix_incidencias_empresa_fecha', table_name='incidencias_operativas')
+    op.drop_index('ix_incidencias_fecha_turno', table_name='incidencias_operativas')
+
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        for dimension, (tabla, _) in CATALOGOS.items():
+            batch_op.add_column(sa.Column(f'{dimension}_id', sa.SmallInteger()))
+            batch_op.create_foreign_key(f'fk_incidencias_{dimension}', tabla, [f'{dimension}_id'], ['id'])
+        for columna in COLUMNAS_HORA:
+            batch_op.add_column(sa.Column(f'{columna}_seg', sa.Integer()))
+
+    for dimension, (tabla, _) in CATALOGOS.items():
+        op.execute(
+            f"UPDATE incidencias_operativas SET {dimension}_id = "
+            f"(SELECT id FROM {tabla} WHERE {tabla}.nombre = incidencias_operativas.{dimension})"
+        )
+    # Horas que no se pueden interpretar como HH:MM[:SS] quedan en NULL
+    _convertir_horas(conexion, '', '_seg', hora_a_segundos)
+
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        for dimension in CATALOGOS:
+            batch_op.drop_column(dimension)
+        for columna in COLUMNAS_HORA:
+            batch_op.drop_column(columna)
+            batch_op.alter_column(f'{columna}_seg', new_column_name=columna)
+
+    op.create_index('ix_incidencias_empresa_fecha', 'incidencias_operativas', ['empresa_id', 'fecha'])
+    op.create_index('ix_incidencias_fecha_turno', 'incidencias_operativas', ['fecha', 'turno_id'])
+
+
+def downgrade() -> None:
+    conexion = op.get_bind()
+
+    op.drop_index('ix_incidencias_empresa_fecha', table_name='incidencias_operativas')
+    op.drop_index('ix_incidencias_fecha_turno', table_name='incidencias_operativas')
+
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        for dimension, (_, largo) in CATALOGOS.items():
+            batch_op.add_column(sa.Column(dimension, sa.String(largo)))
+        for columna in COLUMNAS_HORA:
+            batch_op.add_column(sa.Column(f'{columna}_txt', sa.String(20)))
+
+    for dimension, (tabla, _) in CATALOGOS.items():
+        op.execute(
+            f"UPDATE incidencias_operativas SET {dimension} = "
+            f"(SELECT nombre FROM {tabla} WHERE {tabla}.id = incidencias_operativas.{dimension}_id)"
+        )
+    _convertir_horas(conexion, '', '_txt', segundos_a_hora)
+
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        for dimension in CATALOGOS:
+            batch_op.drop_constraint(f'fk_incidencias_{dimension}', type_='foreignkey')
+            batch_op.drop_column(f'{dimension}_id')
+        for columna in COLUMNAS_HORA:
+            batch_op.drop_column(columna)
+            batch_op.alter_column(f'{columna}_txt', new_column_name=columna)
+
+    op.create_index('ix_incidencias_empresa_fecha', 'incidencias_operativas', ['empresa', 'fecha'])
+    op.create_index('ix_incidencias_fecha_turno', 'incidencias_operativas', ['fecha', 'turno'])
+    for tabla, _ in CATALOGOS.values():
+        op.drop_table(tabla)
@@ -0,0 +1,41 @@
+"""Columna retraso_seg (hora_real - hora_programada) precalculada
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copia fija de app.services.data_processor.MEDIO_DIA_SEGUNDOS
+MEDIO_DIA = 12 * 3600
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        batch_op.add_column(sa.Column('retraso_seg', sa.Integer()))
+
+    # Las horas ya son segundos enteros (0006): el retraso se calcula en la base, con el
+    # mismo ajuste de cruce de medianoche que calcular_retraso
+    op.execute(
+        "UPDATE incidencias_operativas SET retraso_seg = CASE "
+        f"WHEN hora_real - hora_programada > {MEDIO_DIA} THEN hora_real - hora_programada - {2 * MEDIO_DIA} "
+        f"WHEN hora_real - hora_programada < -{MEDIO_DIA} THEN hora_real - hora_programada + {2 * MEDIO_DIA} "
+        "ELSE hora_real - hora_programada END "
+        "WHERE hora_real IS NOT NULL AND hora_programada IS NOT NULL"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        batch_op.drop_column('retraso_seg')
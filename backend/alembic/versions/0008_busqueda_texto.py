@@ -0,0 +1,102 @@
+"""Columna texto_busqueda e índice de texto completo (FTS5 en SQLite, GIN en PostgreSQL)
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+"""
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Copias fijas de app.services.busqueda y app.models.database
+CAMPOS_BUSQUEDA = ('incidencia_primaria', 'incidencia_secundaria', 'observaciones', 'parada', 'ruta')
+TABLA_BUSQUEDA = 'incidencias_busqueda'
+LOTE = 10000
+
+
+def normalizar_texto(texto: str) -> str:
+    descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+    return ' '.join(''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter)).split())
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        batch_op.add_column(sa.Column('texto_busqueda', sa.Text()))
+
+    # Backfill por lotes de id (la normalización sin tildes se hace en Python, sin depender de unaccent)
+    conexion = op.get_bind()
+    tabla = sa.table('incidencias_operativas', sa.column('id'), sa.column('texto_busqueda'),
+                     *[sa.column(campo) for campo in CAMPOS_BUSQUEDA])
+    actualizar = (
+        sa.update(tabla).where(tabla.c.id == sa.bindparam('b_id'))
+        .values(texto_busqueda=sa.bindparam('b_texto'))
+    )
+    ultimo = 0
+    while True:
+        filas = conexion.execute(
+            sa.select(tabla.c.id, *[tabla.c[campo] for campo in CAMPOS_BUSQUEDA])
+            .where(tabla.c.id > ultimo).order_by(tabla.c.id).limit(LOTE)
+        ).all()
+        if not filas:
+            break
+        registros = []
+        for fila in filas:
+            texto = ' '.join(
+                normalizar_texto(str(valor)) for valor in fila[1:] if valor is not None and str(valor).strip()
+            )
+            if texto:
+                registros.append({'b_id': fila[0], 'b_texto': texto})
+        if registros:
+            conexion.execute(actualizar, registros)
+        ultimo = filas[-1][0]
+
+    if conexion.dialect.name == 'sqlite':
+        op.execute(
+            f"CREATE VIRTUAL TABLE {TABLA_BUSQUEDA} USING fts5(texto_busqueda, content='incidencias_operativas', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            f"CREATE TRIGGER tr_incidencias_busqueda_ai AFTER INSERT ON incidencias_operativas BEGIN "
+            f"INSERT INTO {TABLA_BUSQUEDA}(rowid, texto_busqueda) VALUES (new.id, new.texto_busqueda); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER tr_incidencias_busqueda_ad AFTER DELETE ON incidencias_operativas BEGIN "
+            f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}, rowid, texto_busqueda) "
+            "VALUES ('delete', old.id, old.texto_busqueda); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER tr_incidencias_busqueda_au AFTER UPDATE OF texto_busqueda ON incidencias_operativas BEGIN "
+            f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}, rowid, texto_busqueda) "
+            "VALUES ('delete', old.id, old.texto_busqueda); "
+            f"INSERT INTO {TABLA_BUSQUEDA}(rowid, texto_busqueda) VALUES (new.id, new.texto_busqueda); END"
+        )
+        # Índice inicial desde la tabla de contenido
+        op.execute(f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}) VALUES ('rebuild')")
+    elif conexion.dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_incidencias_busqueda ON incidencias_operativas "
+            "USING gin (to_tsvector('spanish'::regconfig, texto_busqueda))"
+        )
+
+
+def downgrade() -> None:
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'sqlite':
+        for trigger in ('ai', 'ad', 'au'):
+            op.execute(f"DROP TRIGGER IF EXISTS tr_incidencias_busqueda_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {TABLA_BUSQUEDA}")
+    elif dialecto == 'postgresql':
+        op.drop_index('ix_incidencias_busqueda', table_name='incidencias_operativas')
+
+    with op.batch_alter_table('incidencias_operativas') as batch_op:
+        batch_op.drop_column('texto_busqueda')
@@ -0,0 +1,39 @@
+"""Tabla incidencias_rechazadas: filas que no pasan la validación de ingesta
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'incidencias_rechazadas',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('hash_sha256', sa.String(64)),
+        sa.Column('archivo', sa.String(255)),
+        sa.Column('hoja', sa.String(100)),
+        sa.Column('fila', sa.Integer()),
+        sa.Column('motivos', sa.String(255), nullable=False),
+        sa.Column('columnas', sa.String(255)),
+        sa.Column('datos', sa.Text()),
+        sa.Column('rechazada', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_rechazadas_hash', 'incidencias_rechazadas', ['hash_sha256'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rechazadas_hash', table_name='incidencias_rechazadas')
+    op.drop_table('incidencias_rechazadas')
@@ -0,0 +1,46 @@
+"""Tabla calendario: dimensión de fechas con semana ISO, mes, trimestre y feriados de Ecuador
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+
+Las filas las agrega la aplicación (años con datos al iniciar y en cada carga); para corregir el
+tipo_dia de las incidencias ya cargadas: python -m app.cli calendario
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'calendario',
+        sa.Column('fecha', sa.Date(), primary_key=True),
+        sa.Column('anio', sa.SmallInteger(), nullable=False),
+        sa.Column('trimestre', sa.SmallInteger(), nullable=False),
+        sa.Column('mes', sa.SmallInteger(), nullable=False),
+        sa.Column('dia_semana', sa.SmallInteger(), nullable=False),
+        sa.Column('anio_iso', sa.SmallInteger(), nullable=False),
+        sa.Column('semana_iso', sa.SmallInteger(), nullable=False),
+        sa.Column('inicio_semana', sa.Date(), nullable=False),
+        sa.Column('inicio_mes', sa.Date(), nullable=False),
+        sa.Column('inicio_trimestre', sa.Date(), nullable=False),
+        sa.Column('tipo_dia', sa.String(20), nullable=False),
+        sa.Column('festivo', sa.String(100)),
+        sa.Column('laborable', sa.Boolean(), nullable=False),
+    )
+    op.create_index('ix_calendario_anio_mes', 'calendario', ['anio', 'mes'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_calendario_anio_mes', table_name='calendario')
+    op.drop_table('calendario')
@@ -0,0 +1,118 @@
+"""Códigos y huellas en forma canónica (Bus 1234.0 de .xls = 1234 de .xlsx)
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+
+Las cargas leídas con pandas guardaban '1234.0' en bus/bus_de_cambio/codigo_de_conductor cuando la
+columna tenía vacíos, y su huella no coincidía con la de la misma fila leída desde .xlsx. Se reescriben
+esos códigos y la huella de las filas afectadas; si dos filas quedan con la misma huella, la más antigua
+la conserva y las demás quedan con huella NULL (igual que en 0005, no se borran datos).
+
+"""
+import hashlib
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOTE = 5000
+
+# Copias fijas de app.services.data_processor al momento de la migración
+CAMPOS_HUELLA = ('fecha', 'bus', 'hora_programada', 'incidencia_primaria', 'codigo_de_conductor')
+CAMPOS_CODIGO = ('bus', 'bus_de_cambio', 'codigo_de_conductor')
+_TEXTO_FLOAT_ENTERO = re.compile(r'-?\d+\.0+')
+
+incidencias = sa.table(
+    'incidencias_operativas',
+    sa.column('id', sa.Integer),
+    sa.column('fecha', sa.DateTime),
+    sa.column('bus', sa.String),
+    sa.column('bus_de_cambio', sa.String),
+    sa.column('hora_programada', sa.Integer),
+    sa.column('incidencia_primaria', sa.String),
+    sa.column('codigo_de_conductor', sa.String),
+    sa.column('huella', sa.String),
+)
+
+
+def valor_canonico(valor):
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        return str(int(valor)) if valor.is_integer() else str(valor)
+    texto = str(valor).strip()
+    if _TEXTO_FLOAT_ENTERO.fullmatch(texto):
+        texto = texto.split('.')[0]
+    return texto or None
+
+
+def calcular_huella(fila) -> str:
+    partes = []
+    for campo in CAMPOS_HUELLA:
+        valor = fila[campo]
+        if campo == 'fecha' and valor is not None:
+            valor = valor.strftime('%Y-%m-%d %H:%M:%S')
+        elif campo == 'hora_programada' and valor is not None:
+            # Guardada en segundos desde 0006; la huella usa 'HH:MM:SS'
+            valor = f"{valor // 3600:02d}:{valor % 3600 // 60:02d}:{valor % 60:02d}"
+        else:
+            valor = valor_canonico(valor)
+        partes.append('' if valor is None else valor)
+    return hashlib.sha1('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
+
+def upgrade() -> None:
+    conexion = op.get_bind()
+    vistas = set()
+    pendientes = []
+    filas = conexion.execution_options(yield_per=LOTE).execute(
+        sa.select(incidencias).order_by(incidencias.c.id)
+    ).mappings()
+    for fila in filas:
+        canonica = {**fila, **{campo: valor_canonico(fila[campo]) for campo in CAMPOS_CODIGO}}
+        cambia = any(canonica[campo] != fila[campo] for campo in CAMPOS_CODIGO) or (
+            fila['incidencia_primaria'] is not None
+            and valor_canonico(fila['incidencia_primaria']) != fila['incidencia_primaria']
+        )
+        # Solo se recalcula la huella de las filas afectadas; las duplicadas de 0005 siguen sin huella
+        huella = calcular_huella(canonica) if cambia and fila['huella'] is not None else fila['huella']
+        if huella is not None and huella in vistas:
+            huella = None
+        if huella is not None:
+            vistas.add(huella)
+        if cambia or huella != fila['huella']:
+            pendientes.append({
+                'fila_id': fila['id'],
+                'valor_huella': huella,
+                **{'v_' + campo: canonica[campo] for campo in CAMPOS_CODIGO},
+            })
+    if not pendientes:
+        return
+
+    actualizacion = (
+        incidencias.update()
+        .where(incidencias.c.id == sa.bindparam('fila_id'))
+        .values(
+            huella=sa.bindparam('valor_huella'),
+            **{campo: sa.bindparam('v_' + campo) for campo in CAMPOS_CODIGO},
+        )
+    )
+    # Sin el índice único mientras se reescriben: una huella nueva puede ser la vieja de otra fila
+    op.drop_index('ux_incidencias_huella', table_name='incidencias_operativas')
+    for inicio in range(0, len(pendientes), LOTE):
+        conexion.execute(actualizacion, pendientes[inicio:inicio + LOTE])
+    op.create_index('ux_incidencias_huella', 'incidencias_operativas', ['huella'], unique=True)
+
+
+def downgrade() -> None:
+    # Los códigos y huellas canónicos siguen siendo válidos con el código anterior
+    pass
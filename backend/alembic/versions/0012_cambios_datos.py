@@ -0,0 +1,33 @@
+"""Tabla cambios_datos: registro compartido de cargas y reprocesos para invalidar cachés entre procesos
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'cambios_datos',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('tipo', sa.String(20), nullable=False),
+        sa.Column('desde', sa.Date()),
+        sa.Column('hasta', sa.Date()),
+        sa.Column('registrado', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('cambios_datos')
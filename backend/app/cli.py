@@ -0,0 +1,144 @@
+"""
+Comandos de mantenimiento del backend.
+
+Uso (desde backend/):
+    python -m app.cli rollup-reconstruir [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+    python -m app.cli rollup-verificar [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+    python -m app.cli ingesta-lote RUTA [RUTA ...] [--procesos N]
+    python -m app.cli reprocesar [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD]
+    python -m app.cli calendario [--desde YYYY-MM-DD] [--hasta YYYY-MM-DD] [--regenerar]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from app.models.database import Database, db
+from app.utils.logger import setup_logger
+
+def fecha_argumento(valor: str):
+    """Convierte un argumento YYYY-MM-DD en date"""
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+def agregar_rango(subparser: argparse.ArgumentParser):
+    subparser.add_argument('--desde', type=fecha_argumento, help='Fecha inicial (YYYY-MM-DD)')
+    subparser.add_argument('--hasta', type=fecha_argumento, help='Fecha final incluida (YYYY-MM-DD)')
+
+def rollup_reconstruir(db: Database, opciones) -> int:
+    from app.services.rollup import RollupService
+
+    from app.services.cambios import ROLLUP, registrar_cambio
+
+    claves = RollupService(db.engine).reconstruir(opciones.desde, opciones.hasta)
+    # Los reportes cacheados por la API se invalidan en su próxima consulta
+    registrar_cambio(
+        db.engine, ROLLUP, (opciones.desde, opciones.hasta) if opciones.desde and opciones.hasta else None
+    )
+    print(f"daily_rollup reconstruido: {claves} claves")
+    return 0
+
+def rollup_verificar(db: Database, opciones) -> int:
+    from app.services.rollup import RollupService
+
+    resultado = RollupService(db.engine).verificar_consistencia(opciones.desde, opciones.hasta)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2, default=str))
+    return 0 if resultado['consistente'] else 1
+
+def rutas_excel(rutas, directorio_temporal: str):
+    """Expande directorios y zips en la lista ordenada de (nombre, ruta, sha256, temporal)"""
+    from app.utils.archivos import EXTENSIONES_EXCEL, expandir_zip, hash_archivo
+
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            contenido = sorted(os.listdir(ruta))
+            archivos.extend(rutas_excel(
+                [os.path.join(ruta, nombre) for nombre in contenido
+                 if nombre.lower().endswith(EXTENSIONES_EXCEL + ('.zip',)) and not nombre.startswith('~$')],
+                directorio_temporal
+            ))
+        elif ruta.lower().endswith('.zip'):
+            archivos.extend(
+                (f"{ruta}/{nombre}", destino, hash_sha256, True)
+                for nombre, destino, hash_sha256 in expandir_zip(ruta, directorio_temporal)
+            )
+        else:
+            archivos.append((ruta, ruta, hash_archivo(ruta), False))
+    return archivos
+
+def ingesta_lote(db: Database, opciones) -> int:
+    from app.services.ingestion_jobs import ArchivoIngesta, IngestionJobManager
+
+    directorio = tempfile.mkdtemp(prefix='ingesta_lote_')
+    archivos = [
+        ArchivoIngesta(nombre, ruta, hash_sha256, temporal)
+        for nombre, ruta, hash_sha256, temporal in rutas_excel(opciones.rutas, directorio)
+    ]
+    if not archivos:
+        print("No se encontraron archivos Excel")
+        return 1
+
+    manager = IngestionJobManager(db.engine, procesos=opciones.procesos)
+    try:
+        job = manager.encolar_lote(f"lote de {len(archivos)} archivos", archivos, directorio_temporal=directorio)
+        resultado = manager.esperar(job.id)
+    finally:
+        manager.cerrar()
+    print(json.dumps(resultado, ensure_ascii=False, indent=2, default=str))
+    return 1 if resultado['estado'] == 'error' else 0
+
+def reprocesar(db: Database, opciones) -> int:
+    from app.services.reproceso import ReprocesadorDerivados
+
+    resumen = ReprocesadorDerivados(db.engine).reprocesar(opciones.desde, opciones.hasta)
+    print(json.dumps(resumen, ensure_ascii=False, indent=2, default=str))
+    return 0
+
+def calendario(db: Database, opciones) -> int:
+    from app.services.reproceso import ReprocesadorDerivados
+
+    resumen = ReprocesadorDerivados(db.engine).reclasificar_tipo_dia(
+        opciones.desde, opciones.hasta, opciones.regenerar
+    )
+    print(json.dumps(resumen, ensure_ascii=False, indent=2, default=str))
+    return 0
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    reconstruir = comandos.add_parser('rollup-reconstruir', help='Recalcula daily_rollup desde las filas crudas')
+    agregar_rango(reconstruir)
+    reconstruir.set_defaults(funcion=rollup_reconstruir)
+
+    verificar = comandos.add_parser('rollup-verificar', help='Compara daily_rollup contra las filas crudas')
+    agregar_rango(verificar)
+    verificar.set_defaults(funcion=rollup_verificar)
+
+    lote = comandos.add_parser('ingesta-lote', help='Importa archivos Excel, directorios o zips en paralelo')
+    lote.add_argument('rutas', nargs='+', help='Archivos .xlsx/.xls, directorios o .zip')
+    lote.add_argument('--procesos', type=int, help='Procesos de parseo (por defecto INGESTA_PROCESOS)')
+    lote.set_defaults(funcion=ingesta_lote)
+
+    reproceso = comandos.add_parser(
+        'reprocesar', help='Recalcula tipo_dia, turno y empresa desde el staging Parquet (sin leer Excel)'
+    )
+    agregar_rango(reproceso)
+    reproceso.set_defaults(funcion=reprocesar)
+
+    dias = comandos.add_parser(
+        'calendario', help='Recalcula tipo_dia (feriados incluidos) desde la tabla calendario, sin staging'
+    )
+    agregar_rango(dias)
+    dias.add_argument('--regenerar', action='store_true', help='Reescribe antes los años del calendario')
+    dias.set_defaults(funcion=calendario)
+
+    opciones = parser.parse_args(argv)
+    setup_logger()
+    db.create_tables()
+    return opciones.funcion(db, opciones)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,10 +9,54 @@ class Settings:
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./incidencias.db")
+    # URL con driver async (aiosqlite/asyncpg); si no se define se deriva de DATABASE_URL
+    DATABASE_URL_ASYNC: str = os.getenv("DATABASE_URL_ASYNC", "")
+    
+    # Pool de conexiones (compartido por toda la aplicación)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: int = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
     
     # File upload
     UPLOAD_DIR: str = "uploads"
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
+    
+    # Staging Parquet de cada archivo cargado (requiere pyarrow)
+    STAGING_PARQUET: bool = os.getenv("STAGING_PARQUET", "true").lower() == "true"
+    STAGING_DIR: str = os.path.join(UPLOAD_DIR, "staging")
+    STAGING_COMPRESION: str = os.getenv("STAGING_COMPRESION", "zstd")
+
+    # Ingesta masiva
+    INSERT_CHUNK_SIZE: int = int(os.getenv("INSERT_CHUNK_SIZE", "5000"))
+    USAR_COPY_POSTGRES: bool = os.getenv("USAR_COPY_POSTGRES", "true").lower() == "true"
+    INGESTA_PROCESOS: int = int(os.getenv("INGESTA_PROCESOS", str(os.cpu_count() or 1)))
+    INGESTA_LOTES_EN_COLA: int = int(os.getenv("INGESTA_LOTES_EN_COLA", "4"))
+    # Trabajos terminados que se conservan en memoria para /upload/jobs/{id}: por antigüedad y cantidad
+    INGESTA_JOBS_RETENCION_SEGUNDOS: int = int(os.getenv("INGESTA_JOBS_RETENCION_SEGUNDOS", "3600"))
+    INGESTA_JOBS_MAXIMO: int = int(os.getenv("INGESTA_JOBS_MAXIMO", "200"))
+
+    # Caché de respuestas de reportes
+    CACHE_HABILITADO: bool = os.getenv("CACHE_HABILITADO", "true").lower() == "true"
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memoria")  # memoria | redis
+    CACHE_REDIS_URL: str = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_TTL_SEGUNDOS: int = int(os.getenv("CACHE_TTL_SEGUNDOS", "300"))
+    CACHE_MAX_ENTRADAS: int = int(os.getenv("CACHE_MAX_ENTRADAS", "1024"))
+    # Cada cuánto se leen los cambios de otros procesos (cargas por CLI, reprocesos) en cambios_datos
+    CACHE_SINCRONIZACION_SEGUNDOS: float = float(os.getenv("CACHE_SINCRONIZACION_SEGUNDOS", "1"))
+
+    # Almacén columnar en memoria para /reports/pivot
+    ANALITICA_HABILITADA: bool = os.getenv("ANALITICA_HABILITADA", "true").lower() == "true"
+    ANALITICA_LOTE_CARGA: int = int(os.getenv("ANALITICA_LOTE_CARGA", "100000"))
+
+    # Middleware de latencia/SQL y endpoint /metrics (formato Prometheus)
+    METRICAS_HABILITADAS: bool = os.getenv("METRICAS_HABILITADAS", "true").lower() == "true"
+
+    # Feriados de Ecuador (tabla calendario): la regla de traslado de la LOSEP se puede desactivar
+    # y FESTIVOS_ADICIONALES corrige los años con decretos propios ('YYYY-MM-DD' -> nombre; None anula el día)
+    FESTIVOS_TRASLADO: bool = os.getenv("FESTIVOS_TRASLADO", "true").lower() == "true"
+    FESTIVOS_ADICIONALES: dict = {}
 
     EMPRESAS_MAPPING: dict = {
         'lmera@consorciostg.com.ec': 'STG',
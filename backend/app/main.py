@@ -1,36 +1,45 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import logging
 
-from app.models.database import Database
-from app.routes.upload import router as upload_router
+from app.models.database import db
+from app.routes.upload import router as upload_router, job_manager
 from app.routes.queries import router as queries_router
 from app.routes.reports import router as reports_router
+from app.config import settings
 from app.middleware.error_handler import global_error_handler
+from app.middleware.metricas import medir_peticiones
+from app.services.calendario import calendario_de
+from app.services.metricas import registrar_eventos_sql, registro_metricas
 from app.utils.logger import setup_logger
+from app.utils.serializacion import RespuestaJSON
 
 # Configurar logging
 logger = setup_logger()
 
-# Inicializar base de datos
-db = Database()
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     db.create_tables()
     logger.info("Tablas de base de datos creadas/verificadas")
+    # Años del calendario para los datos existentes (las cargas agregan los que falten)
+    calendario_de(db.engine).asegurar_datos()
     logger.info("Aplicación iniciada correctamente")
     yield
     # Shutdown
+    job_manager.cerrar()
+    await db.cerrar()
     logger.info("Aplicación cerrada")
 
 app = FastAPI(
     title="Sistema de Incidencias Operativas Metrovia",
     description="API para la gestión y consulta de incidencias operativas del Sistema Metrovia",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson para todas las respuestas; los listados y reportes grandes la devuelven directamente
+    default_response_class=RespuestaJSON
 )
 
 # Configurar CORS
@@ -45,6 +54,11 @@ app.add_middleware(
 # Agregar middleware de manejo de errores
 app.middleware("http")(global_error_handler)
 
+# Métricas de latencia y SQL por petición (middleware externo: ve el estado final de la respuesta)
+if settings.METRICAS_HABILITADAS:
+    registrar_eventos_sql()
+    app.middleware("http")(medir_peticiones)
+
 # Incluir routers - VERIFICAR QUE ESTÉN ESTAS LÍNEAS
 app.include_router(upload_router, prefix="/api/v1")
 app.include_router(queries_router, prefix="/api/v1")
@@ -54,6 +68,11 @@ app.include_router(reports_router, prefix="/api/v1")
 async def root():
     return {"message": "Sistema de Incidencias Operativas Metrovia"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Métricas del proceso en formato de texto de Prometheus"""
+    return PlainTextResponse(registro_metricas.exponer(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": "2024-01-01T00:00:00Z"}
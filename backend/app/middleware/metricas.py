@@ -0,0 +1,40 @@
+from fastapi import Request
+import time
+
+from app.services.metricas import (
+    HTTP_CONSULTAS_SQL, HTTP_SEGUNDOS, HTTP_SQL_SEGUNDOS, ConsultasPeticion, consultas_peticion
+)
+
+# Peticiones que no coinciden con ninguna ruta comparten etiqueta (evita una serie por URL)
+SIN_RUTA = 'sin_ruta'
+
+def plantilla_ruta(request: Request) -> str:
+    """Ruta declarada (p. ej. /api/v1/upload/jobs/{job_id}) del endpoint que atendió la petición"""
+    endpoint = request.scope.get('endpoint')
+    if endpoint is None:
+        return SIN_RUTA
+    rutas = getattr(request.app.state, 'rutas_por_endpoint', None)
+    if rutas is None:
+        rutas = request.app.state.rutas_por_endpoint = {
+            ruta.endpoint: ruta.path for ruta in request.app.routes if hasattr(ruta, 'endpoint')
+        }
+    return rutas.get(endpoint, SIN_RUTA)
+
+async def medir_peticiones(request: Request, call_next):
+    """Latencia por ruta, método y estado, y consultas SQL de la petición"""
+    acumulado = ConsultasPeticion()
+    token = consultas_peticion.set(acumulado)
+    inicio = time.perf_counter()
+    estado = 500
+    try:
+        response = await call_next(request)
+        estado = response.status_code
+        return response
+    finally:
+        # Las respuestas en streaming se miden hasta que empiezan a enviarse
+        segundos = time.perf_counter() - inicio
+        consultas_peticion.reset(token)
+        ruta = plantilla_ruta(request)
+        HTTP_SEGUNDOS.observar(segundos, metodo=request.method, ruta=ruta, estado=estado)
+        HTTP_CONSULTAS_SQL.observar(acumulado.consultas, ruta=ruta)
+        HTTP_SQL_SEGUNDOS.observar(acumulado.segundos, ruta=ruta)
@@ -1,10 +1,91 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from datetime import time, timedelta
+from sqlalchemy import (
+    create_engine, event, select, Boolean, Column, DDL, ForeignKey, Integer, SmallInteger, String, Date, DateTime, Text,
+    Index, UniqueConstraint,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import column_property, sessionmaker, Session
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 
 Base = declarative_base()
 
+def hora_a_segundos(valor):
+    """Parses 'HH:MM[:SS]' (optionally after a date), time or timedelta into seconds; None if unparsable."""
+    if valor is None:
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, time):
+        return valor.hour * 3600 + valor.minute * 60 + valor.second
+    if isinstance(valor, timedelta):
+        return int(valor.total_seconds())
+    partes = str(valor).strip().split(' ')[-1].split(':')
+    if len(partes) not in (2, 3):
+        return None
+    try:
+        horas, minutos = int(partes[0]), int(partes[1])
+        segundos = int(float(partes[2])) if len(partes) == 3 else 0
+    except ValueError:
+        return None
+    if horas < 0 or not 0 <= minutos < 60 or not 0 <= segundos < 60:
+        return None
+    return horas * 3600 + minutos * 60 + segundos
+
+def segundos_a_hora(segundos):
+    """Formats seconds as 'HH:MM:SS' (hours may exceed 23 for durations)."""
+    if segundos is None:
+        return None
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+class HoraSegundos(TypeDecorator):
+    """Time of day or duration stored as integer seconds, exchanged as 'HH:MM:SS' strings."""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return hora_a_segundos(value)
+
+    def process_result_value(self, value, dialect):
+        return segundos_a_hora(value)
+
+# SMALLINT keys; SQLite only autoincrements an INTEGER PRIMARY KEY (rowid alias)
+IdCatalogo = SmallInteger().with_variant(Integer(), 'sqlite')
+
+class Turno(Base):
+    """Shift lookup (Mañana, Tarde, Noche, No definido)."""
+    __tablename__ = 'turnos'
+
+    id = Column(IdCatalogo, primary_key=True, autoincrement=True)
+    nombre = Column(String(20), nullable=False, unique=True)
+
+class TipoDia(Base):
+    """Day type lookup (Laboral, Fin de semana, Festivo, No definido)."""
+    __tablename__ = 'tipos_dia'
+
+    id = Column(IdCatalogo, primary_key=True, autoincrement=True)
+    nombre = Column(String(20), nullable=False, unique=True)
+
+class Empresa(Base):
+    """Operator company lookup, derived from the operator's email."""
+    __tablename__ = 'empresas'
+
+    id = Column(IdCatalogo, primary_key=True, autoincrement=True)
+    nombre = Column(String(100), nullable=False, unique=True)
+
+# Low-cardinality dimensions stored as FK ids: name -> lookup model (column '<name>_id')
+CATALOGOS = {'turno': Turno, 'tipo_dia': TipoDia, 'empresa': Empresa}
+
+def nombre_catalogo(catalogo, columna_id, etiqueta: str):
+    """Correlated lookup of a dimension name, so queries keep selecting/filtering by name."""
+    return (
+        select(catalogo.nombre).where(catalogo.id == columna_id)
+        .correlate_except(catalogo).scalar_subquery().label(etiqueta)
+    )
+
 class IncidenciaOperativa(Base):
     """Represents an operational incident."""
     __tablename__ = 'incidencias_operativas'
@@ -16,10 +97,11 @@ class IncidenciaOperativa(Base):
     ruta = Column(String(255))
     bus = Column(String(20))
     bus_de_cambio = Column(String(20))
-    hora_programada = Column(String(20))
-    hora_real = Column(String(20))
-    ciclo = Column(String(20))
-    hora_de_incidencia = Column(String(20))
+    # Times as integer seconds (see alembic 0006); read back as 'HH:MM:SS'
+    hora_programada = Column(HoraSegundos)
+    hora_real = Column(HoraSegundos)
+    ciclo = Column(String(20))  # cycle number in the source files, not a time
+    hora_de_incidencia = Column(HoraSegundos)
     parada = Column(String(255))
     incidencia_primaria = Column(String(255))
     incidencia_secundaria = Column(String(255))
@@ -28,17 +110,205 @@ class IncidenciaOperativa(Base):
     operador = Column(String(255))
     observaciones = Column(Text)
     
-    # Derived fields for analysis
-    tipo_dia = Column(String(20))  # Laboral, Fin de semana, Festivo
-    turno = Column(String(20))     # Mañana, Tarde, Noche
-    empresa = Column(String(100))  # Extracted from operator's email
+    # Derived fields for analysis, as lookup ids (see alembic 0006)
+    tipo_dia_id = Column(SmallInteger, ForeignKey('tipos_dia.id', name='fk_incidencias_tipo_dia'))  # Laboral, Fin de semana, Festivo
+    turno_id = Column(SmallInteger, ForeignKey('turnos.id', name='fk_incidencias_turno'))           # Mañana, Tarde, Noche
+    empresa_id = Column(SmallInteger, ForeignKey('empresas.id', name='fk_incidencias_empresa'))     # Extracted from operator's email
+    
+    # hora_real - hora_programada in seconds, negative when early (see app.services.data_processor.calcular_retraso)
+    retraso_seg = Column(Integer)
+    
+    # Row fingerprint for idempotent re-uploads (see app.services.data_processor.calcular_huella)
+    huella = Column(String(40))
+    
+    # Lowercased, accent-free text fields for full-text search (see app.services.busqueda)
+    texto_busqueda = Column(Text)
+    
+    # Indexes matching the /queries and /reports access paths (see alembic 0002)
+    __table_args__ = (
+        Index('ix_incidencias_troncal_fecha', 'troncal', 'fecha'),
+        Index('ix_incidencias_empresa_fecha', 'empresa_id', 'fecha'),
+        Index('ix_incidencias_fecha_turno', 'fecha', 'turno_id'),
+        Index('ix_incidencias_incidencia_primaria', 'incidencia_primaria'),
+        # Keyset pagination order for /queries/incidencias (see alembic 0004)
+        Index('ix_incidencias_fecha_id', 'fecha', 'id'),
+        # Overlapping uploads skip rows already stored (see alembic 0005)
+        Index('ux_incidencias_huella', 'huella', unique=True),
+    )
+
+# Read-only names of the lookup dimensions, so ORM queries and API responses keep tipo_dia/turno/empresa
+IncidenciaOperativa.tipo_dia = column_property(nombre_catalogo(TipoDia, IncidenciaOperativa.tipo_dia_id, 'tipo_dia'))
+IncidenciaOperativa.turno = column_property(nombre_catalogo(Turno, IncidenciaOperativa.turno_id, 'turno'))
+IncidenciaOperativa.empresa = column_property(nombre_catalogo(Empresa, IncidenciaOperativa.empresa_id, 'empresa'))
+
+# Full-text index over texto_busqueda (see alembic 0008): an FTS5 external-content table kept in sync
+# by triggers on SQLite, a GIN expression index on PostgreSQL
+TABLA_BUSQUEDA = 'incidencias_busqueda'
+DDL_BUSQUEDA = {
+    'sqlite': (
+        f"CREATE VIRTUAL TABLE {TABLA_BUSQUEDA} USING fts5(texto_busqueda, content='incidencias_operativas', "
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER tr_incidencias_busqueda_ai AFTER INSERT ON incidencias_operativas BEGIN "
+        f"INSERT INTO {TABLA_BUSQUEDA}(rowid, texto_busqueda) VALUES (new.id, new.texto_busqueda); END",
+        f"CREATE TRIGGER tr_incidencias_busqueda_ad AFTER DELETE ON incidencias_operativas BEGIN "
+        f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}, rowid, texto_busqueda) "
+        "VALUES ('delete', old.id, old.texto_busqueda); END",
+        f"CREATE TRIGGER tr_incidencias_busqueda_au AFTER UPDATE OF texto_busqueda ON incidencias_operativas BEGIN "
+        f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}, rowid, texto_busqueda) "
+        "VALUES ('delete', old.id, old.texto_busqueda); "
+        f"INSERT INTO {TABLA_BUSQUEDA}(rowid, texto_busqueda) VALUES (new.id, new.texto_busqueda); END",
+    ),
+    'postgresql': (
+        "CREATE INDEX ix_incidencias_busqueda ON incidencias_operativas "
+        "USING gin (to_tsvector('spanish'::regconfig, texto_busqueda))",
+    ),
+}
+for dialecto, sentencias in DDL_BUSQUEDA.items():
+    for sentencia in sentencias:
+        event.listen(IncidenciaOperativa.__table__, 'after_create', DDL(sentencia).execute_if(dialect=dialecto))
+event.listen(
+    IncidenciaOperativa.__table__, 'after_drop',
+    DDL(f"DROP TABLE IF EXISTS {TABLA_BUSQUEDA}").execute_if(dialect='sqlite')
+)
+
+class ArchivoCargado(Base):
+    """An uploaded file, by content hash, so identical re-uploads are skipped."""
+    __tablename__ = 'archivos_cargados'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash_sha256 = Column(String(64), nullable=False, unique=True)
+    nombre = Column(String(255))
+    filas_insertadas = Column(Integer, nullable=False, default=0)
+    filas_duplicadas = Column(Integer, nullable=False, default=0)
+    cargado = Column(DateTime, nullable=False)
+
+class IncidenciaRechazada(Base):
+    """A source row rejected at ingest, kept with its reason codes for review (see app.services.validacion)."""
+    __tablename__ = 'incidencias_rechazadas'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    hash_sha256 = Column(String(64))  # source file; a re-upload replaces its previous rejections
+    archivo = Column(String(255))
+    hoja = Column(String(100))
+    fila = Column(Integer)  # row number in the sheet (the header is row 1)
+    motivos = Column(String(255), nullable=False)  # comma-separated reason codes
+    columnas = Column(String(255))  # columns that failed validation
+    datos = Column(Text)  # source values as JSON
+    rechazada = Column(DateTime, nullable=False)
+    
+    __table_args__ = (
+        Index('ix_rechazadas_hash', 'hash_sha256'),
+    )
+
+class ResumenDiario(Base):
+    """Daily incident counts per dimension combination, maintained at ingest."""
+    __tablename__ = 'daily_rollup'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    fecha = Column(Date, nullable=False)
+    turno = Column(String(20), nullable=False)
+    troncal = Column(String(10), nullable=False)
+    empresa = Column(String(100), nullable=False)
+    incidencia_primaria = Column(String(255), nullable=False)
+    tipo_dia = Column(String(20), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    
+    # NULL dimensions are stored as '' so the key stays unique (see app.services.rollup)
+    __table_args__ = (
+        UniqueConstraint(
+            'fecha', 'turno', 'troncal', 'empresa', 'incidencia_primaria', 'tipo_dia',
+            name='uq_daily_rollup_clave'
+        ),
+    )
+
+class Calendario(Base):
+    """Calendar dimension: one row per day with ISO week, month, quarter and Ecuadorian holidays.
+
+    Whole years are added on demand (see app.services.calendario); reports join daily_rollup on fecha.
+    """
+    __tablename__ = 'calendario'
+    
+    fecha = Column(Date, primary_key=True)
+    anio = Column(SmallInteger, nullable=False)
+    trimestre = Column(SmallInteger, nullable=False)
+    mes = Column(SmallInteger, nullable=False)
+    dia_semana = Column(SmallInteger, nullable=False)  # ISO: 1=Monday ... 7=Sunday
+    anio_iso = Column(SmallInteger, nullable=False)
+    semana_iso = Column(SmallInteger, nullable=False)
+    # First day of the period each day belongs to, for trend buckets
+    inicio_semana = Column(Date, nullable=False)
+    inicio_mes = Column(Date, nullable=False)
+    inicio_trimestre = Column(Date, nullable=False)
+    tipo_dia = Column(String(20), nullable=False)  # Laboral, Fin de semana, Festivo
+    festivo = Column(String(100))  # holiday name(s), NULL on regular days
+    laborable = Column(Boolean, nullable=False)  # Monday to Friday and not a holiday
+    
+    __table_args__ = (
+        Index('ix_calendario_anio_mes', 'anio', 'mes'),
+    )
+
+class CambioDatos(Base):
+    """Shared change log: each ingest, reprocess or rollup rebuild appends the date range it touched.
+
+    Every process (API workers, CLI) compares the last id it applied before serving cached reports or
+    the columnar store (see app.services.cambios).
+    """
+    __tablename__ = 'cambios_datos'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(20), nullable=False)  # ingesta, reescritura, rollup
+    desde = Column(Date)  # NULL range = every date
+    hasta = Column(Date)
+    registrado = Column(DateTime, nullable=False)
+
+# Async drivers used for each sync dialect when DATABASE_URL_ASYNC is not set
+DRIVERS_ASYNC = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+def url_async(url: str) -> str:
+    """Derives the async driver URL from a sync database URL."""
+    url = make_url(url)
+    return url.set(drivername=DRIVERS_ASYNC.get(url.get_backend_name(), url.drivername)).render_as_string(hide_password=False)
+
+def opciones_pool(url: str) -> dict:
+    """Pool settings from config; in-memory SQLite keeps its single-connection pool."""
+    opciones = {'pool_pre_ping': settings.DB_POOL_PRE_PING}
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return opciones
+    opciones.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return opciones
 
 class Database:
     """Handles database connections and sessions."""
-    def __init__(self):
+    def __init__(self, url: str = None):
         """Initializes the database engine and session factory."""
-        self.engine = create_engine(settings.DATABASE_URL)
+        self.url = url or settings.DATABASE_URL
+        self.engine = create_engine(self.url, **opciones_pool(self.url))
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self._async_engine = None
+        self._AsyncSessionLocal = None
+    
+    @property
+    def async_engine(self):
+        """Async engine, created on first use so sync-only processes don't need the async driver."""
+        if self._async_engine is None:
+            url = settings.DATABASE_URL_ASYNC or url_async(self.url)
+            opciones = opciones_pool(url)
+            if 'pool_size' in opciones:
+                # aiosqlite defaults to NullPool; pool it like the sync engine
+                opciones['poolclass'] = AsyncAdaptedQueuePool
+            self._async_engine = create_async_engine(url, **opciones)
+            self._AsyncSessionLocal = async_sessionmaker(self._async_engine, autoflush=False, expire_on_commit=False)
+        return self._async_engine
     
     def create_tables(self):
         """Creates all database tables."""
@@ -46,4 +316,18 @@ class Database:
     
     def get_session(self) -> Session:
         """Returns a new database session."""
-        return self.SessionLocal()
\ No newline at end of file
+        return self.SessionLocal()
+    
+    def get_async_session(self) -> AsyncSession:
+        """Returns a new async database session."""
+        self.async_engine  # creates the session factory on first use
+        return self._AsyncSessionLocal()
+    
+    async def cerrar(self):
+        """Closes every pooled connection of both engines."""
+        if self._async_engine is not None:
+            await self._async_engine.dispose()
+        self.engine.dispose()
+
+# Application-wide instance: one engine and one pool shared by every router and service
+db = Database()
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-from datetime import datetime
+from sqlalchemy import func, and_, or_, select
+from datetime import date, datetime
 from django.http import JsonResponse
-from app.models.database import Database, IncidenciaOperativa
+from functools import lru_cache
+import base64
+import csv
+import io
+import zlib
+from app.models.database import db, CATALOGOS, Calendario, Empresa, IncidenciaOperativa, ResumenDiario
+from app.services.busqueda import coincidencias, filtro_busqueda, terminos_busqueda
+from app.services.cache import cache_respuestas
+from app.utils.date_ranges import rango_dia
+from app.utils.serializacion import RespuestaJSON, a_json, compilar_serializador
 
 router = APIRouter(prefix="/queries", tags=["queries"])
-db = Database()
 
 def test_endpoint(request):
     data = {
@@ -14,27 +24,107 @@ def test_endpoint(request):
     }
     return JsonResponse(data)
 
-def get_db():
-    database = db.get_session()
-    try:
+async def get_db():
+    # Sesión async: la E/S del driver cede el event loop; lo que corre dentro de run_sync ocupa su hilo
+    async with db.get_async_session() as database:
         yield database
-    finally:
-        database.close()
 
-def formatear_incidencia(incidencia):
-    """Formatea una incidencia para convertir datetime a string"""
-    incidencia_dict = {}
+# Columnas internas que no se exponen en la API
+COLUMNAS_INTERNAS = ('texto_busqueda',)
+
+def columnas_incidencia():
+    """Columnas de la tabla por nombre de salida; turno, tipo_dia y empresa se leen de su catálogo"""
+    columnas = {}
+    for column in IncidenciaOperativa.__table__.columns:
+        if column.name in COLUMNAS_INTERNAS:
+            continue
+        dimension = column.name[:-len('_id')] if column.name.endswith('_id') else None
+        if dimension in CATALOGOS:
+            columnas[dimension] = getattr(IncidenciaOperativa, dimension)
+        else:
+            columnas[column.name] = column
+    return columnas
+
+# Columnas que se pueden pedir en fields= (todas las de la tabla salvo las internas)
+COLUMNAS_INCIDENCIA = columnas_incidencia()
+
+@lru_cache(maxsize=128)
+def serializador_incidencias(columnas: tuple):
+    """Tupla proyectada -> diccionario (datetime a string), compilado una vez por combinación de fields="""
+    return compilar_serializador(
+        columnas, [getattr(COLUMNAS_INCIDENCIA[nombre], 'type', None) for nombre in columnas]
+    )
+
+def palabras_busqueda(q: str):
+    """Palabras de q=; 400 si no queda ninguna"""
+    palabras = terminos_busqueda(q)
+    if not palabras:
+        raise HTTPException(status_code=400, detail="La búsqueda debe contener al menos una palabra")
+    return palabras
+
+def aplicar_filtros(query, fecha_inicio=None, fecha_fin=None, troncal=None, empresa=None, tipo_incidencia=None, q=None):
+    """Aplica los filtros comunes de consulta de incidencias"""
+    # Rangos semiabiertos: fecha_fin incluye el día completo y el índice sobre fecha es utilizable
+    try:
+        if fecha_inicio:
+            query = query.filter(IncidenciaOperativa.fecha >= rango_dia(fecha_inicio)[0])
+        if fecha_fin:
+            query = query.filter(IncidenciaOperativa.fecha < rango_dia(fecha_fin)[1])
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Las fechas deben tener formato YYYY-MM-DD")
     
-    for column in incidencia.__table__.columns:
-        value = getattr(incidencia, column.name)
-        
-        # Convertir datetime a string
-        if isinstance(value, datetime):
-            value = value.strftime('%Y-%m-%d %H:%M:%S')
-        
-        incidencia_dict[column.name] = value
+    if troncal:
+        query = query.filter(IncidenciaOperativa.troncal == troncal)
+    
+    if empresa:
+        # Se compara el id (índice empresa_id, fecha), no el nombre
+        query = query.filter(IncidenciaOperativa.empresa_id == select(Empresa.id).where(
+            Empresa.nombre == empresa
+        ).scalar_subquery())
+    
+    if tipo_incidencia:
+        query = query.filter(IncidenciaOperativa.incidencia_primaria.contains(tipo_incidencia))
+    
+    if q:
+        # Texto libre sobre el índice de búsqueda (FTS5 en SQLite, GIN en PostgreSQL)
+        query = query.filter(filtro_busqueda(palabras_busqueda(q), db.engine.dialect.name))
+    
+    return query
+
+def codificar_cursor(fecha: datetime, id: int) -> str:
+    """Cursor opaco con la última clave (fecha, id) entregada"""
+    return base64.urlsafe_b64encode(f"{fecha.isoformat()}|{id}".encode()).decode()
+
+def decodificar_cursor(cursor: str):
+    """Devuelve la clave (fecha, id) de un cursor"""
+    try:
+        fecha, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def codificar_cursor_busqueda(puntaje: float, id: int) -> str:
+    """Cursor opaco con la última clave (puntaje, id) entregada por la búsqueda"""
+    return base64.urlsafe_b64encode(f"{puntaje!r}|{id}".encode()).decode()
+
+def decodificar_cursor_busqueda(cursor: str):
+    """Devuelve la clave (puntaje, id) de un cursor de búsqueda"""
+    try:
+        puntaje, id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return float(puntaje), int(id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def columnas_solicitadas(fields: str):
+    """Valida la proyección pedida en fields= (todas las columnas si no se indica)"""
+    if not fields:
+        return list(COLUMNAS_INCIDENCIA)
     
-    return incidencia_dict
+    columnas = [campo.strip() for campo in fields.split(',') if campo.strip()]
+    desconocidas = [campo for campo in columnas if campo not in COLUMNAS_INCIDENCIA]
+    if desconocidas:
+        raise HTTPException(status_code=400, detail=f"Campos desconocidos: {', '.join(desconocidas)}")
+    return columnas
 
 @router.get("/incidencias")
 async def get_incidencias(
@@ -43,44 +133,238 @@ async def get_incidencias(
     troncal: str = Query(None),
     empresa: str = Query(None),
     tipo_incidencia: str = Query(None),
-    db_session: Session = Depends(get_db)
+    q: str = Query(None, description="Texto libre (incidencia, observaciones, parada, ruta)"),
+    limite: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
+    cursor: str = Query(None, description="Cursor devuelto en siguiente_cursor"),
+    fields: str = Query(None, description="Columnas a devolver, separadas por coma"),
+    incluir_total: bool = Query(False, description="Incluir el conteo total (consulta adicional)"),
+    db_session: AsyncSession = Depends(get_db)
 ):
-    query = db_session.query(IncidenciaOperativa)
+    columnas = columnas_solicitadas(fields)
+    filtros = (fecha_inicio, fecha_fin, troncal, empresa, tipo_incidencia, q)
+    cursor = decodificar_cursor(cursor) if cursor else None
     
-    # Filtros
-    if fecha_inicio and fecha_fin:
-        query = query.filter(
-            IncidenciaOperativa.fecha.between(fecha_inicio, fecha_fin)
-        )
+    filas = await db_session.run_sync(listar_incidencias, columnas, filtros, cursor, limite)
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
     
-    if troncal:
-        query = query.filter(IncidenciaOperativa.troncal == troncal)
+    serializar = serializador_incidencias(tuple(columnas))
+    respuesta = {
+        "incidencias": [serializar(fila) for fila in filas],
+        "limite": limite,
+        "siguiente_cursor": codificar_cursor(filas[-1][-2], filas[-1][-1]) if hay_mas else None
+    }
+    if incluir_total:
+        respuesta["total"] = await db_session.run_sync(contar_incidencias, *filtros)
     
-    if empresa:
-        query = query.filter(IncidenciaOperativa.empresa == empresa)
+    # Respuesta ya armada con tipos JSON: se serializa directo, sin jsonable_encoder
+    return RespuestaJSON(respuesta)
+
+def listar_incidencias(db_session: Session, columnas, filtros, cursor, limite: int):
+    """Lee una página (limite + 1 filas) del listado de incidencias"""
+    # Solo se leen las columnas pedidas, más (fecha, id) para el cursor
+    query = db_session.query(
+        *[COLUMNAS_INCIDENCIA[nombre] for nombre in columnas],
+        IncidenciaOperativa.fecha,
+        IncidenciaOperativa.id
+    )
+    query = aplicar_filtros(query, *filtros)
     
-    if tipo_incidencia:
-        query = query.filter(IncidenciaOperativa.incidencia_primaria.contains(tipo_incidencia))
+    # Paginación por clave (fecha, id): cada página es una búsqueda en el índice, sin OFFSET
+    if cursor:
+        fecha_cursor, id_cursor = cursor
+        query = query.filter(or_(
+            IncidenciaOperativa.fecha > fecha_cursor,
+            and_(IncidenciaOperativa.fecha == fecha_cursor, IncidenciaOperativa.id > id_cursor)
+        ))
+    
+    return query.order_by(IncidenciaOperativa.fecha, IncidenciaOperativa.id).limit(limite + 1).all()
+
+def contar_incidencias(db_session: Session, fecha_inicio, fecha_fin, troncal, empresa, tipo_incidencia, q=None) -> int:
+    """COUNT(*) con los mismos filtros del listado"""
+    query = db_session.query(func.count(IncidenciaOperativa.id))
+    return aplicar_filtros(query, fecha_inicio, fecha_fin, troncal, empresa, tipo_incidencia, q).scalar()
+
+@router.get("/incidencias/buscar")
+async def buscar_incidencias(
+    q: str = Query(..., description="Texto libre (incidencia, observaciones, parada, ruta)"),
+    fecha_inicio: str = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(None, description="Fecha fin (YYYY-MM-DD)"),
+    troncal: str = Query(None),
+    empresa: str = Query(None),
+    tipo_incidencia: str = Query(None),
+    limite: int = Query(100, ge=1, le=1000, description="Tamaño de página"),
+    cursor: str = Query(None, description="Cursor devuelto en siguiente_cursor"),
+    fields: str = Query(None, description="Columnas a devolver, separadas por coma"),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """Búsqueda de texto libre sin distinguir tildes ni mayúsculas, de la más a la menos relevante"""
+    palabras = palabras_busqueda(q)
+    columnas = columnas_solicitadas(fields)
+    filtros = (fecha_inicio, fecha_fin, troncal, empresa, tipo_incidencia)
+    cursor = decodificar_cursor_busqueda(cursor) if cursor else None
+    
+    filas = await db_session.run_sync(listar_coincidencias, columnas, palabras, filtros, cursor, limite)
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    
+    serializar = serializador_incidencias(tuple(columnas))
+    return RespuestaJSON({
+        "q": q,
+        "palabras": palabras,
+        "incidencias": [{**serializar(fila), "relevancia": -fila[-2]} for fila in filas],
+        "limite": limite,
+        "siguiente_cursor": codificar_cursor_busqueda(filas[-1][-2], filas[-1][-1]) if hay_mas else None
+    })
+
+def listar_coincidencias(db_session: Session, columnas, palabras, filtros, cursor, limite: int):
+    """Lee una página (limite + 1 filas) de la búsqueda, ordenada por relevancia"""
+    coincidencia = coincidencias(palabras, db_session.get_bind().dialect.name)
+    # Las columnas pedidas, más (puntaje, id) para el cursor
+    query = db_session.query(
+        *[COLUMNAS_INCIDENCIA[nombre] for nombre in columnas],
+        coincidencia.c.puntaje,
+        IncidenciaOperativa.id
+    ).join(coincidencia, coincidencia.c.id == IncidenciaOperativa.id)
+    query = aplicar_filtros(query, *filtros)
+    
+    if cursor:
+        puntaje_cursor, id_cursor = cursor
+        query = query.filter(or_(
+            coincidencia.c.puntaje > puntaje_cursor,
+            and_(coincidencia.c.puntaje == puntaje_cursor, IncidenciaOperativa.id > id_cursor)
+        ))
+    
+    return query.order_by(coincidencia.c.puntaje, IncidenciaOperativa.id).limit(limite + 1).all()
+
+@router.get("/incidencias/total")
+async def get_total_incidencias(
+    fecha_inicio: str = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(None, description="Fecha fin (YYYY-MM-DD)"),
+    troncal: str = Query(None),
+    empresa: str = Query(None),
+    tipo_incidencia: str = Query(None),
+    q: str = Query(None, description="Texto libre (incidencia, observaciones, parada, ruta)"),
+    db_session: AsyncSession = Depends(get_db)
+):
+    """Conteo de incidencias con los filtros del listado"""
+    total = await db_session.run_sync(contar_incidencias, fecha_inicio, fecha_fin, troncal, empresa, tipo_incidencia, q)
+    return {"total": total}
+
+# Filas por lote en la exportación (yield_per / cursor del servidor)
+LOTE_EXPORTACION = 2000
+
+def generar_exportacion(consulta, columnas, formato: str, comprimir: bool):
+    """Genera el cuerpo de la exportación por lotes, con su propia sesión"""
+    sesion = db.get_session()
+    serializar = serializador_incidencias(tuple(columnas))
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None
+    
+    def salida(texto: str) -> bytes:
+        datos = texto.encode('utf-8')
+        if compresor:
+            # SYNC_FLUSH entrega cada lote al cliente sin esperar el final del archivo
+            return compresor.compress(datos) + compresor.flush(zlib.Z_SYNC_FLUSH)
+        return datos
     
-    resultados = query.all()
+    try:
+        # yield_per activa stream_results: cursor del lado del servidor donde el driver lo soporta
+        filas = sesion.execute(consulta.execution_options(yield_per=LOTE_EXPORTACION))
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if formato == 'csv':
+            writer.writerow(columnas)
+        
+        pendientes = 0
+        for fila in filas:
+            if formato == 'csv':
+                writer.writerow(serializar(fila).values())
+            else:
+                buffer.write(a_json(serializar(fila)).decode('utf-8'))
+                buffer.write('\n')
+            pendientes += 1
+            
+            if pendientes >= LOTE_EXPORTACION:
+                yield salida(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+                pendientes = 0
+        
+        yield salida(buffer.getvalue())
+        if compresor:
+            yield compresor.flush()
+    finally:
+        sesion.close()
+
+def acepta_gzip(accept_encoding: str) -> bool:
+    """Indica si el encabezado Accept-Encoding admite gzip (sin q=0)"""
+    for codificacion in (accept_encoding or '').split(','):
+        nombre, _, parametros = codificacion.strip().partition(';')
+        if nombre.strip().lower() not in ('gzip', '*'):
+            continue
+        calidad = parametros.strip().lower()
+        if calidad.startswith('q='):
+            try:
+                return float(calidad[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+@router.get("/incidencias/export")
+async def export_incidencias(
+    request: Request,
+    fecha_inicio: str = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(None, description="Fecha fin (YYYY-MM-DD)"),
+    troncal: str = Query(None),
+    empresa: str = Query(None),
+    tipo_incidencia: str = Query(None),
+    q: str = Query(None, description="Texto libre (incidencia, observaciones, parada, ruta)"),
+    formato: str = Query('ndjson', description="ndjson o csv"),
+    fields: str = Query(None, description="Columnas a exportar, separadas por coma"),
+    gzip: bool = Query(None, description="Comprimir con gzip; por defecto, si el cliente envía Accept-Encoding: gzip"),
+):
+    """Exporta las incidencias filtradas en streaming, sin cargar el resultado en memoria"""
+    if formato not in ('ndjson', 'csv'):
+        raise HTTPException(status_code=400, detail="Formato no soportado (ndjson o csv)")
     
-    # Convertir resultados a diccionarios formateados
-    incidencias_dict = [formatear_incidencia(incidencia) for incidencia in resultados]
+    columnas = columnas_solicitadas(fields)
+    # La consulta se arma antes de transmitir para que los errores de filtros sigan siendo 400
+    consulta = select(*[COLUMNAS_INCIDENCIA[nombre] for nombre in columnas]).select_from(IncidenciaOperativa)
+    consulta = aplicar_filtros(consulta, fecha_inicio, fecha_fin, troncal, empresa, tipo_incidencia, q)
+    consulta = consulta.order_by(IncidenciaOperativa.fecha, IncidenciaOperativa.id)
     
-    return {"total": len(resultados), "incidencias": incidencias_dict}
+    # Sin gzip explícito se negocia: los clientes que no lo anuncian reciben el archivo sin comprimir
+    if gzip is None:
+        gzip = acepta_gzip(request.headers.get('accept-encoding'))
+    headers = {"Content-Disposition": f'attachment; filename="incidencias.{formato}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(
+        generar_exportacion(consulta, columnas, formato, gzip),
+        media_type="application/x-ndjson" if formato == 'ndjson' else "text/csv; charset=utf-8",
+        headers=headers
+    )
 
 @router.get("/estadisticas/diarias")
 async def get_estadisticas_diarias(
     fecha: str = Query(..., description="Fecha (YYYY-MM-DD)"),
-    db_session: Session = Depends(get_db)
+    db_session: AsyncSession = Depends(get_db)
 ):
-    # Estadísticas por hora del día
-    estadisticas = db_session.query(
-        func.count(IncidenciaOperativa.id).label('total'),
-        IncidenciaOperativa.turno
-    ).filter(
-        func.date(IncidenciaOperativa.fecha) == fecha
-    ).group_by(IncidenciaOperativa.turno).all()
+    try:
+        dia = datetime.strptime(fecha, '%Y-%m-%d').date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+    
+    # Estadísticas por turno del día, leídas del rollup diario
+    total = func.sum(ResumenDiario.total).label('total')
+    estadisticas = (await db_session.execute(
+        select(total, ResumenDiario.turno).filter(
+            ResumenDiario.fecha == dia
+        ).group_by(ResumenDiario.turno)
+    )).all()
     
     return {
         "fecha": fecha,
@@ -91,19 +375,29 @@ async def get_estadisticas_diarias(
 
 @router.get("/tendencias/mensuales")
 async def get_tendencias_mensuales(
-    año: int = Query(..., description="Año"),
-    db_session: Session = Depends(get_db)
+    año: int = Query(..., ge=1, le=9998, description="Año"),
+    db_session: AsyncSession = Depends(get_db)
 ):
-    tendencias = db_session.query(
-        extract('month', IncidenciaOperativa.fecha).label('mes'),
-        func.count(IncidenciaOperativa.id).label('total')
-    ).filter(
-        extract('year', IncidenciaOperativa.fecha) == año
-    ).group_by('mes').order_by('mes').all()
+    async def calcular():
+        # Mes y año desde la tabla calendario (join por fecha, sin extraer el mes fila a fila)
+        tendencias = (await db_session.execute(
+            select(
+                Calendario.mes,
+                func.sum(ResumenDiario.total).label('total')
+            ).join(Calendario, Calendario.fecha == ResumenDiario.fecha).filter(
+                Calendario.anio == año,
+                ResumenDiario.fecha >= date(año, 1, 1),
+                ResumenDiario.fecha < date(año + 1, 1, 1)
+            ).group_by(Calendario.mes).order_by(Calendario.mes)
+        )).all()
+        
+        return {
+            "año": año,
+            "tendencias": [
+                {"mes": int(tendencia.mes), "total": tendencia.total} for tendencia in tendencias
+            ]
+        }
     
-    return {
-        "año": año,
-        "tendencias": [
-            {"mes": int(tendencia.mes), "total": tendencia.total} for tendencia in tendencias
-        ]
-    }
\ No newline at end of file
+    return await cache_respuestas.obtener_o_calcular(
+        'queries/tendencias/mensuales', {'año': año}, [(date(año, 1, 1), date(año, 12, 31))], calcular
+    )
@@ -1,55 +1,88 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime
+import os
 
-from app.models.database import Database, IncidenciaOperativa
-from app.services.report_generator import ReportGenerator
+from app.config import settings
+from app.models.database import db, ResumenDiario
+from app.services.analitica import almacen_analitico
+from app.services.cache import cache_respuestas
+from app.services.exportacion_excel import REPORTES_EXCEL, generar_libro
+from app.services.report_generator import AGRUPACIONES_RETRASO, GRANULARIDADES, ReportGenerator
+from app.services.rollup import valor_dimension
 from app.models.schemas import EstadisticasResponse
+from app.utils.serializacion import RespuestaJSON
 
 
 router = APIRouter(prefix="/reports", tags=["reports"])
-db = Database()
 
-def get_db():
-    database = db.get_session()
-    try:
+async def get_db():
+    # Sesión async para consultas SQL simples: solo la E/S del driver cede el event loop
+    async with db.get_async_session() as database:
         yield database
-    finally:
-        database.close()
 
+async def en_hilo(generar):
+    """Ejecuta generar(sesion) con una sesión sync propia en el threadpool
+
+    La agregación en Python de ReportGenerator y el armado de filas bloquearían el event loop dentro de
+    AsyncSession.run_sync (corre en el hilo del loop); en un hilo aparte no frenan otras peticiones.
+    """
+    def ejecutar():
+        sesion = db.get_session()
+        try:
+            return generar(sesion)
+        finally:
+            sesion.close()
+    return await run_in_threadpool(ejecutar)
+
+def validar_fechas(*fechas: Optional[str]) -> List[Optional[date]]:
+    """Fechas YYYY-MM-DD como date (None si no se indicó); 400 si alguna no es válida
+
+    Todos los reportes validan con esta función antes de consultar o cachear: mismo 400 en todos.
+    """
+    try:
+        return [datetime.strptime(fecha, '%Y-%m-%d').date() if fecha else None for fecha in fechas]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+
+# response_model documenta la forma; la respuesta se arma directamente (sin validar ni recodificar con pydantic)
 @router.get("/diario", response_model=EstadisticasResponse)
 async def get_reporte_diario(
     fecha: str = Query(..., description="Fecha en formato YYYY-MM-DD"),
-    db_session: Session = Depends(get_db)
 ):
     """Obtiene reporte consolidado del día"""
+    validar_fechas(fecha)
     try:
-        generator = ReportGenerator(db_session)
-        reporte = generator.generar_reporte_diario(fecha)
-        
-        return EstadisticasResponse(
-            fecha=reporte['fecha'],
-            total_incidencias=reporte['total_incidencias'],
-            por_turno=reporte['por_turno'],
-            por_troncal=reporte['por_troncal'],
-            por_empresa=reporte.get('por_empresa', [])
+        reporte = await cache_respuestas.obtener_o_calcular(
+            'reports/diario', {'fecha': fecha}, [(fecha, fecha)],
+            lambda: en_hilo(lambda sesion: ReportGenerator(sesion).generar_reporte_diario(fecha))
         )
+        
+        return RespuestaJSON({
+            'fecha': reporte['fecha'],
+            'total_incidencias': reporte['total_incidencias'],
+            'por_turno': reporte['por_turno'],
+            'por_troncal': reporte['por_troncal'],
+            'por_empresa': reporte.get('por_empresa', [])
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generando reporte: {str(e)}")
 
 @router.get("/tendencia/semanal")
 async def get_tendencia_semanal(
     fecha_fin: str = Query(None, description="Fecha final (YYYY-MM-DD)"),
-    db_session: Session = Depends(get_db)
 ):
     """Obtiene tendencia de incidencias de la última semana"""
     if not fecha_fin:
         fecha_fin = datetime.now().strftime('%Y-%m-%d')
+    validar_fechas(fecha_fin)
     
-    generator = ReportGenerator(db_session)
-    tendencia = generator.generar_tendencia_semanal(fecha_fin)
+    tendencia = await en_hilo(lambda sesion: ReportGenerator(sesion).generar_tendencia_semanal(fecha_fin))
     
     return {
         "periodo": "semanal",
@@ -57,36 +90,215 @@ async def get_tendencia_semanal(
         "tendencia": tendencia
     }
 
+@router.get("/tendencia")
+async def get_tendencia(
+    fecha_fin: str = Query(None, description="Fecha final (YYYY-MM-DD)"),
+    dias: int = Query(30, ge=1, le=366, description="Tamaño de la ventana en días"),
+    granularidad: str = Query('dia', description="dia, semana, mes o trimestre"),
+):
+    """Obtiene la tendencia de incidencias para una ventana y granularidad arbitrarias"""
+    if not fecha_fin:
+        fecha_fin = datetime.now().strftime('%Y-%m-%d')
+    validar_fechas(fecha_fin)
+    
+    try:
+        tendencia = await en_hilo(
+            lambda sesion: ReportGenerator(sesion).generar_tendencia(fecha_fin, dias, granularidad)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return RespuestaJSON({
+        "periodo": f"{dias} días",
+        "granularidad": granularidad,
+        "fecha_fin": fecha_fin,
+        "tendencia": tendencia
+    })
+
 @router.get("/comparativo")
 async def get_reporte_comparativo(
     fecha1: str = Query(..., description="Primera fecha (YYYY-MM-DD)"),
     fecha2: str = Query(..., description="Segunda fecha (YYYY-MM-DD)"),
-    db_session: Session = Depends(get_db)
 ):
     """Compara incidencias entre dos fechas"""
-    generator = ReportGenerator(db_session)
-    comparativo = generator.generar_reporte_comparativo(fecha1, fecha2)
+    validar_fechas(fecha1, fecha2)
+    comparativo = await cache_respuestas.obtener_o_calcular(
+        'reports/comparativo', {'fecha1': fecha1, 'fecha2': fecha2}, [(fecha1, fecha1), (fecha2, fecha2)],
+        lambda: en_hilo(lambda sesion: ReportGenerator(sesion).generar_reporte_comparativo(fecha1, fecha2))
+    )
     
-    return comparativo
+    return RespuestaJSON(comparativo)
 
 @router.get("/top-incidencias")
 async def get_top_incidencias(
     limite: int = Query(10, description="Número de resultados"),
-    db_session: Session = Depends(get_db)
+    db_session: AsyncSession = Depends(get_db)
 ):
     """Obtiene los tipos de incidencia más comunes"""
-    resultados = db_session.query(
-        IncidenciaOperativa.Incidencia_primaria,
-        func.count(IncidenciaOperativa.id).label('total')
-    ).group_by(
-        IncidenciaOperativa.Incidencia_primaria
-    ).order_by(
-        func.count(IncidenciaOperativa.id).desc()
-    ).limit(limite).all()
+    async def calcular():
+        total = func.sum(ResumenDiario.total)
+        resultados = (await db_session.execute(
+            select(
+                ResumenDiario.incidencia_primaria,
+                total.label('total')
+            ).group_by(
+                ResumenDiario.incidencia_primaria
+            ).order_by(
+                total.desc()
+            ).limit(limite)
+        )).all()
+        
+        return {
+            "top_incidencias": [
+                {"tipo": valor_dimension(resultado.incidencia_primaria), "total": resultado.total}
+                for resultado in resultados
+            ]
+        }
     
-    return {
-        "top_incidencias": [
-            {"tipo": resultado.Incidencia_primaria, "total": resultado.total}
-            for resultado in resultados
-        ]
-    }
\ No newline at end of file
+    # Depende de todas las fechas: cualquier carga la invalida
+    return await cache_respuestas.obtener_o_calcular('reports/top-incidencias', {'limite': limite}, None, calcular)
+
+@router.get("/pivot")
+async def get_pivot(
+    dimensiones: str = Query(..., description="Dimensiones separadas por coma (turno, troncal, empresa, tipo_dia, incidencia_primaria, codigo_de_ruta, codigo_de_conductor, fecha, mes, anio)"),
+    fecha_inicio: str = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(None, description="Fecha fin (YYYY-MM-DD), incluida"),
+    troncal: List[str] = Query(None),
+    empresa: List[str] = Query(None),
+    turno: List[str] = Query(None),
+    tipo_dia: List[str] = Query(None),
+    incidencia_primaria: List[str] = Query(None),
+    mes: List[str] = Query(None, description="Meses YYYY-MM"),
+    anio: List[str] = Query(None),
+    limite: int = Query(None, ge=1, description="Máximo de grupos (ordenados por total)"),
+):
+    """Conteo de incidencias por cualquier combinación de dimensiones, desde el almacén columnar en memoria"""
+    if not settings.ANALITICA_HABILITADA:
+        raise HTTPException(status_code=503, detail="El almacén analítico está deshabilitado")
+
+    filtros = {
+        dimension: valores
+        for dimension, valores in {
+            'troncal': troncal, 'empresa': empresa, 'turno': turno, 'tipo_dia': tipo_dia,
+            'incidencia_primaria': incidencia_primaria, 'mes': mes, 'anio': anio,
+        }.items() if valores
+    }
+    inicio, fin = validar_fechas(fecha_inicio, fecha_fin)
+
+    columnas = [dimension.strip() for dimension in dimensiones.split(',') if dimension.strip()]
+
+    def calcular():
+        # Trae las filas nuevas (id mayor al último cargado) antes de agrupar
+        almacen_analitico.refrescar()
+        return almacen_analitico.pivot(columnas, filtros, inicio, fin, limite)
+
+    try:
+        return RespuestaJSON(await run_in_threadpool(calcular))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/retrasos")
+async def get_retrasos(
+    agrupar: str = Query('troncal', description="ruta, troncal, turno, dia, conductor o empresa"),
+    fecha_inicio: str = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
+    fecha_fin: str = Query(None, description="Fecha fin (YYYY-MM-DD), incluida"),
+    troncal: List[str] = Query(None),
+    empresa: List[str] = Query(None),
+    turno: List[str] = Query(None),
+    tipo_dia: List[str] = Query(None),
+    limite: int = Query(None, ge=1, description="Máximo de grupos (ordenados por p99)"),
+):
+    """Retraso (hora_real - hora_programada, en segundos) p50/p90/p99 y promedio por grupo
+
+    En PostgreSQL se calcula con percentile_cont; en el resto de bases, en el almacén analítico.
+    """
+    if agrupar not in AGRUPACIONES_RETRASO:
+        raise HTTPException(
+            status_code=400, detail=f"Agrupación no soportada: {agrupar}. Use {', '.join(AGRUPACIONES_RETRASO)}"
+        )
+    inicio, fin = validar_fechas(fecha_inicio, fecha_fin)
+
+    dimension = AGRUPACIONES_RETRASO[agrupar]
+    filtros = {
+        columna: valores
+        for columna, valores in {'troncal': troncal, 'empresa': empresa, 'turno': turno, 'tipo_dia': tipo_dia}.items()
+        if valores
+    }
+
+    if db.engine.dialect.name == 'postgresql':
+        resultado = await en_hilo(
+            lambda sesion: ReportGenerator(sesion).generar_percentiles_retraso(
+                dimension, filtros, inicio, fin, limite=limite
+            )
+        )
+        return RespuestaJSON({'agrupacion': agrupar, 'fuente': 'postgresql', **resultado})
+
+    if not settings.ANALITICA_HABILITADA:
+        raise HTTPException(status_code=503, detail="El almacén analítico está deshabilitado")
+
+    def calcular():
+        almacen_analitico.refrescar()
+        return almacen_analitico.percentiles([dimension], 'retraso_seg', filtros, inicio, fin, limite=limite)
+
+    try:
+        resultado = await run_in_threadpool(calcular)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return RespuestaJSON({'agrupacion': agrupar, 'fuente': 'analitica', **resultado})
+
+@router.get("/cache")
+async def get_estadisticas_cache():
+    """Contadores de la caché de respuestas (aciertos, fallos, desalojos, invalidaciones)"""
+    return cache_respuestas.estadisticas()
+
+@router.get("/exportar")
+async def exportar_reportes(
+    reportes: str = Query('diario', description="Reportes separados por coma (diario, comparativo, tendencia)"),
+    fecha: str = Query(None, description="Fecha del reporte diario (YYYY-MM-DD, hoy por defecto)"),
+    fecha1: str = Query(None, description="Primera fecha del comparativo (YYYY-MM-DD)"),
+    fecha2: str = Query(None, description="Segunda fecha del comparativo (YYYY-MM-DD)"),
+    fecha_fin: str = Query(None, description="Fecha final de la tendencia (YYYY-MM-DD, hoy por defecto)"),
+    dias: int = Query(30, ge=1, le=366, description="Ventana de la tendencia en días"),
+    granularidad: str = Query('dia', description="dia, semana, mes o trimestre"),
+    incidencias: bool = Query(False, description="Agregar hojas con las incidencias de los días de los reportes")
+):
+    """Descarga los reportes como libro Excel (.xlsx), con hojas de incidencias opcionales
+
+    El libro se arma en modo write-only sobre un temporal (memoria constante) y se transmite por bloques.
+    """
+    pedidos = [reporte.strip() for reporte in reportes.split(',') if reporte.strip()]
+    desconocidos = [reporte for reporte in pedidos if reporte not in REPORTES_EXCEL]
+    if not pedidos or desconocidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Reportes no soportados: {', '.join(desconocidos)} (diario, comparativo o tendencia)"
+        )
+    if 'comparativo' in pedidos and not (fecha1 and fecha2):
+        raise HTTPException(status_code=400, detail="El comparativo requiere fecha1 y fecha2")
+    if granularidad not in GRANULARIDADES:
+        raise HTTPException(status_code=400, detail=f"Granularidad no soportada: {granularidad}")
+    
+    hoy = datetime.now().strftime('%Y-%m-%d')
+    fecha, fecha_fin = fecha or hoy, fecha_fin or hoy
+    validar_fechas(fecha, fecha1, fecha2, fecha_fin)
+    
+    def construir():
+        # Sesión propia en el hilo: las incidencias se leen con un cursor del servidor
+        sesion = db.get_session()
+        try:
+            return generar_libro(
+                sesion, [reporte for reporte in REPORTES_EXCEL if reporte in pedidos], fecha, fecha1, fecha2,
+                fecha_fin, dias, granularidad, incidencias
+            )
+        finally:
+            sesion.close()
+    
+    ruta, _ = await run_in_threadpool(construir)
+    nombre = f"reportes_{fecha if pedidos == ['diario'] else hoy}.xlsx"
+    # El temporal se borra al terminar la respuesta (también si el cliente se desconecta)
+    return FileResponse(
+        ruta,
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        filename=nombre,
+        background=BackgroundTask(os.remove, ruta)
+    )
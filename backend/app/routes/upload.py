@@ -1,57 +1,139 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Response
+from starlette.concurrency import run_in_threadpool
+from typing import List, Tuple
 import os
-import uuid
 import shutil
+import uuid
 
-from app.models.database import Database, IncidenciaOperativa
-from app.services.excel_parser import ExcelParser
+from app.models.database import db
+from app.services.ingestion_jobs import DUPLICADO, ArchivoIngesta, IngestionJobManager
+from app.services.validacion import CuarentenaIncidencias
+from app.utils.archivos import EXTENSIONES_EXCEL, copiar_con_hash, expandir_zip
 
 router = APIRouter(prefix="/upload", tags=["upload"])
-db = Database()
-parser = ExcelParser()
+job_manager = IngestionJobManager(db.engine)
 
-def get_db():
-    database = db.get_session()
-    try:
-        yield database
-    finally:
-        database.close()
-
-@router.post("/")
-async def upload_incidencias(file: UploadFile = File(...), db_session: Session = Depends(get_db)):
+@router.post("/", status_code=202)
+async def upload_incidencias(response: Response, file: UploadFile = File(...)):
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos Excel")
     
     # Crear directorio de uploads si no existe
     os.makedirs("uploads", exist_ok=True)
     
-    # Guardar archivo temporalmente
+    # Guardar archivo temporalmente (fuera del event loop); el job lo elimina al terminar
     file_path = f"uploads/temp_{uuid.uuid4()}_{file.filename}"
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    hash_sha256 = await run_in_threadpool(copiar_con_hash, file.file, file_path)
     
-    try:
-        # Parsear y procesar datos
-        datos = parser.parse_excel(file_path)
-        
-        # Guardar en base de datos
-        for dato in datos:
-            incidencia = IncidenciaOperativa(**dato)
-            db_session.add(incidencia)
-        
-        db_session.commit()
-        
+    # Mismo contenido ya importado: no se vuelve a parsear
+    previo = await run_in_threadpool(job_manager.archivo_cargado, hash_sha256)
+    if previo:
+        os.remove(file_path)
+        response.status_code = 200
         return {
-            "message": f"Se importaron {len(datos)} incidencias correctamente",
-            "incidencias_importadas": len(datos)
+            "message": f"El archivo {file.filename} ya fue cargado ({previo['archivo']}, {previo['cargado']})",
+            "job_id": None,
+            "estado": DUPLICADO,
+            "carga_previa": previo
         }
     
+    # Parseo e inserción en segundo plano
+    job = job_manager.encolar(file_path, file.filename, hash_sha256)
+    
+    return {
+        "message": f"Archivo {file.filename} recibido, importación en curso",
+        "job_id": job.id,
+        "estado": job.estado
+    }
+
+def preparar_lote(archivos: List[UploadFile], directorio: str) -> Tuple[List[ArchivoIngesta], List[str]]:
+    """Guarda los archivos del lote (expandiendo los zip) y descarta contenidos repetidos o ya cargados"""
+    recibidos = []
+    for archivo in archivos:
+        file_path = os.path.join(directorio, f"{uuid.uuid4().hex}_{os.path.basename(archivo.filename)}")
+        hash_sha256 = copiar_con_hash(archivo.file, file_path)
+        if archivo.filename.lower().endswith('.zip'):
+            recibidos.extend(
+                (f"{archivo.filename}/{nombre}", ruta, hash_miembro)
+                for nombre, ruta, hash_miembro in expandir_zip(file_path, directorio)
+            )
+            os.remove(file_path)
+        else:
+            recibidos.append((archivo.filename, file_path, hash_sha256))
+    
+    lote, omitidos, vistos = [], [], set()
+    for nombre, file_path, hash_sha256 in recibidos:
+        if hash_sha256 in vistos or job_manager.archivo_cargado(hash_sha256):
+            os.remove(file_path)
+            omitidos.append(nombre)
+            continue
+        vistos.add(hash_sha256)
+        lote.append(ArchivoIngesta(nombre, file_path, hash_sha256))
+    return lote, omitidos
+
+@router.post("/lote", status_code=202)
+async def upload_lote(response: Response, files: List[UploadFile] = File(...)):
+    """Importa varios archivos Excel o un zip: hojas y archivos se parsean en paralelo"""
+    invalidos = [f.filename for f in files if not f.filename.lower().endswith(EXTENSIONES_EXCEL + ('.zip',))]
+    if invalidos:
+        raise HTTPException(status_code=400, detail=f"Solo se permiten archivos Excel o zip: {', '.join(invalidos)}")
+    
+    directorio = os.path.join("uploads", f"lote_{uuid.uuid4().hex}")
+    os.makedirs(directorio, exist_ok=True)
+    try:
+        archivos, omitidos = await run_in_threadpool(preparar_lote, files, directorio)
     except Exception as e:
-        db_session.rollback()
-        raise HTTPException(status_code=500, detail=f"Error al procesar el archivo: {str(e)}")
+        shutil.rmtree(directorio, ignore_errors=True)
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el lote: {str(e)}")
+    
+    if not archivos:
+        shutil.rmtree(directorio, ignore_errors=True)
+        response.status_code = 200
+        return {
+            "message": "Todos los archivos del lote ya fueron cargados",
+            "job_id": None,
+            "estado": DUPLICADO,
+            "omitidos": omitidos
+        }
     
-    finally:
-        # Limpiar archivo temporal
-        if os.path.exists(file_path):
-            os.remove(file_path)
\ No newline at end of file
+    nombre = files[0].filename if len(files) == 1 else f"lote de {len(files)} archivos"
+    job = job_manager.encolar_lote(nombre, archivos, directorio_temporal=directorio)
+    
+    return {
+        "message": f"{len(archivos)} archivos recibidos, importación en curso",
+        "job_id": job.id,
+        "estado": job.estado,
+        "archivos": [archivo.nombre for archivo in archivos],
+        "omitidos": omitidos
+    }
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado de una importación: filas procesadas, errores y rendimiento
+
+    El estado vive en memoria del proceso worker que aceptó la subida (con varios workers, otro puede
+    responder 404) y los trabajos terminados se olvidan pasado INGESTA_JOBS_RETENCION_SEGUNDOS o al
+    superar INGESTA_JOBS_MAXIMO. Lo que queda en la base es archivos_cargados e incidencias_rechazadas.
+    """
+    job = job_manager.obtener(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Importación no encontrada")
+    return job
+
+@router.get("/rechazos")
+async def get_rechazos(
+    hash_sha256: str = Query(None, description="Hash del archivo de origen"),
+    archivo: str = Query(None, description="Nombre del archivo de origen"),
+    motivo: str = Query(None, description="Motivo de rechazo (p. ej. fecha_invalida)"),
+    despues_de: int = Query(0, ge=0, description="Último id recibido (siguiente_id de la página anterior)"),
+    limite: int = Query(100, ge=1, le=1000, description="Tamaño de página")
+):
+    """Filas rechazadas por la validación de ingesta, con sus motivos y valores originales"""
+    rechazos = await run_in_threadpool(
+        CuarentenaIncidencias(db.engine).listar, hash_sha256, archivo, motivo, despues_de, limite
+    )
+    return {
+        "rechazos": rechazos,
+        "limite": limite,
+        "siguiente_id": rechazos[-1]['id'] if len(rechazos) == limite else None
+    }
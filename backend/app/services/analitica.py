@@ -0,0 +1,469 @@
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.models.database import IncidenciaOperativa, db
+from app.services.cambios import REESCRITURA, cambios_desde
+from app.services.catalogos import columna_nombre, unir_catalogos
+
+logger = logging.getLogger(__name__)
+
+# Columnas de texto que se guardan como códigos enteros + diccionario
+COLUMNAS_CATEGORICAS = (
+    'troncal', 'empresa', 'turno', 'tipo_dia', 'incidencia_primaria', 'codigo_de_ruta', 'codigo_de_conductor',
+)
+
+# Columnas numéricas (int32); los nulos se guardan como SIN_VALOR_NUMERICO
+COLUMNAS_NUMERICAS = ('retraso_seg',)
+SIN_VALOR_NUMERICO = np.iinfo(np.int32).min
+
+# Dimensiones temporales, derivadas de la fecha de cada fila
+DIMENSIONES_TEMPORALES = ('fecha', 'mes', 'anio')
+
+DIMENSIONES_PIVOTE = COLUMNAS_CATEGORICAS + DIMENSIONES_TEMPORALES
+
+# Por debajo de este número de combinaciones se agrupa con bincount; por encima con unique
+MAX_COMBINACIONES_DENSAS = 4_000_000
+
+# Filas por bloque al agrupar: las claves intermedias quedan en caché del procesador
+TAMANO_BLOQUE_PIVOTE = 1 << 16
+
+EPOCA = date(1970, 1, 1)
+
+# Cuantiles por defecto de los reportes de retraso (p50, p90, p99)
+CUANTILES_RETRASO = (0.5, 0.9, 0.99)
+
+def _tipo_codigos(cardinalidad: int):
+    """Entero con signo más pequeño que admite los códigos del diccionario"""
+    for tipo in (np.int8, np.int16, np.int32):
+        if cardinalidad <= np.iinfo(tipo).max:
+            return tipo
+    return np.int64
+
+def _etiqueta_cuantil(cuantil: float) -> str:
+    """0.5 -> 'p50', 0.99 -> 'p99', 0.999 -> 'p99.9'"""
+    return f"p{cuantil * 100:g}"
+
+def _dia(valor: date) -> int:
+    return (valor - EPOCA).days
+
+def _decodificar_temporal(dimension: str, codigo: int) -> Any:
+    if dimension == 'fecha':
+        return date.fromordinal(EPOCA.toordinal() + codigo).isoformat()
+    if dimension == 'mes':
+        return f"{1970 + codigo // 12}-{codigo % 12 + 1:02d}"
+    return 1970 + codigo
+
+class Diccionario:
+    """Codifica los valores de una columna en enteros estables; solo crece (los códigos no cambian)"""
+
+    def __init__(self):
+        self.valores: List[Optional[str]] = []
+        self._codigos: Dict[Optional[str], int] = {}
+
+    def codificar(self, valores: np.ndarray) -> np.ndarray:
+        """Códigos del lote: el diccionario se consulta una vez por valor distinto"""
+        codigos_lote, unicos = pd.factorize(valores, use_na_sentinel=False)
+        traduccion = np.array([self._codigo(None if pd.isna(valor) else valor) for valor in unicos], dtype=np.int64)
+        return traduccion[codigos_lote].astype(_tipo_codigos(len(self.valores)))
+
+    def buscar(self, valores: Sequence[str]) -> List[int]:
+        """Códigos de los valores pedidos (los desconocidos se ignoran)"""
+        return [self._codigos[valor] for valor in valores if valor in self._codigos]
+
+    def _codigo(self, valor: Optional[str]) -> int:
+        codigo = self._codigos.get(valor)
+        if codigo is None:
+            codigo = self._codigos[valor] = len(self.valores)
+            self.valores.append(valor)
+        return codigo
+
+class Instantanea:
+    """Columnas inmutables que leen las consultas; cada refresco publica una nueva"""
+
+    def __init__(
+        self, columnas: Dict[str, np.ndarray], diccionarios: Dict[str, Diccionario], filas: int, ultimo_id: int
+    ):
+        self.columnas = columnas
+        self.diccionarios = diccionarios
+        self.filas = filas
+        self.ultimo_id = ultimo_id
+        # Mínimo y máximo de las dimensiones temporales, para dimensionar las claves de agrupación
+        self.limites = {
+            dimension: (int(columnas[dimension].min()), int(columnas[dimension].max())) if filas else (0, 0)
+            for dimension in DIMENSIONES_TEMPORALES
+        }
+
+class AlmacenAnalitico:
+    """Copia columnar y codificada de incidencias_operativas para agrupaciones arbitrarias en memoria"""
+
+    def __init__(self, engine: Engine, tamano_lote: Optional[int] = None):
+        self.engine = engine
+        self.tamano_lote = tamano_lote or settings.ANALITICA_LOTE_CARGA
+        self._lock = threading.Lock()
+        self._instantanea: Optional[Instantanea] = None
+        # Último id de cambios_datos aplicado (los reprocesos de otros procesos llegan por ahí)
+        self._ultimo_cambio = 0
+
+    @property
+    def cargado(self) -> bool:
+        return self._instantanea is not None
+
+    def invalidar(self):
+        """Descarta el almacén (p. ej. tras reprocesar columnas derivadas); la próxima consulta lo recarga"""
+        with self._lock:
+            self._instantanea = None
+
+    def refrescar(self, solo_si_cargado: bool = False) -> int:
+        """Agrega las filas con id mayor al último cargado; devuelve cuántas se agregaron"""
+        with self._lock:
+            if solo_si_cargado and not self.cargado:
+                return 0
+            self._aplicar_cambios()
+            actual = self._instantanea or Instantanea(
+                {}, {columna: Diccionario() for columna in COLUMNAS_CATEGORICAS}, 0, 0
+            )
+            inicio = time.perf_counter()
+
+            partes = []
+            ultimo_id = actual.ultimo_id
+            while True:
+                lote = self._leer_lote(ultimo_id, actual.diccionarios)
+                if lote is None:
+                    break
+                partes.append(lote)
+                ultimo_id = int(lote.pop('id')[-1])
+
+            nuevas = sum(len(parte['fecha']) for parte in partes)
+            if nuevas or self._instantanea is None:
+                columnas = {
+                    nombre: np.concatenate(
+                        ([actual.columnas[nombre]] if actual.filas else []) + [parte[nombre] for parte in partes]
+                    ) if partes or actual.filas else np.empty(0, dtype=np.int32)
+                    for nombre in (*COLUMNAS_CATEGORICAS, *DIMENSIONES_TEMPORALES, *COLUMNAS_NUMERICAS)
+                }
+                self._instantanea = Instantanea(columnas, actual.diccionarios, actual.filas + nuevas, ultimo_id)
+                logger.info(
+                    f"Analítica: {nuevas} filas agregadas ({self._instantanea.filas} en memoria) "
+                    f"en {time.perf_counter() - inicio:.2f}s"
+                )
+            return nuevas
+
+    def _aplicar_cambios(self):
+        """Descarta la instantánea si alguien reescribió filas en su lugar desde que se cargó
+
+        Las filas nuevas llegan igual por id; las reescritas (reproceso, tipo_dia), posiblemente desde la
+        CLI en otro proceso, solo se ven en cambios_datos.
+        """
+        cambios = cambios_desde(self.engine, self._ultimo_cambio)
+        if not cambios:
+            return
+        if self._instantanea is not None and any(cambio.tipo == REESCRITURA for cambio in cambios):
+            logger.info("Analítica: filas reescritas desde la última carga, se recarga el almacén")
+            self._instantanea = None
+        self._ultimo_cambio = cambios[-1].id
+
+    def _leer_lote(self, desde_id: int, diccionarios: Dict[str, Diccionario]) -> Optional[Dict[str, np.ndarray]]:
+        """Lee por keyset el siguiente lote de filas y lo codifica columna a columna"""
+        tabla = IncidenciaOperativa.__table__
+        consulta = select(
+            tabla.c.id, tabla.c.fecha,
+            *[columna_nombre(columna) for columna in COLUMNAS_CATEGORICAS],
+            *[tabla.c[columna] for columna in COLUMNAS_NUMERICAS],
+        ).select_from(unir_catalogos()).where(tabla.c.id > desde_id).order_by(tabla.c.id).limit(self.tamano_lote)
+        with self.engine.connect() as conexion:
+            filas = conexion.execute(consulta).all()
+        if not filas:
+            return None
+
+        valores = list(zip(*filas))
+        dias = pd.to_datetime(pd.Series(valores[1])).to_numpy().astype('datetime64[D]')
+        lote = {
+            'id': np.asarray(valores[0], dtype=np.int64),
+            'fecha': dias.astype(np.int32),
+            'mes': dias.astype('datetime64[M]').astype(np.int16),
+            'anio': dias.astype('datetime64[Y]').astype(np.int16),
+        }
+        for posicion, columna in enumerate(COLUMNAS_CATEGORICAS, start=2):
+            lote[columna] = diccionarios[columna].codificar(np.asarray(valores[posicion], dtype=object))
+        for posicion, columna in enumerate(COLUMNAS_NUMERICAS, start=2 + len(COLUMNAS_CATEGORICAS)):
+            numeros = pd.to_numeric(pd.Series(valores[posicion], dtype=object)).to_numpy(dtype=np.float64)
+            lote[columna] = np.where(np.isnan(numeros), SIN_VALOR_NUMERICO, numeros).astype(np.int32)
+        return lote
+
+    def pivot(
+        self,
+        dimensiones: List[str],
+        filtros: Optional[Dict[str, List[str]]] = None,
+        fecha_inicio: Optional[date] = None,
+        fecha_fin: Optional[date] = None,
+        limite: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Conteo de incidencias agrupado por las dimensiones pedidas, con filtros por valor y fecha"""
+        self._validar(dimensiones, filtros)
+        inicio = time.perf_counter()
+        instantanea = self._obtener_instantanea()
+        condiciones = self._condiciones(instantanea, filtros, fecha_inicio, fecha_fin)
+
+        grupos, filas_filtradas = self._agrupar(instantanea, dimensiones, condiciones)
+
+        resultado = [
+            {
+                **{
+                    dimension: self._decodificar(instantanea, dimension, codigo)
+                    for dimension, codigo in zip(dimensiones, codigos)
+                },
+                'total': total,
+            }
+            for codigos, total in grupos
+        ]
+        resultado.sort(key=lambda fila: -fila['total'])
+        return {
+            'dimensiones': dimensiones,
+            'total': filas_filtradas,
+            'grupos': len(resultado),
+            'filas': resultado[:limite] if limite else resultado,
+            'filas_en_memoria': instantanea.filas,
+            'milisegundos': round((time.perf_counter() - inicio) * 1000, 2),
+        }
+
+    def percentiles(
+        self,
+        dimensiones: List[str],
+        columna: str = 'retraso_seg',
+        filtros: Optional[Dict[str, List[str]]] = None,
+        fecha_inicio: Optional[date] = None,
+        fecha_fin: Optional[date] = None,
+        cuantiles: Sequence[float] = CUANTILES_RETRASO,
+        limite: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Cuantiles (interpolación lineal, como percentile_cont) y promedio de una columna numérica por grupo
+
+        Las filas sin valor no cuentan. Los grupos se ordenan por el cuantil más alto, de mayor a menor.
+        """
+        self._validar(dimensiones, filtros)
+        if columna not in COLUMNAS_NUMERICAS:
+            raise ValueError(f"Columna no soportada: {columna}")
+        if any(not 0 <= cuantil <= 1 for cuantil in cuantiles):
+            raise ValueError("Los cuantiles deben estar entre 0 y 1")
+
+        inicio = time.perf_counter()
+        instantanea = self._obtener_instantanea()
+        condiciones = self._condiciones(instantanea, filtros, fecha_inicio, fecha_fin)
+        condiciones.append(lambda columnas: columnas[columna] != SIN_VALOR_NUMERICO)
+
+        limites = [self._rango(instantanea, dimension) for dimension in dimensiones]
+        claves, valores = [], []
+        for clave, bloque, mascara in self._bloques(instantanea, dimensiones, limites, condiciones):
+            claves.append(clave.copy())
+            valores.append(bloque[columna][mascara] if mascara is not None else bloque[columna])
+        claves = np.concatenate(claves) if claves else np.empty(0, dtype=np.intp)
+        valores = np.concatenate(valores).astype(np.int64) if valores else np.empty(0, dtype=np.int64)
+
+        # Orden por (grupo, valor) con un solo sort de una clave compuesta cuando cabe en int64
+        if len(valores):
+            minimo = int(valores.min())
+            rango = int(valores.max()) - minimo + 1
+            combinaciones = int(np.prod([r for _, r in limites], dtype=np.float64))
+        if len(valores) and combinaciones * rango < np.iinfo(np.int64).max:
+            compuesta = np.sort(claves.astype(np.int64) * rango + (valores - minimo))
+            claves, valores = np.divmod(compuesta, rango)
+            valores += minimo
+        else:
+            orden = np.lexsort((valores, claves))
+            claves, valores = claves[orden], valores[orden]
+
+        # Inicio y tamaño de cada grupo dentro del arreglo ordenado
+        inicios = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]]) if len(claves) else np.empty(0, dtype=np.intp)
+        tamanos = np.diff(np.r_[inicios, len(claves)])
+        sumas = np.add.reduceat(valores, inicios) if len(inicios) else np.empty(0, dtype=np.int64)
+
+        resultados_cuantiles = []
+        for cuantil in cuantiles:
+            posicion = inicios + (tamanos - 1) * cuantil
+            bajo = np.floor(posicion).astype(np.intp)
+            alto = np.ceil(posicion).astype(np.intp)
+            resultados_cuantiles.append(valores[bajo] + (valores[alto] - valores[bajo]) * (posicion - bajo))
+
+        filas = []
+        codigos = self._codigos_clave(claves[inicios], limites)
+        for indice, grupo in enumerate(zip(*(codigo.tolist() for codigo in codigos)) if dimensiones else [()] * len(inicios)):
+            filas.append({
+                **{
+                    dimension: self._decodificar(instantanea, dimension, codigo)
+                    for dimension, codigo in zip(dimensiones, grupo)
+                },
+                'n': int(tamanos[indice]),
+                'promedio': round(float(sumas[indice]) / int(tamanos[indice]), 2),
+                **{
+                    _etiqueta_cuantil(cuantil): round(float(resultado[indice]), 2)
+                    for cuantil, resultado in zip(cuantiles, resultados_cuantiles)
+                },
+            })
+        if cuantiles:
+            mayor = _etiqueta_cuantil(max(cuantiles))
+            filas.sort(key=lambda fila: -fila[mayor])
+        return {
+            'dimensiones': dimensiones,
+            'columna': columna,
+            'total': len(valores),
+            'grupos': len(filas),
+            'filas': filas[:limite] if limite else filas,
+            'filas_en_memoria': instantanea.filas,
+            'milisegundos': round((time.perf_counter() - inicio) * 1000, 2),
+        }
+
+    def _validar(self, dimensiones: List[str], filtros: Optional[Dict[str, List[str]]]):
+        desconocidas = [dimension for dimension in [*dimensiones, *(filtros or {})] if dimension not in DIMENSIONES_PIVOTE]
+        if desconocidas:
+            raise ValueError(f"Dimensiones no soportadas: {', '.join(desconocidas)}")
+        if len(set(dimensiones)) != len(dimensiones):
+            raise ValueError("Dimensiones repetidas")
+
+    def _obtener_instantanea(self) -> Instantanea:
+        instantanea = self._instantanea
+        if instantanea is None:
+            self.refrescar()
+            instantanea = self._instantanea
+        return instantanea
+
+    def _condiciones(
+        self,
+        instantanea: Instantanea,
+        filtros: Optional[Dict[str, List[str]]],
+        fecha_inicio: Optional[date],
+        fecha_fin: Optional[date],
+    ) -> List:
+        """Condiciones por bloque de filas: rango de fechas (cerrado) y valores permitidos por dimensión"""
+        condiciones = []
+        if fecha_inicio:
+            dia_inicio = _dia(fecha_inicio)
+            condiciones.append(lambda columnas: columnas['fecha'] >= dia_inicio)
+        if fecha_fin:
+            dia_fin = _dia(fecha_fin)
+            condiciones.append(lambda columnas: columnas['fecha'] <= dia_fin)
+        for dimension, valores in (filtros or {}).items():
+            condiciones.append(self._condicion(instantanea, dimension, valores))
+        return condiciones
+
+    def _rango(self, instantanea: Instantanea, dimension: str) -> Tuple[int, int]:
+        """(mínimo, cantidad de códigos posibles) de una dimensión"""
+        if dimension in COLUMNAS_CATEGORICAS:
+            return 0, max(len(instantanea.diccionarios[dimension].valores), 1)
+        minimo, maximo = instantanea.limites[dimension]
+        return minimo, maximo - minimo + 1
+
+    def _condicion(self, instantanea: Instantanea, dimension: str, valores: List[str]):
+        """Función que marca, en un bloque, las filas cuyo valor está entre los pedidos"""
+        codigos = self._codigos_filtro(instantanea, dimension, valores)
+        if len(codigos) <= 4:
+            # Pocas comparaciones vectorizadas son más rápidas que una tabla de búsqueda
+            def condicion(columnas):
+                mascara = np.zeros(len(columnas[dimension]), dtype=bool)
+                for codigo in codigos:
+                    mascara |= columnas[dimension] == codigo
+                return mascara
+            return condicion
+
+        minimo, rango = self._rango(instantanea, dimension)
+        tabla = np.zeros(rango, dtype=bool)
+        tabla[[codigo - minimo for codigo in codigos if 0 <= codigo - minimo < rango]] = True
+        return lambda columnas: tabla[columnas[dimension] - minimo if minimo else columnas[dimension]]
+
+    def _codigos_filtro(self, instantanea: Instantanea, dimension: str, valores: List[str]) -> List[int]:
+        if dimension in COLUMNAS_CATEGORICAS:
+            return instantanea.diccionarios[dimension].buscar(valores)
+        try:
+            if dimension == 'fecha':
+                return [_dia(date.fromisoformat(valor)) for valor in valores]
+            if dimension == 'mes':
+                meses = [datetime.strptime(valor, '%Y-%m') for valor in valores]
+                return [(mes.year - 1970) * 12 + mes.month - 1 for mes in meses]
+            return [int(valor) - 1970 for valor in valores]
+        except ValueError:
+            raise ValueError(f"Valor inválido para {dimension}: {', '.join(valores)}")
+
+    def _decodificar(self, instantanea: Instantanea, dimension: str, codigo: int) -> Any:
+        if dimension in COLUMNAS_CATEGORICAS:
+            return instantanea.diccionarios[dimension].valores[codigo]
+        return _decodificar_temporal(dimension, codigo)
+
+    def _agrupar(
+        self, instantanea: Instantanea, dimensiones: List[str], condiciones: List
+    ) -> Tuple[List[tuple], int]:
+        """Cuenta filas por combinación de códigos; devuelve los grupos y el total filtrado
+
+        Cada dimensión es un dígito de una clave entera mixta. Las claves se arman y filtran
+        por bloques que caben en caché y se cuentan con bincount (o unique si son muy dispersas).
+        """
+        limites = [self._rango(instantanea, dimension) for dimension in dimensiones]
+        combinaciones = int(np.prod([rango for _, rango in limites], dtype=np.float64))
+        por_bloque = combinaciones <= TAMANO_BLOQUE_PIVOTE
+
+        conteos = np.zeros(combinaciones if por_bloque else 0, dtype=np.int64)
+        pendientes = []
+        filas_filtradas = 0
+        for clave, _, _ in self._bloques(instantanea, dimensiones, limites, condiciones):
+            filas_filtradas += len(clave)
+            if por_bloque:
+                conteos += np.bincount(clave, minlength=combinaciones)
+            elif len(clave):
+                pendientes.append(clave.copy())
+
+        if por_bloque:
+            claves = np.flatnonzero(conteos)
+            conteos = conteos[claves]
+        else:
+            claves = np.concatenate(pendientes) if pendientes else np.empty(0, dtype=np.intp)
+            if combinaciones <= MAX_COMBINACIONES_DENSAS:
+                conteos = np.bincount(claves, minlength=combinaciones)
+                claves = np.flatnonzero(conteos)
+                conteos = conteos[claves]
+            else:
+                claves, conteos = np.unique(claves, return_counts=True)
+
+        codigos = self._codigos_clave(claves, limites)
+        grupos = list(zip(zip(*(codigo.tolist() for codigo in codigos)), conteos.tolist()))
+        return grupos, filas_filtradas
+
+    def _bloques(self, instantanea: Instantanea, dimensiones: List[str], limites: List[Tuple[int, int]], condiciones: List):
+        """Recorre la instantánea por bloques; entrega (claves filtradas, bloque, máscara o None)
+
+        La clave de cada bloque vive en un buffer reutilizado: hay que copiarla si se guarda.
+        """
+        buffer = np.empty(min(TAMANO_BLOQUE_PIVOTE, instantanea.filas), dtype=np.intp)
+        for desde in range(0, instantanea.filas, TAMANO_BLOQUE_PIVOTE):
+            bloque = {nombre: columna[desde:desde + TAMANO_BLOQUE_PIVOTE] for nombre, columna in instantanea.columnas.items()}
+            clave = buffer[:len(bloque['fecha'])]
+            clave[:] = 0
+            for dimension, (minimo, rango) in zip(dimensiones, limites):
+                clave *= rango
+                clave += bloque[dimension]
+                if minimo:
+                    clave -= minimo
+
+            mascara = None
+            for condicion in condiciones:
+                mascara = condicion(bloque) if mascara is None else mascara & condicion(bloque)
+            yield (clave[mascara] if mascara is not None else clave), bloque, mascara
+
+    def _codigos_clave(self, claves: np.ndarray, limites: List[Tuple[int, int]]) -> List[np.ndarray]:
+        """Decodifica la clave mixta en los códigos de cada dimensión"""
+        codigos = []
+        resto = claves
+        for minimo, rango in reversed(limites):
+            resto, codigo = np.divmod(resto, rango)
+            codigos.append(codigo + minimo)
+        codigos.reverse()
+        return codigos
+
+# Instancia compartida: se carga en la primera consulta y se actualiza tras cada ingesta
+almacen_analitico = AlmacenAnalitico(db.engine)
@@ -0,0 +1,193 @@
+import csv
+import io
+import logging
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from app.config import settings
+from app.models.database import IncidenciaOperativa
+from app.services.busqueda import texto_busqueda
+from app.services.calendario import calendario_de
+from app.services.catalogos import CatalogoDimensiones
+from app.services.data_processor import calcular_huella
+from app.services.rollup import RollupService
+
+logger = logging.getLogger(__name__)
+
+# Tabla temporal donde COPY deja cada bloque antes del INSERT ... ON CONFLICT
+TABLA_STAGING = 'staging_incidencias'
+
+class BulkInserter:
+    """Inserta incidencias procesadas en bloques, con un commit por bloque; omite las filas ya cargadas"""
+
+    def __init__(
+        self,
+        engine: Engine,
+        tamano_bloque: Optional[int] = None,
+        on_progreso: Optional[Callable[[Dict[str, Any]], None]] = None,
+        actualizar_rollup: bool = True,
+    ):
+        self.engine = engine
+        self.tabla = IncidenciaOperativa.__table__
+        self.tamano_bloque = tamano_bloque or settings.INSERT_CHUNK_SIZE
+        self.on_progreso = on_progreso
+        self.rollup = RollupService(engine) if actualizar_rollup else None
+        self.catalogos = CatalogoDimensiones(engine)
+        self.calendario = calendario_de(engine)
+
+        # Todas las columnas excepto la clave autoincremental (turno/tipo_dia/empresa como ids)
+        self.columnas = [columna.name for columna in self.tabla.columns if not columna.primary_key]
+        self.usar_copy = settings.USAR_COPY_POSTGRES and engine.dialect.name == 'postgresql'
+
+        self.filas_insertadas = 0
+        self.filas_duplicadas = 0
+        self.bloques = 0
+        # Segundos dentro de las transacciones de escritura (etapa 'insertar' de /metrics)
+        self.segundos_escritura = 0.0
+        # Días con filas confirmadas (para invalidar la caché de reportes)
+        self.dias: Set = set()
+
+    def insertar(self, filas: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Inserta todas las filas y devuelve un resumen con el rendimiento obtenido"""
+        inicio = time.perf_counter()
+        iterador = iter(filas)
+
+        while True:
+            bloque = list(islice(iterador, self.tamano_bloque))
+            if not bloque:
+                break
+            self._insertar_y_confirmar(bloque, inicio)
+
+        return self._resumen(inicio)
+
+    def insertar_lotes(self, lotes: Iterable[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Inserta lotes ya agrupados por el productor (un commit por lote)"""
+        inicio = time.perf_counter()
+
+        for lote in lotes:
+            if lote:
+                self._insertar_y_confirmar(lote, inicio)
+
+        return self._resumen(inicio)
+
+    def _insertar_y_confirmar(self, bloque: List[Dict[str, Any]], inicio: float):
+        """Escribe un bloque en su propia transacción y reporta el progreso"""
+        # Quitar repetidos dentro del bloque (misma huella); las filas originales conservan los nombres
+        originales = {}
+        for fila in bloque:
+            originales.setdefault(fila.get('huella') or calcular_huella(fila), fila)
+        self.catalogos.codificar(list(originales.values()))
+        # texto_busqueda se arma aquí para que toda vía de carga alimente el índice de texto
+        filas = [
+            {
+                **{columna: fila.get(columna) for columna in self.columnas},
+                'huella': huella,
+                'texto_busqueda': texto_busqueda(fila),
+            }
+            for huella, fila in originales.items()
+        ]
+
+        inicio_escritura = time.perf_counter()
+        with self.engine.begin() as conexion:
+            if self.usar_copy:
+                nuevas = self._copiar_bloque(conexion, filas)
+            else:
+                nuevas = self._insertar_nuevas(conexion, filas)
+            insertadas = [originales[huella] for huella in nuevas]
+            dias = {
+                fila['fecha'].date() if isinstance(fila['fecha'], datetime) else fila['fecha']
+                for fila in insertadas if fila.get('fecha') is not None
+            }
+            # Los reportes agrupan por la tabla calendario: sus años deben existir con las filas
+            self.calendario.asegurar(dias, conexion)
+            
+            # El rollup diario se actualiza en la misma transacción, solo con las filas escritas
+            if self.rollup:
+                self.rollup.acumular(conexion, insertadas)
+        self.segundos_escritura += time.perf_counter() - inicio_escritura
+
+        self.filas_insertadas += len(insertadas)
+        self.filas_duplicadas += len(bloque) - len(insertadas)
+        self.bloques += 1
+        self.dias.update(dias)
+
+        resumen = self._resumen(inicio)
+        logger.info(
+            f"Bloque {self.bloques} confirmado: {self.filas_insertadas} filas "
+            f"({self.filas_duplicadas} ya cargadas, {resumen['filas_por_segundo']:.0f} filas/s)"
+        )
+        if self.on_progreso:
+            self.on_progreso(resumen)
+
+    def _insertar_nuevas(self, conexion: Connection, filas: List[Dict[str, Any]]) -> List[str]:
+        """Inserta omitiendo las huellas existentes y devuelve las huellas escritas"""
+        dialecto = conexion.dialect.name
+
+        if dialecto in ('postgresql', 'sqlite'):
+            # executemany sobre un único INSERT ... ON CONFLICT DO NOTHING RETURNING (insertmanyvalues)
+            modulo = postgresql if dialecto == 'postgresql' else sqlite
+            sentencia = (
+                modulo.insert(self.tabla)
+                .on_conflict_do_nothing(index_elements=['huella'])
+                .returning(self.tabla.c.huella)
+            )
+            return conexion.execute(sentencia, filas).scalars().all()
+
+        # Otros dialectos: descartar las huellas existentes antes de insertar
+        existentes = set(conexion.execute(
+            select(self.tabla.c.huella).where(self.tabla.c.huella.in_([fila['huella'] for fila in filas]))
+        ).scalars())
+        nuevas = [fila for fila in filas if fila['huella'] not in existentes]
+        if nuevas:
+            conexion.execute(insert(self.tabla), nuevas)
+        return [fila['huella'] for fila in nuevas]
+
+    def _copiar_bloque(self, conexion: Connection, filas: List[Dict[str, Any]]) -> List[str]:
+        """Carga el bloque con COPY FROM STDIN a una tabla temporal y pasa las filas nuevas (solo PostgreSQL/psycopg2)"""
+        # COPY no pasa por los tipos de SQLAlchemy: las horas se convierten a segundos aquí
+        procesadores = [self.tabla.c[columna].type.bind_processor(conexion.dialect) for columna in self.columnas]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for fila in filas:
+            valores = (
+                procesador(fila[columna]) if procesador else fila[columna]
+                for columna, procesador in zip(self.columnas, procesadores)
+            )
+            writer.writerow(['\\N' if valor is None else valor for valor in valores])
+        buffer.seek(0)
+
+        columnas = ', '.join(self.columnas)
+        # Solo las columnas cargadas (sin id ni su secuencia); se vacía en cada commit
+        conexion.execute(text(
+            f"CREATE TEMP TABLE IF NOT EXISTS {TABLA_STAGING} ON COMMIT DELETE ROWS "
+            f"AS SELECT {columnas} FROM {self.tabla.name} WITH NO DATA"
+        ))
+        cursor = conexion.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {TABLA_STAGING} ({columnas}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+            )
+        finally:
+            cursor.close()
+
+        return conexion.execute(text(
+            f"INSERT INTO {self.tabla.name} ({columnas}) SELECT {columnas} FROM {TABLA_STAGING} "
+            "ON CONFLICT (huella) DO NOTHING RETURNING huella"
+        )).scalars().all()
+
+    def _resumen(self, inicio: float) -> Dict[str, Any]:
+        """Estadísticas acumuladas de la inserción"""
+        segundos = time.perf_counter() - inicio
+        return {
+            'filas_insertadas': self.filas_insertadas,
+            'filas_duplicadas': self.filas_duplicadas,
+            'bloques': self.bloques,
+            'segundos': round(segundos, 3),
+            'filas_por_segundo': self.filas_insertadas / segundos if segundos > 0 else 0.0,
+        }
@@ -0,0 +1,69 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, column, func, literal, literal_column, select, table
+
+from app.models.database import TABLA_BUSQUEDA, IncidenciaOperativa
+
+# Campos de texto libre que se indexan (concatenados en texto_busqueda)
+CAMPOS_BUSQUEDA = ('incidencia_primaria', 'incidencia_secundaria', 'observaciones', 'parada', 'ruta')
+
+# Palabras de q= que se consideran; el resto se ignora
+MAX_TERMINOS = 8
+
+# Configuración de texto de PostgreSQL (stemming en español); debe coincidir con el índice GIN
+CONFIGURACION_PG = literal_column("'spanish'::regconfig")
+
+_fts = table(TABLA_BUSQUEDA, column('rowid'))
+
+@lru_cache(maxsize=65536)
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas sin tildes ni diéresis (la ñ queda como n) y con espacios simples"""
+    descompuesto = unicodedata.normalize('NFKD', texto.casefold())
+    return ' '.join(''.join(caracter for caracter in descompuesto if not unicodedata.combining(caracter)).split())
+
+def texto_busqueda(fila: Dict[str, Any]) -> Optional[str]:
+    """Valor de texto_busqueda de una fila: los campos de CAMPOS_BUSQUEDA normalizados"""
+    partes = [
+        normalizar_texto(str(valor)) for valor in (fila.get(campo) for campo in CAMPOS_BUSQUEDA)
+        if valor is not None and str(valor).strip()
+    ]
+    return ' '.join(partes) or None
+
+def terminos_busqueda(q: str) -> List[str]:
+    """Palabras normalizadas de una búsqueda (solo letras y dígitos, sin operadores)"""
+    return re.findall(r'\w+', normalizar_texto(q or ''))[:MAX_TERMINOS]
+
+def coincidencias(palabras: List[str], dialecto: str):
+    """Subconsulta (id, puntaje) de las incidencias que contienen todas las palabras como prefijo
+
+    Un puntaje menor es más relevante: bm25 de FTS5 en SQLite, -ts_rank en PostgreSQL.
+    """
+    if dialecto == 'sqlite':
+        consulta = ' AND '.join(f'"{palabra}"*' for palabra in palabras)
+        return select(
+            _fts.c.rowid.label('id'),
+            func.bm25(literal_column(TABLA_BUSQUEDA)).label('puntaje')
+        ).where(literal_column(TABLA_BUSQUEDA).op('MATCH')(consulta)).subquery('coincidencias')
+
+    if dialecto == 'postgresql':
+        vector = func.to_tsvector(CONFIGURACION_PG, IncidenciaOperativa.texto_busqueda)
+        consulta = func.to_tsquery(CONFIGURACION_PG, ' & '.join(f'{palabra}:*' for palabra in palabras))
+        return select(
+            IncidenciaOperativa.id.label('id'),
+            (-func.ts_rank(vector, consulta)).label('puntaje')
+        ).where(vector.op('@@')(consulta)).subquery('coincidencias')
+
+    # Otros dialectos: sin índice de texto, LIKE por palabra y sin orden de relevancia
+    return select(
+        IncidenciaOperativa.id.label('id'),
+        literal(0.0).label('puntaje')
+    ).where(and_(*[
+        IncidenciaOperativa.texto_busqueda.contains(palabra, autoescape=True) for palabra in palabras
+    ])).subquery('coincidencias')
+
+def filtro_busqueda(palabras: List[str], dialecto: str):
+    """Condición sobre incidencias_operativas.id para usar q= como un filtro más"""
+    return IncidenciaOperativa.id.in_(select(coincidencias(palabras, dialecto).c.id))
@@ -0,0 +1,289 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from app.config import settings
+from app.models.database import db
+from app.services.cambios import cambios_desde, ultimo_cambio
+
+logger = logging.getLogger(__name__)
+
+# Rango de fechas del que depende una respuesta; None = depende de todas las fechas
+Rangos = Optional[List[Tuple[str, str]]]
+
+def normalizar_parametro(valor: Any) -> str:
+    """Normaliza un parámetro para la clave (las fechas YYYY-M-D quedan como YYYY-MM-DD)"""
+    if isinstance(valor, (date, datetime)):
+        return valor.strftime('%Y-%m-%d')
+    texto = str(valor).strip()
+    try:
+        return datetime.strptime(texto, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except ValueError:
+        return texto
+
+def normalizar_rangos(rangos: Optional[Iterable[Tuple[Any, Any]]]) -> Rangos:
+    """Convierte los rangos a pares ISO ordenados; ValueError si alguna fecha es inválida"""
+    if rangos is None:
+        return None
+    normalizados = []
+    for inicio, fin in rangos:
+        inicio, fin = (
+            valor if isinstance(valor, date) else datetime.strptime(str(valor).strip(), '%Y-%m-%d').date()
+            for valor in (inicio, fin)
+        )
+        normalizados.append((min(inicio, fin).isoformat(), max(inicio, fin).isoformat()))
+    return normalizados
+
+def afectada_por(rangos: Rangos, dias: List[str]) -> bool:
+    """Indica si alguno de los días (ISO, ordenados) cae dentro de los rangos de la entrada"""
+    if rangos is None:
+        return True
+    return any(inicio <= dia <= fin for inicio, fin in rangos for dia in dias)
+
+def se_superpone(rangos: Rangos, desde: str, hasta: str) -> bool:
+    """Indica si los rangos de la entrada se cruzan con [desde, hasta] (ISO)"""
+    if rangos is None:
+        return True
+    return any(inicio <= hasta and desde <= fin for inicio, fin in rangos)
+
+class BackendMemoria:
+    """LRU en proceso con expiración por entrada"""
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+            return entrada
+
+    def guardar(self, clave: str, entrada: Dict[str, Any], ttl: int) -> int:
+        """Guarda la entrada y devuelve cuántas se desalojaron por capacidad"""
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            desalojadas = 0
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                desalojadas += 1
+            return desalojadas
+
+    def eliminar(self, clave: str):
+        with self._lock:
+            self._entradas.pop(clave, None)
+
+    def entradas(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return iter(list(self._entradas.items()))
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+class BackendRedis:
+    """Backend compartido entre workers/procesos (requiere el paquete redis)"""
+
+    def __init__(self, url: str, prefijo: str = 'metrovia:cache:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requiere instalar el paquete 'redis'") from e
+        self.cliente = redis.Redis.from_url(url)
+        self.prefijo = prefijo
+
+    def obtener(self, clave: str) -> Optional[Dict[str, Any]]:
+        datos = self.cliente.get(self.prefijo + clave)
+        return json.loads(datos) if datos else None
+
+    def guardar(self, clave: str, entrada: Dict[str, Any], ttl: int) -> int:
+        # Redis expira y desaloja por su cuenta (maxmemory-policy)
+        self.cliente.set(self.prefijo + clave, json.dumps(entrada, default=str), ex=ttl)
+        return 0
+
+    def eliminar(self, clave: str):
+        self.cliente.delete(self.prefijo + clave)
+
+    def entradas(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for clave_redis in self.cliente.scan_iter(match=self.prefijo + '*'):
+            datos = self.cliente.get(clave_redis)
+            if datos:
+                yield clave_redis.decode()[len(self.prefijo):], json.loads(datos)
+
+    def limpiar(self):
+        for clave_redis in self.cliente.scan_iter(match=self.prefijo + '*'):
+            self.cliente.delete(clave_redis)
+
+class ResponseCache:
+    """Caché de respuestas de reportes: LRU + TTL, invalidada por los días que toca cada carga
+
+    Con engine, antes de responder aplica los cambios que otros procesos (CLI, otros workers) dejaron en
+    cambios_datos, como mucho una consulta cada CACHE_SINCRONIZACION_SEGUNDOS.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        ttl: Optional[int] = None,
+        habilitado: bool = True,
+        engine: Optional[Engine] = None,
+        intervalo_sincronizacion: Optional[float] = None,
+    ):
+        self.backend = backend or BackendMemoria(settings.CACHE_MAX_ENTRADAS)
+        self.ttl = ttl or settings.CACHE_TTL_SEGUNDOS
+        self.habilitado = habilitado
+        self.engine = engine
+        self.intervalo_sincronizacion = (
+            settings.CACHE_SINCRONIZACION_SEGUNDOS if intervalo_sincronizacion is None else intervalo_sincronizacion
+        )
+        self._lock = threading.Lock()
+        # Sube con cada invalidación: un cálculo que empezó antes no se guarda (podría tener datos viejos)
+        self._generacion = 0
+        # Último id de cambios_datos aplicado (None = aún no se leyó)
+        self._ultimo_cambio: Optional[int] = None
+        self._proxima_sincronizacion = 0.0
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    @staticmethod
+    def clave(endpoint: str, **params) -> str:
+        """Clave estable: endpoint + parámetros normalizados y ordenados (se omiten los None)"""
+        normalizados = {
+            nombre: normalizar_parametro(valor) for nombre, valor in params.items() if valor is not None
+        }
+        return f"{endpoint}?{json.dumps(normalizados, sort_keys=True, ensure_ascii=False)}"
+
+    async def obtener_o_calcular(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        rangos: Optional[Iterable[Tuple[Any, Any]]],
+        calcular: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Devuelve la respuesta cacheada o la calcula y la guarda con sus rangos de fechas"""
+        if not self.habilitado:
+            return await calcular()
+        try:
+            rangos = normalizar_rangos(rangos)
+        except ValueError:
+            # Fechas inválidas: el cálculo reporta el error y no se cachea nada
+            return await calcular()
+
+        if self.engine is not None and time.monotonic() >= self._proxima_sincronizacion:
+            await run_in_threadpool(self.sincronizar)
+
+        clave = self.clave(endpoint, **params)
+        entrada = self.backend.obtener(clave)
+        if entrada is not None and entrada['expira'] > time.time():
+            self._contar('aciertos')
+            return entrada['valor']
+        if entrada is not None:
+            self.backend.eliminar(clave)
+            self._contar('desalojos')
+
+        self._contar('fallos')
+        generacion = self._generacion
+        valor = await calcular()
+        # Una carga que invalidó mientras se calculaba pudo quedar fuera del resultado
+        if generacion != self._generacion:
+            return valor
+        entrada = {'valor': valor, 'rangos': rangos, 'expira': time.time() + self.ttl}
+        self._contar('desalojos', self.backend.guardar(clave, entrada, self.ttl))
+        return valor
+
+    def invalidar_dias(self, dias: Iterable[Any]) -> int:
+        """Elimina las entradas cuyo rango incluye alguno de los días cargados"""
+        dias = sorted({normalizar_parametro(dia) for dia in dias if dia is not None})
+        if not dias:
+            return 0
+        eliminadas = self._eliminar_si(lambda rangos: afectada_por(rangos, dias))
+        logger.info(f"Caché: {eliminadas} respuestas invalidadas ({dias[0]} a {dias[-1]})")
+        return eliminadas
+
+    def invalidar_rango(self, desde: Any, hasta: Any) -> int:
+        """Elimina las entradas cuyo rango se cruza con [desde, hasta]"""
+        desde, hasta = normalizar_parametro(desde), normalizar_parametro(hasta)
+        eliminadas = self._eliminar_si(lambda rangos: se_superpone(rangos, desde, hasta))
+        logger.info(f"Caché: {eliminadas} respuestas invalidadas ({desde} a {hasta})")
+        return eliminadas
+
+    def sincronizar(self) -> int:
+        """Aplica los cambios registrados en cambios_datos desde la última vez; devuelve cuántos"""
+        with self._lock:
+            self._proxima_sincronizacion = time.monotonic() + self.intervalo_sincronizacion
+            desde = self._ultimo_cambio
+        try:
+            if desde is None:
+                # Al iniciar la caché está vacía: los cambios anteriores ya están en la base
+                with self._lock:
+                    self._ultimo_cambio = ultimo_cambio(self.engine)
+                return 0
+            cambios = cambios_desde(self.engine, desde)
+        except Exception as e:
+            logger.warning(f"Caché: no se pudieron leer los cambios de datos: {str(e)}")
+            return 0
+
+        for cambio in cambios:
+            if cambio.desde is None or cambio.hasta is None:
+                self.limpiar()
+            else:
+                self.invalidar_rango(cambio.desde, cambio.hasta)
+        if cambios:
+            with self._lock:
+                self._ultimo_cambio = max(self._ultimo_cambio or 0, cambios[-1].id)
+        return len(cambios)
+
+    def limpiar(self):
+        with self._lock:
+            self._generacion += 1
+        self.backend.limpiar()
+
+    def _eliminar_si(self, afectada: Callable[[Rangos], bool]) -> int:
+        """Elimina las entradas cuyos rangos cumplen la condición y cuenta la invalidación"""
+        with self._lock:
+            self._generacion += 1
+        eliminadas = 0
+        for clave, entrada in self.backend.entradas():
+            if afectada(entrada['rangos']):
+                self.backend.eliminar(clave)
+                eliminadas += 1
+        self._contar('invalidaciones', eliminadas)
+        return eliminadas
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'backend': type(self.backend).__name__,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'desalojos': self.desalojos,
+                'invalidaciones': self.invalidaciones,
+                'tasa_aciertos': round(self.aciertos / consultas, 3) if consultas else 0.0,
+                'ttl_segundos': self.ttl,
+            }
+
+    def _contar(self, contador: str, cantidad: int = 1):
+        if cantidad:
+            with self._lock:
+                setattr(self, contador, getattr(self, contador) + cantidad)
+
+def crear_cache() -> ResponseCache:
+    """Caché configurada según settings (memoria por defecto, redis opcional)"""
+    backend = BackendRedis(settings.CACHE_REDIS_URL) if settings.CACHE_BACKEND == 'redis' else None
+    return ResponseCache(backend, habilitado=settings.CACHE_HABILITADO, engine=db.engine)
+
+# Instancia compartida por los routers y la ingesta
+cache_respuestas = crear_cache()
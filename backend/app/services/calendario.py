@@ -0,0 +1,226 @@
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Set, Union
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from app.config import settings
+from app.models.database import Calendario, ResumenDiario
+
+logger = logging.getLogger(__name__)
+
+# Tipos de día (catálogo tipos_dia)
+LABORAL = 'Laboral'
+FIN_DE_SEMANA = 'Fin de semana'
+FESTIVO = 'Festivo'
+NO_DEFINIDO = 'No definido'
+
+# Feriados nacionales de fecha fija: (mes, día) -> nombre
+FESTIVOS_NACIONALES = {
+    (1, 1): 'Año Nuevo',
+    (5, 1): 'Día del Trabajo',
+    (5, 24): 'Batalla de Pichincha',
+    (8, 10): 'Primer Grito de Independencia',
+    (10, 9): 'Independencia de Guayaquil',
+    (11, 2): 'Día de los Difuntos',
+    (11, 3): 'Independencia de Cuenca',
+    (12, 25): 'Navidad',
+}
+# Feriados locales de Guayaquil (la ciudad donde opera el sistema)
+FESTIVOS_LOCALES = {
+    (7, 25): 'Fundación de Guayaquil',
+}
+# Solo se trasladan si caen en fin de semana (no los mueve la regla de martes a jueves)
+SOLO_TRASLADO_FIN_DE_SEMANA = {(1, 1), (12, 25)}
+
+# Traslado de la LOSEP por día de la semana (0=lunes): martes al lunes anterior, miércoles y jueves
+# al viernes, sábado al viernes anterior y domingo al lunes siguiente
+TRASLADO = {0: 0, 1: -1, 2: 2, 3: 1, 4: 0, 5: -1, 6: 1}
+# Difuntos e Independencia de Cuenca se trasladan juntos, como en los decretos de años recientes:
+# día de la semana del 2 de noviembre -> (días que se mueve el 2, días que se mueve el 3)
+TRASLADO_NOVIEMBRE = {0: (0, 0), 1: (-1, -1), 2: (1, 1), 3: (0, 0), 4: (0, 0), 5: (-1, 1), 6: (1, 1)}
+
+# Inicio del periodo al que pertenece cada día, por granularidad (columnas inicio_* del calendario)
+PERIODOS = {
+    'dia': lambda dia: dia,
+    'semana': lambda dia: dia - timedelta(days=dia.weekday()),
+    'mes': lambda dia: dia.replace(day=1),
+    'trimestre': lambda dia: dia.replace(month=(dia.month - 1) // 3 * 3 + 1, day=1),
+}
+COLUMNAS_PERIODO = {
+    'dia': Calendario.fecha,
+    'semana': Calendario.inicio_semana,
+    'mes': Calendario.inicio_mes,
+    'trimestre': Calendario.inicio_trimestre,
+}
+
+def domingo_de_pascua(anio: int) -> date:
+    """Domingo de Pascua del calendario gregoriano (algoritmo anónimo de Meeus/Jones/Butcher)"""
+    a, b, c = anio % 19, anio // 100, anio % 100
+    d, e = b // 4, b % 4
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    return date(anio, mes, (h + l - 7 * m + 114) % 31 + 1)
+
+def _festivos_nominales(anio: int) -> List[tuple]:
+    """(día de descanso, nombre) de los feriados del año, ya trasladados"""
+    pascua = domingo_de_pascua(anio)
+    festivos = [
+        (pascua - timedelta(days=48), 'Carnaval'),
+        (pascua - timedelta(days=47), 'Carnaval'),
+        (pascua - timedelta(days=2), 'Viernes Santo'),
+    ]
+    traslado_noviembre = TRASLADO_NOVIEMBRE[date(anio, 11, 2).weekday()]
+    for (mes, dia), nombre in {**FESTIVOS_NACIONALES, **FESTIVOS_LOCALES}.items():
+        fecha = date(anio, mes, dia)
+        if settings.FESTIVOS_TRASLADO:
+            if (mes, dia) in ((11, 2), (11, 3)):
+                desplazamiento = traslado_noviembre[dia - 2]
+            elif (mes, dia) in SOLO_TRASLADO_FIN_DE_SEMANA:
+                desplazamiento = TRASLADO[fecha.weekday()] if fecha.weekday() >= 5 else 0
+            else:
+                desplazamiento = TRASLADO[fecha.weekday()]
+            fecha += timedelta(days=desplazamiento)
+        festivos.append((fecha, nombre))
+    return festivos
+
+@lru_cache(maxsize=None)
+def festivos(anio: int) -> Dict[date, str]:
+    """Días de descanso del año -> nombre del feriado (incluye FESTIVOS_ADICIONALES)"""
+    resultado: Dict[date, str] = {}
+    # El 1 de enero en sábado se descansa el 31 de diciembre del año anterior
+    for fecha, nombre in _festivos_nominales(anio) + _festivos_nominales(anio + 1):
+        if fecha.year == anio:
+            resultado[fecha] = f"{resultado[fecha]} / {nombre}" if fecha in resultado else nombre
+    for texto, nombre in settings.FESTIVOS_ADICIONALES.items():
+        fecha = datetime.strptime(texto, '%Y-%m-%d').date()
+        if fecha.year != anio:
+            continue
+        if nombre:
+            resultado[fecha] = nombre
+        else:
+            resultado.pop(fecha, None)
+    return resultado
+
+def tipo_dia(fecha: Union[date, datetime, None]) -> str:
+    """Laboral, Fin de semana o Festivo según el calendario; No definido sin fecha"""
+    if fecha is None:
+        return NO_DEFINIDO
+    dia = fecha.date() if isinstance(fecha, datetime) else fecha
+    if dia in festivos(dia.year):
+        return FESTIVO
+    return FIN_DE_SEMANA if dia.weekday() >= 5 else LABORAL
+
+def dia_calendario(dia: date) -> Dict[str, Any]:
+    """Fila de la tabla calendario para un día"""
+    anio_iso, semana_iso, dia_semana = dia.isocalendar()
+    nombre_festivo = festivos(dia.year).get(dia)
+    tipo = tipo_dia(dia)
+    return {
+        'fecha': dia,
+        'anio': dia.year,
+        'trimestre': (dia.month - 1) // 3 + 1,
+        'mes': dia.month,
+        'dia_semana': dia_semana,
+        'anio_iso': anio_iso,
+        'semana_iso': semana_iso,
+        'inicio_semana': PERIODOS['semana'](dia),
+        'inicio_mes': PERIODOS['mes'](dia),
+        'inicio_trimestre': PERIODOS['trimestre'](dia),
+        'tipo_dia': tipo,
+        'festivo': nombre_festivo,
+        'laborable': tipo == LABORAL,
+    }
+
+def dias_del_anio(anio: int) -> List[Dict[str, Any]]:
+    """Filas del calendario de un año completo"""
+    inicio = date(anio, 1, 1)
+    return [dia_calendario(inicio + timedelta(days=dia)) for dia in range((date(anio + 1, 1, 1) - inicio).days)]
+
+class CalendarioDimension:
+    """Tabla calendario: los años se agregan completos al vuelo y se cachean"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.tabla = Calendario.__table__
+        self._anios: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def asegurar(self, dias: Iterable[Union[date, int]], conexion: Optional[Connection] = None) -> Set[int]:
+        """Agrega los años que falten de estos días (o años) y devuelve los agregados
+
+        Sin conexión, los años nuevos se confirman en una transacción propia; con conexión,
+        quedan dentro de la del llamador.
+        """
+        anios = {dia if isinstance(dia, int) else dia.year for dia in dias if dia is not None}
+        if not anios - self._anios:
+            return set()
+        with self._lock:
+            if conexion is not None:
+                agregados = self._agregar(conexion, anios - self._anios)
+            else:
+                with self.engine.begin() as propia:
+                    agregados = self._agregar(propia, anios - self._anios)
+            self._anios.update(anios)
+        return agregados
+
+    def asegurar_datos(self) -> Set[int]:
+        """Años con incidencias (según daily_rollup) y el actual"""
+        with self.engine.connect() as conexion:
+            primera, ultima = conexion.execute(
+                select(func.min(ResumenDiario.fecha), func.max(ResumenDiario.fecha))
+            ).one()
+        anios = {date.today().year}
+        if primera and ultima:
+            anios.update(range(_anio(primera), _anio(ultima) + 1))
+        return self.asegurar(anios)
+
+    def regenerar(self, anios: Iterable[int]) -> int:
+        """Reescribe los años indicados (p. ej. tras cambiar FESTIVOS_ADICIONALES)"""
+        anios = sorted(set(anios))
+        festivos.cache_clear()
+        filas = [fila for anio in anios for fila in dias_del_anio(anio)]
+        with self._lock, self.engine.begin() as conexion:
+            conexion.execute(delete(self.tabla).where(self.tabla.c.anio.in_(anios)))
+            if filas:
+                conexion.execute(insert(self.tabla), filas)
+            self._anios.update(anios)
+        logger.info(f"Calendario regenerado: {', '.join(map(str, anios))} ({len(filas)} días)")
+        return len(filas)
+
+    def _agregar(self, conexion: Connection, anios: Set[int]) -> Set[int]:
+        """Inserta los años que todavía no están en la tabla"""
+        existentes = set(conexion.execute(
+            select(self.tabla.c.anio).where(self.tabla.c.anio.in_(anios)).distinct()
+        ).scalars())
+        faltantes = sorted(anios - existentes)
+        if not faltantes:
+            return set()
+
+        filas = [fila for anio in faltantes for fila in dias_del_anio(anio)]
+        dialecto = conexion.dialect.name
+        if dialecto in ('postgresql', 'sqlite'):
+            # Dos procesos pueden agregar el mismo año a la vez
+            modulo = postgresql if dialecto == 'postgresql' else sqlite
+            conexion.execute(modulo.insert(self.tabla).on_conflict_do_nothing(index_elements=['fecha']), filas)
+        else:
+            conexion.execute(insert(self.tabla), filas)
+        logger.info(f"Calendario: años {', '.join(map(str, faltantes))} agregados")
+        return set(faltantes)
+
+def _anio(valor) -> int:
+    """Año de un date o de la cadena 'YYYY-MM-DD' que devuelven algunos drivers en agregados"""
+    return valor.year if isinstance(valor, date) else int(str(valor)[:4])
+
+@lru_cache(maxsize=None)
+def calendario_de(engine: Engine) -> CalendarioDimension:
+    """Instancia compartida por engine: su caché de años evita consultar la tabla en cada lote"""
+    return CalendarioDimension(engine)
@@ -0,0 +1,54 @@
+import logging
+from datetime import date, datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from app.models.database import CambioDatos
+
+logger = logging.getLogger(__name__)
+
+# Tipos de cambio: qué debe descartar cada proceso al verlos
+INGESTA = 'ingesta'          # filas nuevas (ids mayores): el almacén analítico solo las agrega
+REESCRITURA = 'reescritura'  # filas cambiadas en su lugar (reproceso, tipo_dia): el almacén se recarga
+ROLLUP = 'rollup'            # daily_rollup reconstruido: solo los reportes cacheados
+
+class Cambio(NamedTuple):
+    id: int
+    tipo: str
+    desde: Optional[date]
+    hasta: Optional[date]
+
+def registrar_cambio(engine: Engine, tipo: str, dias: Optional[Iterable[date]] = None) -> int:
+    """Agrega al registro el rango de días tocado (None = todas las fechas) y devuelve su id
+
+    Lo escribe el proceso que cambió los datos (API o CLI); los demás lo ven en su próxima consulta.
+    """
+    dias = sorted(set(dias)) if dias is not None else None
+    if dias is not None and not dias:
+        return 0
+    with engine.begin() as conexion:
+        return conexion.execute(
+            insert(CambioDatos).values(
+                tipo=tipo,
+                desde=dias[0] if dias else None,
+                hasta=dias[-1] if dias else None,
+                registrado=datetime.now(),
+            )
+        ).inserted_primary_key[0]
+
+def ultimo_cambio(engine: Engine) -> int:
+    """Id del último cambio registrado (0 si no hay ninguno)"""
+    with engine.connect() as conexion:
+        return conexion.execute(select(func.max(CambioDatos.id))).scalar() or 0
+
+def cambios_desde(engine: Engine, desde_id: int) -> List[Cambio]:
+    """Cambios registrados después de desde_id, en orden"""
+    with engine.connect() as conexion:
+        filas = conexion.execute(
+            select(CambioDatos.id, CambioDatos.tipo, CambioDatos.desde, CambioDatos.hasta)
+            .where(CambioDatos.id > desde_id)
+            .order_by(CambioDatos.id)
+        ).all()
+    return [Cambio(*fila) for fila in filas]
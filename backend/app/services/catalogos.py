@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from app.models.database import CATALOGOS, IncidenciaOperativa
+
+def columna_id(dimension: str) -> str:
+    """Columna FK de incidencias_operativas para una dimensión de catálogo"""
+    return f'{dimension}_id'
+
+def unir_catalogos(tabla=None):
+    """incidencias_operativas LEFT JOIN cada catálogo (para leer los nombres en consultas masivas)"""
+    tabla = tabla if tabla is not None else IncidenciaOperativa.__table__
+    fuente = tabla
+    for dimension, catalogo in CATALOGOS.items():
+        catalogo = catalogo.__table__
+        fuente = fuente.outerjoin(catalogo, catalogo.c.id == tabla.c[columna_id(dimension)])
+    return fuente
+
+def columna_nombre(dimension: str, tabla=None):
+    """Nombre de la dimensión dentro de unir_catalogos(); las demás columnas se leen tal cual"""
+    tabla = tabla if tabla is not None else IncidenciaOperativa.__table__
+    if dimension in CATALOGOS:
+        return CATALOGOS[dimension].__table__.c.nombre
+    return tabla.c[dimension]
+
+class CatalogoDimensiones:
+    """Ids de turno, tipo_dia y empresa; los nombres nuevos se registran al vuelo y se cachean"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self._ids: Dict[str, Dict[str, int]] = {dimension: {} for dimension in CATALOGOS}
+        self._lock = threading.Lock()
+
+    def ids(
+        self, dimension: str, nombres: Iterable[Optional[str]], conexion: Optional[Connection] = None
+    ) -> Dict[str, int]:
+        """nombre -> id para los nombres pedidos (los ids nunca cambian: la caché no se invalida)
+
+        Sin conexión, los nombres nuevos se confirman en una transacción propia; con conexión,
+        quedan dentro de la del llamador.
+        """
+        cache = self._ids[dimension]
+        faltantes = {str(nombre) for nombre in nombres if nombre is not None} - set(cache)
+        if faltantes:
+            with self._lock:
+                if conexion is not None:
+                    cache.update(self._registrar(conexion, dimension, faltantes))
+                else:
+                    with self.engine.begin() as propia:
+                        cache.update(self._registrar(propia, dimension, faltantes))
+        return cache
+
+    def codificar(self, filas: List[Dict[str, Any]], conexion: Optional[Connection] = None):
+        """Agrega <dimensión>_id a cada fila a partir de su nombre (None si no tiene)"""
+        for dimension in CATALOGOS:
+            ids = self.ids(dimension, {fila.get(dimension) for fila in filas}, conexion)
+            clave = columna_id(dimension)
+            for fila in filas:
+                nombre = fila.get(dimension)
+                fila[clave] = None if nombre is None else ids[str(nombre)]
+
+    def _registrar(self, conexion: Connection, dimension: str, nombres: set) -> Dict[str, int]:
+        """Inserta los nombres que falten y devuelve sus ids"""
+        tabla = CATALOGOS[dimension].__table__
+        dialecto = conexion.dialect.name
+        if dialecto in ('postgresql', 'sqlite'):
+            modulo = postgresql if dialecto == 'postgresql' else sqlite
+            conexion.execute(
+                modulo.insert(tabla).on_conflict_do_nothing(index_elements=['nombre']),
+                [{'nombre': nombre} for nombre in nombres]
+            )
+        else:
+            existentes = set(conexion.execute(
+                select(tabla.c.nombre).where(tabla.c.nombre.in_(nombres))
+            ).scalars())
+            if nombres - existentes:
+                conexion.execute(insert(tabla), [{'nombre': nombre} for nombre in nombres - existentes])
+
+        return dict(conexion.execute(
+            select(tabla.c.nombre, tabla.c.id).where(tabla.c.nombre.in_(nombres))
+        ).all())
@@ -1,7 +1,83 @@
+import hashlib
+import re
+import numpy as np
 import pandas as pd
 from datetime import datetime, time
-from typing import Dict, Any
+from typing import Dict, Any, Callable, List
 from app.config import settings
+from app.models.database import hora_a_segundos
+from app.services.calendario import tipo_dia
+
+# Límites de turno (se comparan contra objetos time ya parseados)
+HORA_INICIO_TARDE = time(12, 0, 0)
+HORA_INICIO_NOCHE = time(18, 0, 0)
+
+# Medio día: diferencias mayores se interpretan como cruce de medianoche (23:55 -> 00:05 = +10 min)
+MEDIO_DIA_SEGUNDOS = 12 * 3600
+
+def calcular_retraso(hora_programada: Any, hora_real: Any):
+    """Segundos de hora_real - hora_programada (negativo = adelanto); None si falta alguna hora"""
+    programada, real = hora_a_segundos(hora_programada), hora_a_segundos(hora_real)
+    if programada is None or real is None:
+        return None
+    retraso = real - programada
+    if retraso > MEDIO_DIA_SEGUNDOS:
+        retraso -= 2 * MEDIO_DIA_SEGUNDOS
+    elif retraso < -MEDIO_DIA_SEGUNDOS:
+        retraso += 2 * MEDIO_DIA_SEGUNDOS
+    return retraso
+
+# Campos que identifican una incidencia entre cargas (huella de fila)
+CAMPOS_HUELLA = ('fecha', 'bus', 'hora_programada', 'incidencia_primaria', 'codigo_de_conductor')
+
+# Códigos que se guardan en forma canónica: una columna Bus con vacíos llega como float desde
+# pd.read_excel (1234.0) y como int desde openpyxl (1234); ambas rutas deben guardar '1234'
+CAMPOS_CODIGO = ('bus', 'bus_de_cambio', 'codigo_de_conductor')
+
+# Texto '1234.0' guardado por cargas anteriores a la forma canónica
+_TEXTO_FLOAT_ENTERO = re.compile(r'-?\d+\.0+')
+
+def valor_canonico(valor: Any) -> Any:
+    """Forma canónica de un código o campo de huella: números enteros sin '.0' y texto sin espacios"""
+    if valor is None or valor is pd.NaT or valor is pd.NA:
+        return None
+    if isinstance(valor, (bool, np.bool_)):
+        return str(bool(valor))
+    if isinstance(valor, (int, np.integer)):
+        return str(int(valor))
+    if isinstance(valor, (float, np.floating)):
+        if np.isnan(valor):
+            return None
+        return str(int(valor)) if float(valor).is_integer() else str(float(valor))
+    if isinstance(valor, str):
+        texto = valor.strip()
+        if _TEXTO_FLOAT_ENTERO.fullmatch(texto):
+            texto = texto.split('.')[0]
+        return texto or None
+    return str(valor)
+
+def _parte_huella(valor: Any) -> str:
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    valor = valor_canonico(valor)
+    return '' if valor is None else valor
+
+def calcular_huella(fila: Dict[str, Any]) -> str:
+    """SHA-1 de los campos identificadores en forma canónica; los nulos cuentan como vacío"""
+    partes = [_parte_huella(fila.get(campo)) for campo in CAMPOS_HUELLA]
+    return hashlib.sha1('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
+def calcular_huellas(df: pd.DataFrame) -> List[str]:
+    """calcular_huella para todas las filas de un DataFrame limpio"""
+    partes = []
+    for campo in CAMPOS_HUELLA:
+        serie = df[campo]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            serie = serie.dt.strftime('%Y-%m-%d %H:%M:%S')
+        elif campo == 'fecha':
+            serie = serie.map(lambda valor: valor.strftime('%Y-%m-%d %H:%M:%S') if isinstance(valor, datetime) else valor)
+        partes.append([_parte_huella(valor) for valor in serie.to_numpy(dtype=object)])
+    return [hashlib.sha1('\x1f'.join(valores).encode('utf-8')).hexdigest() for valores in zip(*partes)]
 
 class DataProcessor:
     def __init__(self):
@@ -13,10 +89,8 @@ class DataProcessor:
         ]
     
     def determinar_tipo_dia(self, fecha: datetime) -> str:
-        """Determina si es día laboral, fin de semana o festivo"""
-        if fecha.weekday() >= 5:  # 5=Sábado, 6=Domingo
-            return 'Fin de semana'
-        return 'Laboral'
+        """Determina si es día laboral, fin de semana o festivo (feriados de Ecuador y de Guayaquil)"""
+        return tipo_dia(fecha)
     
     def determinar_turno(self, hora_str: str) -> str:
         """Determina el turno basado en la hora"""
@@ -51,9 +125,9 @@ class DataProcessor:
     
     def _clasificar_turno_desde_time(self, hora: time) -> str:
         """Clasifica turno desde objeto time"""
-        if hora < datetime.strptime('12:00:00', '%H:%M:%S').time():
+        if hora < HORA_INICIO_TARDE:
             return 'Mañana'
-        elif hora < datetime.strptime('18:00:00', '%H:%M:%S').time():
+        elif hora < HORA_INICIO_NOCHE:
             return 'Tarde'
         else:
             return 'Noche'
@@ -105,6 +179,23 @@ class DataProcessor:
         # Si es otro tipo, convertir a string
         return str(tiempo_valor)
     
+    def _convertir_fecha(self, fecha) -> datetime:
+        """Convierte el valor de la columna fecha a datetime (None si no es válido)"""
+        if isinstance(fecha, str):
+            try:
+                return datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S')
+            except:
+                try:
+                    return datetime.strptime(fecha, '%Y-%m-%d')
+                except:
+                    return None
+        elif hasattr(fecha, 'to_pydatetime'):
+            # Si es Timestamp de pandas
+            return fecha.to_pydatetime()
+        elif isinstance(fecha, datetime):
+            return fecha
+        return None
+    
     def limpiar_datos(self, fila: Dict[str, Any]) -> Dict[str, Any]:
         """Limpia y normaliza los datos del Excel"""
         datos_limpios = {}
@@ -116,8 +207,10 @@ class DataProcessor:
                 # Convertir TODAS las columnas de tiempo a string
                 if key in self.columnas_tiempo:
                     datos_limpios[key] = self.convertir_tiempo_a_string(value)
+                elif key in CAMPOS_CODIGO:
+                    datos_limpios[key] = valor_canonico(value)
                 else:
-                    datos_limpios[key].lower() if isinstance(value, str) else value
+                    datos_limpios[key] = value
         
         return datos_limpios
     
@@ -127,22 +220,7 @@ class DataProcessor:
         fila_limpia = self.limpiar_datos(fila)
         
         # Procesar fecha
-        fecha = fila_limpia.get('fecha')
-        fecha_obj = None
-        
-        if isinstance(fecha, str):
-            try:
-                fecha_obj = datetime.strptime(fecha, '%Y-%m-%d %H:%M:%S')
-            except:
-                try:
-                    fecha_obj = datetime.strptime(fecha, '%Y-%m-%d')
-                except:
-                    fecha_obj = None
-        elif hasattr(fecha, 'to_pydatetime'):
-            # Si es Timestamp de pandas
-            fecha_obj = fecha.to_pydatetime()
-        elif isinstance(fecha, datetime):
-            fecha_obj = fecha
+        fecha_obj = self._convertir_fecha(fila_limpia.get('fecha'))
         
         resultado = fila_limpia.copy()
         
@@ -157,5 +235,123 @@ class DataProcessor:
             
         resultado['turno'] = self.determinar_turno(fila_limpia.get('hora_programada', ''))
         resultado['empresa'] = self.extraer_empresa(fila_limpia.get('operador', ''))
+        resultado['retraso_seg'] = calcular_retraso(fila_limpia.get('hora_programada'), fila_limpia.get('hora_real'))
+        
+        return resultado
+    
+    def procesar_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Procesa un DataFrame completo por columnas; equivale a procesar_fila en cada fila"""
+        return self.derivar_columnas(self.limpiar_dataframe(df))
+    
+    def limpiar_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Limpieza por columnas (sin campos derivados): es lo que se guarda en el staging Parquet"""
+        resultado = pd.DataFrame(index=df.index)
+        
+        # Nulos a None y columnas de tiempo a string HH:MM:SS
+        for columna in df.columns:
+            serie = df[columna]
+            if columna in self.columnas_tiempo:
+                resultado[columna] = self._normalizar_columna_tiempo(serie)
+            elif columna == 'fecha':
+                # Se convierte más abajo a partir de la columna original
+                resultado[columna] = serie
+            elif columna in CAMPOS_CODIGO:
+                # Mismo texto para .xls y .xlsx (float o int según haya vacíos en la columna)
+                resultado[columna] = self._mapear_valores_unicos(serie, valor_canonico)
+            else:
+                resultado[columna] = serie.astype(object).where(serie.notna(), None)
+        
+        # Fecha: la función escalar se evalúa una vez por valor distinto
+        resultado['fecha'] = self._mapear_valores_unicos(
+            self._columna_o_constante(resultado, 'fecha', None), self._convertir_fecha
+        )
+        return resultado
+    
+    def derivar_columnas(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Agrega tipo_dia, turno, empresa y retraso_seg a un DataFrame ya limpio (reglas actuales de settings)"""
+        df['tipo_dia'] = self._mapear_valores_unicos(df['fecha'], self._tipo_dia_o_no_definido)
+        df['turno'] = self._mapear_valores_unicos(
+            self._columna_o_constante(df, 'hora_programada', ''), self.determinar_turno
+        )
+        df['empresa'] = self._mapear_valores_unicos(
+            self._columna_o_constante(df, 'operador', ''), self.extraer_empresa
+        )
+        df['retraso_seg'] = self._retrasos(df)
+        return df
+    
+    def _retrasos(self, df: pd.DataFrame) -> pd.Series:
+        """Versión por columnas de calcular_retraso (cada hora distinta se interpreta una sola vez)"""
+        programada, real = (
+            pd.to_numeric(
+                self._mapear_valores_unicos(self._columna_o_constante(df, columna, None), hora_a_segundos)
+            ).to_numpy(dtype=np.float64)
+            for columna in ('hora_programada', 'hora_real')
+        )
+        retraso = real - programada
+        retraso = np.where(retraso > MEDIO_DIA_SEGUNDOS, retraso - 2 * MEDIO_DIA_SEGUNDOS, retraso)
+        retraso = np.where(retraso < -MEDIO_DIA_SEGUNDOS, retraso + 2 * MEDIO_DIA_SEGUNDOS, retraso)
+        validos = ~np.isnan(retraso)
+        resultado = np.full(len(df), None, dtype=object)
+        resultado[validos] = retraso[validos].astype(np.int64).tolist()
+        return pd.Series(resultado, index=df.index, dtype=object)
+    
+    def _tipo_dia_o_no_definido(self, fecha: datetime) -> str:
+        """Tipo de día para una fecha ya convertida, 'No definido' si no hay fecha"""
+        return self.determinar_tipo_dia(fecha) if fecha else 'No definido'
+    
+    def _columna_o_constante(self, df: pd.DataFrame, columna: str, valor_defecto) -> pd.Series:
+        """Devuelve la columna si existe o una serie constante con el valor por defecto"""
+        if columna in df.columns:
+            return df[columna]
+        return pd.Series([valor_defecto] * len(df), index=df.index, dtype=object)
+    
+    def _mapear_valores_unicos(self, serie: pd.Series, funcion: Callable) -> pd.Series:
+        """Aplica una función escalar una sola vez por cada valor distinto de la serie"""
+        # Las series object se factorizan como ndarray para no inferir tipos en los únicos
+        datos = serie.to_numpy() if serie.dtype == object else serie
+        codigos, unicos = pd.factorize(datos)
+        # El código -1 (nulos) toma el último elemento: el resultado de funcion(None)
+        resultados = np.empty(len(unicos) + 1, dtype=object)
+        resultados[:-1] = [funcion(valor) for valor in unicos]
+        resultados[-1] = funcion(None)
+        return pd.Series(resultados[codigos], index=serie.index, dtype=object)
+    
+    def _normalizar_columna_tiempo(self, serie: pd.Series) -> pd.Series:
+        """Versión por columna de convertir_tiempo_a_string"""
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            texto = serie.dt.strftime('%H:%M:%S')
+            return texto.astype(object).where(serie.notna(), None)
+        
+        if pd.api.types.is_float_dtype(serie):
+            valores = serie.to_numpy(dtype=np.float64)
+            # Solo se vectorizan los valores que caben en int64; el resto usa la ruta escalar
+            vectorizables = np.isfinite(valores) & (np.abs(valores) < 1e15)
+            resultado = pd.Series(None, index=serie.index, dtype=object)
+            resultado[~vectorizables] = [
+                self.convertir_tiempo_a_string(valor) for valor in serie[~vectorizables]
+            ]
+            if vectorizables.any():
+                v = valores[vectorizables]
+                horas = np.trunc(v)
+                minutos = np.trunc((v - horas) * 60)
+                texto = (
+                    pd.Series(horas.astype(np.int64)).astype(str).str.zfill(2) + ':' +
+                    pd.Series(minutos.astype(np.int64)).astype(str).str.zfill(2) + ':00'
+                )
+                resultado[vectorizables] = texto.to_numpy(dtype=object)
+            return resultado
         
-        return resultado
\ No newline at end of file
+        # Columnas object: str y time (tipos sin igualdad cruzada con otros) se convierten
+        # una vez por valor distinto; el resto (timedelta, int, ...) por la ruta escalar
+        valores = serie.to_numpy(dtype=object)
+        agrupables = np.fromiter((type(v) in (str, time) for v in valores), dtype=bool, count=len(valores))
+        resultado = pd.Series(None, index=serie.index, dtype=object)
+        if agrupables.any():
+            resultado[agrupables] = self._mapear_valores_unicos(
+                serie[agrupables], self.convertir_tiempo_a_string
+            ).to_numpy()
+        if not agrupables.all():
+            resultado[~agrupables] = [
+                self.convertir_tiempo_a_string(valor) for valor in valores[~agrupables]
+            ]
+        return resultado
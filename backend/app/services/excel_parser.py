@@ -1,94 +1,201 @@
+import logging
+import time
 import pandas as pd
-from typing import List, Dict, Any
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from typing import List, Dict, Any, Iterator, Optional, Union
+from app.config import settings
 from .data_processor import DataProcessor
+from .validacion import ValidadorIncidencias, contar_motivos
+
+logger = logging.getLogger(__name__)
+
+# Encabezados del Excel y su columna en la base de datos
+MAPEO_COLUMNAS = {
+    'Fecha': 'fecha',
+    'Troncal': 'troncal', 
+    'Código de Ruta': 'codigo_de_ruta',
+    'Ruta': 'ruta',
+    'Bus': 'bus',
+    'Bus de cambio': 'bus_de_cambio',
+    'Hora programada': 'hora_programada',
+    'Hora real': 'hora_real', 
+    'Ciclo': 'ciclo',
+    'Hora de incidencia': 'hora_de_incidencia',
+    'Parada': 'parada',
+    'Incidencia primaria': 'incidencia_primaria',
+    'Incidencia secundaria': 'incidencia_secundaria',
+    'Código de conductor': 'codigo_de_conductor',
+    'Conductor': 'conductor',
+    'Operador': 'operador',
+    'Observaciones': 'observaciones'
+}
+
+# Mismos marcadores de nulo que aplica pd.read_excel por defecto
+VALORES_NULOS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
 
 class ExcelParser:
     def __init__(self):
         self.processor = DataProcessor()
+        self.validador = ValidadorIncidencias()
+        # Segundos por etapa y filas rechazadas por motivo (los lee la ingesta para /metrics)
+        self.tiempos: Dict[str, float] = defaultdict(float)
+        self.errores_fila: Counter = Counter()
+        # Filas que no pasaron la validación, pendientes de ir a incidencias_rechazadas (las retira quien lee)
+        self.rechazadas: List[Dict[str, Any]] = []
+        self.filas_rechazadas = 0
     
     def mapear_columnas(self, df: pd.DataFrame) -> pd.DataFrame:
         """Mapea los nombres de columnas del Excel al formato de la base de datos"""
-        mapeo_columnas = {
-            'Fecha': 'fecha',
-            'Troncal': 'troncal', 
-            'Código de Ruta': 'codigo_de_ruta',
-            'Ruta': 'ruta',
-            'Bus': 'bus',
-            'Bus de cambio': 'bus_de_cambio',
-            'Hora programada': 'hora_programada',
-            'Hora real': 'hora_real', 
-            'Ciclo': 'ciclo',
-            'Hora de incidencia': 'hora_de_incidencia',
-            'Parada': 'parada',
-            'Incidencia primaria': 'incidencia_primaria',
-            'Incidencia secundaria': 'incidencia_secundaria',
-            'Código de conductor': 'codigo_de_conductor',
-            'Conductor': 'conductor',
-            'Operador': 'operador',
-            'Observaciones': 'observaciones'
-        }
-        
         # Renombrar columnas
-        df_renombrado = df.rename(columns=mapeo_columnas)
+        df_renombrado = df.rename(columns=MAPEO_COLUMNAS)
         
         # Mantener solo las columnas que necesitamos
-        columnas_necesarias = list(mapeo_columnas.values())
+        columnas_necesarias = list(MAPEO_COLUMNAS.values())
         columnas_existentes = [col for col in columnas_necesarias if col in df_renombrado.columns]
         
         return df_renombrado[columnas_existentes]
     
-    def parse_excel(self, file_path: str) -> List[Dict[str, Any]]:
-        """Parsea el archivo Excel y devuelve los datos procesados"""
+    def listar_hojas(self, file_path: str) -> List[str]:
+        """Nombres de las hojas del libro, en orden"""
+        if file_path.endswith('.xlsx'):
+            libro = load_workbook(file_path, read_only=True)
+            try:
+                return list(libro.sheetnames)
+            finally:
+                libro.close()
+        with pd.ExcelFile(file_path) as libro:
+            return [str(nombre) for nombre in libro.sheet_names]
+    
+    def parse_excel(self, file_path: str, hoja: Union[int, str] = 0) -> List[Dict[str, Any]]:
+        """Parsea una hoja del archivo Excel (la primera por defecto) y devuelve los datos procesados"""
         try:
-            print(f"=== INICIANDO PROCESAMIENTO DE ARCHIVO ===")
-            print(f"Archivo: {file_path}")
+            logger.info(f"Procesando {file_path} (hoja {hoja})")
             
             # Leer el archivo Excel
-            df = pd.read_excel(file_path)
-            print(f"✅ Archivo leído. Columnas originales: {list(df.columns)}")
-            print(f"📊 Total de filas: {len(df)}")
+            with self._etapa('leer'):
+                df = pd.read_excel(file_path, sheet_name=hoja)
+            logger.debug(f"Columnas originales: {list(df.columns)}; {len(df)} filas")
             
             # Mapear columnas
-            df = self.mapear_columnas(df)
-            print(f"✅ Columnas mapeadas: {list(df.columns)}")
+            with self._etapa('mapear'):
+                df = self.mapear_columnas(df)
+            if 'fecha' not in df.columns:
+                logger.warning(f"Hoja {hoja} de {file_path} sin columna Fecha, se omite")
+                return []
+            # Índice = número de fila en la hoja (el encabezado es la fila 1)
+            df.index = df.index + 2
             
-            # Mostrar tipos de datos de las primeras filas
-            print(f"📋 Tipos de datos de las primeras filas:")
-            for i, (_, fila) in enumerate(df.head(3).iterrows()):
-                print(f"  Fila {i}:")
-                for col, val in fila.items():
-                    print(f"    {col}: {val} (tipo: {type(val)})")
+            # Procesar y validar todas las filas por columnas (sin recorrer fila por fila)
+            datos_procesados = self._procesar(df)
             
-            # Convertir a lista de diccionarios
-            datos = df.to_dict('records')
+            logger.info(f"{len(datos_procesados)} filas procesadas de {file_path} (hoja {hoja})")
+            return datos_procesados
+        
+        except Exception as e:
+            logger.error(f"Error al parsear {file_path} (hoja {hoja}): {e}", exc_info=True)
+            raise Exception(f"Error al parsear el archivo Excel: {str(e)}")
+    
+    def iterar_lotes(
+        self, file_path: str, tamano_lote: Optional[int] = None, hoja: Union[int, str] = 0
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Lee una hoja del Excel en modo read-only y entrega lotes de filas ya procesadas"""
+        tamano_lote = tamano_lote or settings.INSERT_CHUNK_SIZE
+        inicio_lectura = time.perf_counter()
+        libro = load_workbook(file_path, read_only=True, data_only=True)
+        
+        try:
+            # Igual que pd.read_excel: primera fila como encabezado
+            hoja_excel = libro.worksheets[hoja] if isinstance(hoja, int) else libro[hoja]
+            filas = hoja_excel.iter_rows()
+            encabezados = next(filas, None)
+            if encabezados is None:
+                return
             
-            # Procesar cada fila
-            datos_procesados = []
-            errores = 0
+            posiciones = {celda.value: i for i, celda in enumerate(encabezados)}
+            columnas = [
+                (posiciones[original], destino)
+                for original, destino in MAPEO_COLUMNAS.items()
+                if original in posiciones
+            ]
+            # Hojas de resumen o auxiliares (sin Fecha) no son incidencias
+            if 'Fecha' not in posiciones:
+                logger.warning(f"Hoja {hoja_excel.title} de {file_path} sin columna Fecha, se omite")
+                return
             
-            for i, fila in enumerate(datos):
-                try:
-                    fila_procesada = self.processor.procesar_fila(fila)
-                    datos_procesados.append(fila_procesada)
-                    
-                    # Mostrar detalles de las primeras 3 filas procesadas
-                    if i < 3:
-                        print(f"✅ Fila {i} procesada exitosamente:")
-                        for key, value in fila_procesada.items():
-                            print(f"   {key}: {value} (tipo: {type(value)})")
-                            
-                except Exception as e:
-                    errores += 1
-                    print(f"❌ Error procesando fila {i}: {e}")
-                    print(f"   Datos de la fila problemática: {fila}")
+            lote = []
+            numeros = []
+            total = 0
+            for numero, fila in enumerate(filas, start=2):
+                valores = [self._convertir_celda(celda) for celda in fila]
+                # Las filas completamente vacías se omiten
+                if all(valor is None for valor in valores):
                     continue
+                
+                lote.append(valores)
+                numeros.append(numero)
+                if len(lote) >= tamano_lote:
+                    total += len(lote)
+                    self.tiempos['leer'] += time.perf_counter() - inicio_lectura
+                    yield self._procesar_lote(lote, numeros, columnas)
+                    inicio_lectura = time.perf_counter()
+                    lote = []
+                    numeros = []
             
-            print(f"=== PROCESAMIENTO COMPLETADO ===")
-            print(f"✅ {len(datos_procesados)} filas procesadas exitosamente")
-            print(f"❌ {errores} errores")
+            self.tiempos['leer'] += time.perf_counter() - inicio_lectura
+            if lote:
+                total += len(lote)
+                yield self._procesar_lote(lote, numeros, columnas)
             
-            return datos_procesados
-        
-        except Exception as e:
-            print(f"❌ ERROR GENERAL AL PARSEAR: {e}")
-            raise Exception(f"Error al parsear el archivo Excel: {str(e)}")
\ No newline at end of file
+            logger.info(f"Lectura por lotes completada: {total} filas de {file_path} ({hoja_excel.title})")
+        finally:
+            libro.close()
+    
+    def _procesar_lote(self, lote: List[list], numeros: List[int], columnas: List[tuple]) -> List[Dict[str, Any]]:
+        """Mapea un lote de filas crudas a las columnas de la base y lo procesa con procesar_dataframe"""
+        with self._etapa('mapear'):
+            mapeadas = [[valores[i] if i < len(valores) else None for i, _ in columnas] for valores in lote]
+            df = pd.DataFrame(
+                mapeadas, columns=[destino for _, destino in columnas], index=numeros, dtype=object
+            )
+        return self._procesar(df)
+    
+    def _procesar(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Procesa y valida un DataFrame mapeado; devuelve las filas válidas y acumula las rechazadas"""
+        with self._etapa('procesar'):
+            df_procesado = self.processor.procesar_dataframe(df)
+        with self._etapa('validar'):
+            validas, rechazadas = self.validador.validar(df_procesado, df)
+            if rechazadas:
+                self.rechazadas.extend(rechazadas)
+                self.filas_rechazadas += len(rechazadas)
+                self.errores_fila.update(contar_motivos(rechazadas))
+        with self._etapa('procesar'):
+            return validas.to_dict('records')
+    
+    @contextmanager
+    def _etapa(self, etapa: str):
+        """Acumula en self.tiempos los segundos de una etapa (leer, mapear, procesar, validar)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tiempos[etapa] += time.perf_counter() - inicio
+    
+    def _convertir_celda(self, celda) -> Any:
+        """Convierte una celda de openpyxl como lo hace el lector de pandas"""
+        valor = celda.value
+        if valor is None or celda.data_type == TYPE_ERROR:
+            return None
+        if celda.data_type == TYPE_NUMERIC and not isinstance(valor, bool):
+            # Los números enteros guardados como float se devuelven como int
+            entero = int(valor)
+            return entero if entero == valor else float(valor)
+        if isinstance(valor, str) and valor in VALORES_NULOS:
+            return None
+        return valor
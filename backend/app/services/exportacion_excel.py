@@ -0,0 +1,226 @@
+import logging
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.models.database import IncidenciaOperativa
+from app.services.catalogos import columna_nombre, unir_catalogos
+from app.services.excel_parser import MAPEO_COLUMNAS
+from app.services.report_generator import DIMENSIONES_REPORTE, ReportGenerator
+
+logger = logging.getLogger(__name__)
+
+# Reportes que se pueden incluir en el libro, en el orden de sus hojas
+REPORTES_EXCEL = ('diario', 'comparativo', 'tendencia')
+
+# Columnas de las hojas de incidencias: las del Excel de origen (con sus encabezados) y las derivadas
+COLUMNAS_HOJA_INCIDENCIAS = [
+    *[(columna, encabezado) for encabezado, columna in MAPEO_COLUMNAS.items()],
+    ('tipo_dia', 'Tipo de día'),
+    ('turno', 'Turno'),
+    ('empresa', 'Empresa'),
+    ('retraso_seg', 'Retraso (s)'),
+]
+
+# Filas de datos por hoja (Excel admite 1.048.576 con el encabezado); el resto sigue en otra hoja
+MAX_FILAS_HOJA = 1_048_575
+# Filas por lote del cursor del servidor al leer las incidencias
+LOTE_LECTURA = 2000
+
+# Títulos de las dimensiones del reporte diario
+TITULOS_DIMENSION = {
+    'por_turno': 'Turno',
+    'por_troncal': 'Troncal',
+    'por_tipo_incidencia': 'Tipo de incidencia',
+    'por_empresa': 'Empresa',
+}
+
+FUENTE_TITULO = Font(bold=True, size=14)
+FUENTE_ENCABEZADO = Font(bold=True, color='FFFFFF')
+RELLENO_ENCABEZADO = PatternFill('solid', fgColor='1F4E78')
+FUENTE_SECCION = Font(bold=True)
+FORMATO_PORCENTAJE = '0.0"%"'
+
+def rangos_incidencias(dias: Iterable[date]) -> List[Tuple[date, date]]:
+    """Días sueltos agrupados en rangos consecutivos [inicio, fin]"""
+    rangos: List[Tuple[date, date]] = []
+    for dia in sorted(set(dias)):
+        if rangos and dia == rangos[-1][1] + timedelta(days=1):
+            rangos[-1] = (rangos[-1][0], dia)
+        else:
+            rangos.append((dia, dia))
+    return rangos
+
+class LibroReportes:
+    """Libro .xlsx con los reportes de ReportGenerator y, opcionalmente, las incidencias crudas
+
+    Usa el modo write-only de openpyxl: cada fila se escribe a un temporal al agregarla, así que la
+    memoria no crece con la cantidad de incidencias.
+    """
+
+    def __init__(self, db_session: Session):
+        self.db = db_session
+        self.reportes = ReportGenerator(db_session)
+        self.libro = Workbook(write_only=True)
+        # Días cubiertos por los reportes del libro (las hojas de incidencias usan los mismos)
+        self.dias: set = set()
+        self.filas_incidencias = 0
+
+    def agregar_diario(self, fecha: str):
+        """Hoja con el total del día y una tabla por dimensión (turno, troncal, tipo, empresa)"""
+        reporte = self.reportes.generar_reporte_diario(fecha)
+        self.dias.add(datetime.strptime(fecha, '%Y-%m-%d').date())
+
+        hoja = self._hoja(f"Diario {fecha}", [26, 12])
+        hoja.append([self._celda(hoja, f"Reporte diario {fecha}", FUENTE_TITULO)])
+        hoja.append(['Total de incidencias', reporte['total_incidencias']])
+        for clave, (etiqueta, _) in DIMENSIONES_REPORTE.items():
+            hoja.append([])
+            hoja.append(self._encabezado(hoja, [TITULOS_DIMENSION[clave], 'Total']))
+            for grupo in reporte[clave]:
+                hoja.append([grupo[etiqueta], grupo['total']])
+
+    def agregar_comparativo(self, fecha1: str, fecha2: str):
+        """Hoja con las dos fechas lado a lado por dimensión, con diferencia y variación"""
+        comparativo = self.reportes.generar_reporte_comparativo(fecha1, fecha2)
+        reporte1, reporte2 = comparativo['fecha1'], comparativo['fecha2']
+        self.dias.update(datetime.strptime(fecha, '%Y-%m-%d').date() for fecha in (fecha1, fecha2))
+
+        hoja = self._hoja('Comparativo', [26, 12, 12, 12, 12])
+        hoja.append([self._celda(hoja, f"Comparativo {fecha1} vs {fecha2}", FUENTE_TITULO)])
+        hoja.append(self._encabezado(hoja, ['', fecha1, fecha2, 'Diferencia', 'Variación']))
+        hoja.append([
+            'Total de incidencias', reporte1['total_incidencias'], reporte2['total_incidencias'],
+            comparativo['comparacion']['diferencia_total'],
+            self._porcentaje(hoja, comparativo['comparacion']['variacion_porcentual']),
+        ])
+        for clave, (etiqueta, _) in DIMENSIONES_REPORTE.items():
+            totales1 = {grupo[etiqueta]: grupo['total'] for grupo in reporte1[clave]}
+            totales2 = {grupo[etiqueta]: grupo['total'] for grupo in reporte2[clave]}
+            hoja.append([])
+            hoja.append([self._celda(hoja, TITULOS_DIMENSION[clave], FUENTE_SECCION)])
+            # Valores de ambas fechas, en el orden del reporte (la primera fecha manda)
+            for valor in [*totales1, *[valor for valor in totales2 if valor not in totales1]]:
+                total1, total2 = totales1.get(valor, 0), totales2.get(valor, 0)
+                hoja.append([
+                    valor, total1, total2, total1 - total2,
+                    self._porcentaje(hoja, (total1 - total2) / total2 * 100 if total2 else 0),
+                ])
+
+    def agregar_tendencia(self, fecha_fin: str, dias: int, granularidad: str):
+        """Hoja con el total de incidencias por periodo, del más reciente al más antiguo"""
+        tendencia = self.reportes.generar_tendencia(fecha_fin, dias, granularidad)
+        fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
+        self.dias.update(fin - timedelta(days=dia) for dia in range(dias))
+
+        hoja = self._hoja(f"Tendencia {granularidad}", [14, 12])
+        titulo = f"Tendencia de {dias} días hasta {fecha_fin} por {granularidad}"
+        hoja.append([self._celda(hoja, titulo, FUENTE_TITULO)])
+        hoja.append(self._encabezado(hoja, ['Inicio del periodo', 'Total']))
+        for periodo in tendencia:
+            hoja.append([datetime.strptime(periodo['fecha'], '%Y-%m-%d').date(), periodo['total_incidencias']])
+
+    def agregar_incidencias(self):
+        """Hojas con las incidencias de los días de los reportes, leídas con un cursor del servidor"""
+        rangos = rangos_incidencias(self.dias)
+        if not rangos:
+            return
+        tabla = IncidenciaOperativa.__table__
+        consulta = select(
+            *[columna_nombre(columna).label(columna) for columna, _ in COLUMNAS_HOJA_INCIDENCIAS]
+        ).select_from(unir_catalogos()).where(or_(*[
+            (tabla.c.fecha >= datetime.combine(inicio, datetime.min.time()))
+            & (tabla.c.fecha < datetime.combine(fin + timedelta(days=1), datetime.min.time()))
+            for inicio, fin in rangos
+        ])).order_by(tabla.c.fecha, tabla.c.id)
+
+        encabezados = [encabezado for _, encabezado in COLUMNAS_HOJA_INCIDENCIAS]
+        anchos = [max(len(encabezado) + 2, 12) for encabezado in encabezados]
+        hoja, filas_hoja, numero = None, MAX_FILAS_HOJA, 0
+        for fila in self.db.execute(consulta.execution_options(yield_per=LOTE_LECTURA)):
+            if filas_hoja >= MAX_FILAS_HOJA:
+                numero += 1
+                hoja = self._hoja('Incidencias' if numero == 1 else f'Incidencias ({numero})', anchos)
+                hoja.freeze_panes = 'A2'
+                hoja.append(self._encabezado(hoja, encabezados))
+                filas_hoja = 0
+            hoja.append(tuple(fila))
+            filas_hoja += 1
+            self.filas_incidencias += 1
+
+    def guardar(self, destino: Optional[str] = None) -> str:
+        """Escribe el libro (en un temporal si no se indica destino) y devuelve su ruta"""
+        if destino is None:
+            descriptor, destino = tempfile.mkstemp(prefix='reportes_', suffix='.xlsx')
+            os.close(descriptor)
+        self.libro.save(destino)
+        return destino
+
+    def _hoja(self, titulo: str, anchos: Sequence[float]):
+        """Hoja nueva; en write-only los anchos se fijan antes de la primera fila"""
+        hoja = self.libro.create_sheet(titulo)
+        for indice, ancho in enumerate(anchos):
+            hoja.column_dimensions[get_column_letter(indice + 1)].width = ancho
+        return hoja
+
+    def _celda(self, hoja, valor: Any, fuente: Font) -> WriteOnlyCell:
+        celda = WriteOnlyCell(hoja, value=valor)
+        celda.font = fuente
+        return celda
+
+    def _encabezado(self, hoja, titulos: Sequence[str]) -> List[WriteOnlyCell]:
+        """Fila de encabezado con estilo (solo estas celdas llevan formato)"""
+        celdas = []
+        for titulo in titulos:
+            celda = self._celda(hoja, titulo, FUENTE_ENCABEZADO)
+            celda.fill = RELLENO_ENCABEZADO
+            celda.alignment = Alignment(horizontal='center')
+            celdas.append(celda)
+        return celdas
+
+    def _porcentaje(self, hoja, valor: float) -> WriteOnlyCell:
+        celda = WriteOnlyCell(hoja, value=round(valor, 2))
+        celda.number_format = FORMATO_PORCENTAJE
+        return celda
+
+def generar_libro(
+    db_session: Session,
+    reportes: Sequence[str],
+    fecha: Optional[str] = None,
+    fecha1: Optional[str] = None,
+    fecha2: Optional[str] = None,
+    fecha_fin: Optional[str] = None,
+    dias: int = 30,
+    granularidad: str = 'dia',
+    incluir_incidencias: bool = False,
+) -> Tuple[str, Dict[str, Any]]:
+    """Arma el libro con los reportes pedidos y devuelve (ruta del temporal, resumen)"""
+    inicio = time.perf_counter()
+    libro = LibroReportes(db_session)
+    if 'diario' in reportes:
+        libro.agregar_diario(fecha)
+    if 'comparativo' in reportes:
+        libro.agregar_comparativo(fecha1, fecha2)
+    if 'tendencia' in reportes:
+        libro.agregar_tendencia(fecha_fin, dias, granularidad)
+    if incluir_incidencias:
+        libro.agregar_incidencias()
+    ruta = libro.guardar()
+
+    resumen = {
+        'reportes': list(reportes),
+        'filas_incidencias': libro.filas_incidencias,
+        'bytes': os.path.getsize(ruta),
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+    logger.info(f"Libro de reportes generado: {resumen}")
+    return ruta, resumen
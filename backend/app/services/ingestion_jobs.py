@@ -0,0 +1,484 @@
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import uuid
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.models.database import ArchivoCargado
+from app.services import staging
+from app.services.analitica import almacen_analitico
+from app.services.bulk_inserter import BulkInserter
+from app.services.cache import cache_respuestas
+from app.services.cambios import INGESTA, registrar_cambio
+from app.services.metricas import INGESTA_ERRORES, registrar_hoja_ingerida
+from app.services.validacion import MAX_EJEMPLOS, CuarentenaIncidencias, contar_motivos
+from app.utils.logger import setup_logger
+
+logger = logging.getLogger(__name__)
+
+# Estados posibles de un trabajo de ingesta
+EN_COLA = 'en_cola'
+PROCESANDO = 'procesando'
+COMPLETADO = 'completado'
+ERROR = 'error'
+DUPLICADO = 'duplicado'
+
+# Marcador de fin de archivo en la cola de lotes
+_FIN = '__fin__'
+# Mensaje (RECHAZADAS, filas) con las filas que no pasaron la validación
+RECHAZADAS = 'rechazadas'
+
+def listar_hojas(file_path: str) -> List[str]:
+    """Se ejecuta en un proceso del pool: hojas del libro en orden"""
+    from app.services.excel_parser import ExcelParser
+
+    return ExcelParser().listar_hojas(file_path)
+
+class IngestaAbortada(Exception):
+    """El escritor abandonó el trabajo: el parser deja de publicar y termina"""
+
+def _publicar(cola, mensaje, abortar=None):
+    """Publica en la cola acotada sin quedar bloqueado si el escritor abortó el trabajo"""
+    while True:
+        if abortar is not None and abortar.is_set():
+            raise IngestaAbortada()
+        try:
+            cola.put(mensaje, timeout=1)
+            return
+        except queue.Full:
+            continue
+
+def parsear_a_cola(
+    file_path: str,
+    cola,
+    tamano_lote: int,
+    hoja: Union[int, str] = 0,
+    destino_staging: Optional[str] = None,
+    abortar=None,
+):
+    """Se ejecuta en un proceso del pool: parsea una hoja del archivo y publica lotes en la cola
+
+    Las filas rechazadas por la validación se publican aparte, antes del lote válido que las acompañaba.
+    Con `abortar` activado (Event del Manager) deja de publicar y termina sin el marcador de fin.
+    Devuelve los segundos por etapa y los rechazos del parser (para /metrics del proceso principal).
+    """
+    from app.services.excel_parser import ExcelParser
+    from app.services.staging import EscritorStaging
+
+    parser = ExcelParser()
+    # Las columnas limpias también quedan en Parquet para reprocesar sin volver al Excel
+    staging = EscritorStaging(destino_staging) if destino_staging else None
+    try:
+        if file_path.endswith('.xlsx'):
+            lotes = parser.iterar_lotes(file_path, tamano_lote, hoja)
+        else:
+            datos = parser.parse_excel(file_path, hoja)
+            lotes = (datos[inicio:inicio + tamano_lote] for inicio in range(0, len(datos), tamano_lote))
+        for lote in lotes:
+            if parser.rechazadas:
+                _publicar(cola, (RECHAZADAS, parser.rechazadas), abortar)
+                parser.rechazadas = []
+            if staging:
+                staging.escribir(lote)
+            _publicar(cola, lote, abortar)
+        if parser.rechazadas:
+            _publicar(cola, (RECHAZADAS, parser.rechazadas), abortar)
+        if staging:
+            staging.cerrar()
+        _publicar(cola, _FIN, abortar)
+    except IngestaAbortada:
+        if staging:
+            staging.descartar()
+    except Exception as e:
+        if staging:
+            staging.descartar()
+        try:
+            _publicar(cola, (ERROR, str(e)), abortar)
+            _publicar(cola, _FIN, abortar)
+        except IngestaAbortada:
+            pass
+    return {
+        'tiempos': dict(parser.tiempos),
+        'errores_fila': dict(parser.errores_fila),
+        'rechazadas': parser.filas_rechazadas,
+    }
+
+class ArchivoIngesta:
+    """Un archivo dentro de un trabajo de ingesta (subida simple o lote)"""
+
+    def __init__(self, nombre: str, file_path: str, hash_sha256: Optional[str] = None, temporal: bool = True):
+        self.nombre = nombre
+        self.file_path = file_path
+        self.hash_sha256 = hash_sha256
+        # Los temporales (subidas, zips extraídos) se eliminan al terminar; los de la CLI no
+        self.temporal = temporal
+        self.estado = EN_COLA
+        self.hojas = 0
+        self.filas_procesadas = 0
+        self.filas_duplicadas = 0
+        # Filas enviadas a incidencias_rechazadas: total, por motivo y las primeras como ejemplo
+        self.filas_rechazadas = 0
+        self.rechazos = Counter()
+        self.ejemplos_rechazo = []
+        self.errores = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'archivo': self.nombre,
+            'estado': self.estado,
+            'hojas': self.hojas,
+            'filas_procesadas': self.filas_procesadas,
+            'filas_duplicadas': self.filas_duplicadas,
+            'filas_rechazadas': self.filas_rechazadas,
+            'rechazos': dict(self.rechazos),
+            'ejemplos_rechazo': list(self.ejemplos_rechazo),
+            'errores': list(self.errores),
+        }
+
+class IngestionJob:
+    """Estado de una carga aceptada para ingesta (uno o varios archivos)"""
+
+    def __init__(self, archivo: str, archivos: List[ArchivoIngesta], directorio_temporal: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.archivo = archivo
+        self.archivos = archivos
+        self.directorio_temporal = directorio_temporal
+        self.estado = EN_COLA
+        self.filas_procesadas = 0
+        self.filas_duplicadas = 0
+        self.bloques = 0
+        self.filas_por_segundo = 0.0
+        self.errores = []
+        self.creado = datetime.now()
+        self.iniciado: Optional[datetime] = None
+        self.finalizado: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'archivo': self.archivo,
+            'estado': self.estado,
+            'filas_procesadas': self.filas_procesadas,
+            'filas_duplicadas': self.filas_duplicadas,
+            'filas_rechazadas': sum(archivo.filas_rechazadas for archivo in self.archivos),
+            'rechazos': dict(sum((archivo.rechazos for archivo in self.archivos), Counter())),
+            'bloques': self.bloques,
+            'filas_por_segundo': round(self.filas_por_segundo, 1),
+            'errores': list(self.errores),
+            'archivos': [archivo.to_dict() for archivo in self.archivos],
+            'creado': self.creado.strftime('%Y-%m-%d %H:%M:%S'),
+            'iniciado': self.iniciado.strftime('%Y-%m-%d %H:%M:%S') if self.iniciado else None,
+            'finalizado': self.finalizado.strftime('%Y-%m-%d %H:%M:%S') if self.finalizado else None,
+        }
+
+class IngestionJobManager:
+    """Cola local de ingesta: parseo de hojas y archivos en un pool de procesos y un único escritor de base de datos"""
+
+    def __init__(self, engine: Engine, procesos: Optional[int] = None):
+        self.engine = engine
+        self.procesos = procesos or settings.INGESTA_PROCESOS
+        self.jobs: Dict[str, IngestionJob] = {}
+        self._futuros: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        # Un solo hilo escritor: las cargas se escriben en orden y sin competir por la base
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingesta-escritor')
+        self._pool_parseo: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+
+    def encolar(self, file_path: str, archivo: str, hash_sha256: Optional[str] = None) -> IngestionJob:
+        """Registra el archivo y lo deja en cola para el escritor"""
+        return self.encolar_lote(archivo, [ArchivoIngesta(archivo, file_path, hash_sha256)])
+
+    def encolar_lote(
+        self, nombre: str, archivos: List[ArchivoIngesta], directorio_temporal: Optional[str] = None
+    ) -> IngestionJob:
+        """Registra varios archivos como un solo trabajo; se escriben en el orden recibido"""
+        job = IngestionJob(nombre, archivos, directorio_temporal)
+        with self._lock:
+            self._podar()
+            self.jobs[job.id] = job
+            self._futuros[job.id] = self._escritor.submit(self._ejecutar, job)
+        return job
+
+    def esperar(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Bloquea hasta que el trabajo termine y devuelve su estado final"""
+        with self._lock:
+            futuro = self._futuros.get(job_id)
+        if futuro:
+            futuro.result()
+        return self.obtener(job_id)
+
+    def obtener(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el estado del trabajo o None si no existe"""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def archivo_cargado(self, hash_sha256: str) -> Optional[Dict[str, Any]]:
+        """Carga previa completada de un archivo con el mismo contenido, si existe"""
+        with self.engine.connect() as conexion:
+            fila = conexion.execute(
+                select(ArchivoCargado.__table__).where(ArchivoCargado.hash_sha256 == hash_sha256)
+            ).mappings().first()
+        if fila is None:
+            return None
+        return {
+            'archivo': fila['nombre'],
+            'filas_insertadas': fila['filas_insertadas'],
+            'cargado': fila['cargado'].strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+    def cerrar(self):
+        """Detiene los pools al apagar la aplicación"""
+        self._escritor.shutdown(wait=False, cancel_futures=True)
+        if self._pool_parseo:
+            self._pool_parseo.shutdown(wait=False, cancel_futures=True)
+        if self._manager:
+            self._manager.shutdown()
+
+    def _iniciar_pools(self):
+        """Crea el pool de procesos (spawn, seguro con hilos) la primera vez que se necesita"""
+        if self._pool_parseo is None:
+            contexto = multiprocessing.get_context('spawn')
+            self._manager = contexto.Manager()
+            # Los procesos hijos registran con la misma configuración de logging que la aplicación
+            self._pool_parseo = ProcessPoolExecutor(
+                max_workers=self.procesos, mp_context=contexto, initializer=setup_logger
+            )
+
+    def _ejecutar(self, job: IngestionJob):
+        """Corre en el hilo escritor: parsea las hojas en paralelo e inserta sus lotes en orden"""
+        self._actualizar(job, estado=PROCESANDO, iniciado=datetime.now())
+
+        def on_progreso(resumen: Dict[str, Any]):
+            self._actualizar(
+                job,
+                filas_procesadas=resumen['filas_insertadas'],
+                filas_duplicadas=resumen['filas_duplicadas'],
+                bloques=resumen['bloques'],
+                filas_por_segundo=resumen['filas_por_segundo'],
+            )
+
+        inserter = None
+        unidades: List[Tuple] = []
+        abortar = None
+        try:
+            # Archivos ya cargados (o repetidos en cola): no se vuelven a procesar
+            pendientes = []
+            for archivo in job.archivos:
+                if archivo.hash_sha256 and self.archivo_cargado(archivo.hash_sha256):
+                    self._actualizar(archivo, estado=DUPLICADO)
+                    logger.info(f"Ingesta {job.id} ({archivo.nombre}): archivo ya cargado, se omite")
+                else:
+                    pendientes.append(archivo)
+            if not pendientes:
+                self._actualizar(job, estado=DUPLICADO, finalizado=datetime.now())
+                return
+
+            # Los rechazos de un intento anterior del mismo archivo se reemplazan por los de este
+            cuarentena = CuarentenaIncidencias(self.engine)
+            cuarentena.descartar_archivos(archivo.hash_sha256 for archivo in pendientes)
+
+            self._iniciar_pools()
+            abortar = self._manager.Event()
+            # Se llena a medida que se envían: si algo falla a mitad, las ya enviadas igual se detienen
+            self._enviar_hojas(job, pendientes, abortar, unidades)
+
+            inserter = BulkInserter(self.engine, on_progreso=on_progreso)
+            inserter.insertar_lotes(self._consumir(job, unidades, inserter, cuarentena))
+
+            for archivo in pendientes:
+                estado = ERROR if archivo.errores else COMPLETADO
+                if estado == COMPLETADO and archivo.hash_sha256:
+                    self._registrar_archivo(archivo)
+                self._actualizar(archivo, estado=estado)
+
+            estado = ERROR if job.errores else COMPLETADO
+            self._actualizar(job, estado=estado, finalizado=datetime.now())
+            logger.info(
+                f"Ingesta {job.id} ({job.archivo}): {len(pendientes)} archivos, "
+                f"{len(unidades)} hojas, {job.filas_procesadas} filas, "
+                f"{sum(archivo.filas_rechazadas for archivo in pendientes)} rechazadas, estado {estado}"
+            )
+        except Exception as e:
+            logger.error(f"Error en la ingesta {job.id}: {str(e)}", exc_info=True)
+            INGESTA_ERRORES.inc(tipo='ingesta')
+            with self._lock:
+                job.errores.append(str(e))
+            self._actualizar(job, estado=ERROR, finalizado=datetime.now())
+        finally:
+            # Si el escritor falló a mitad, las hojas sin consumir se detienen antes de borrar sus archivos
+            try:
+                self._detener_unidades(unidades, abortar)
+            except Exception as e:
+                logger.warning(f"No se pudieron detener las hojas de la ingesta {job.id}: {str(e)}")
+            # Los bloques confirmados (aunque la carga haya fallado después) invalidan sus días,
+            # aquí y en los demás procesos (API con otra instancia de caché o cargas desde la CLI)
+            if inserter and inserter.dias:
+                cache_respuestas.invalidar_dias(inserter.dias)
+                try:
+                    registrar_cambio(self.engine, INGESTA, inserter.dias)
+                except Exception as e:
+                    logger.warning(f"No se pudo registrar el cambio de la ingesta {job.id}: {str(e)}")
+            if inserter and inserter.filas_insertadas and settings.ANALITICA_HABILITADA:
+                try:
+                    almacen_analitico.refrescar(solo_si_cargado=True)
+                except Exception as e:
+                    logger.warning(f"No se pudo refrescar el almacén analítico: {str(e)}")
+            # Archivos no registrados se pueden volver a subir: su staging se regenera entonces
+            for archivo in job.archivos:
+                if archivo.hash_sha256 and archivo.estado not in (COMPLETADO, DUPLICADO):
+                    staging.descartar_archivo(archivo.hash_sha256)
+            self._limpiar(job)
+            # El resultado queda en el job; el futuro solo sirve a esperar() mientras corre
+            with self._lock:
+                self._futuros.pop(job.id, None)
+
+    def _enviar_hojas(self, job: IngestionJob, archivos: List[ArchivoIngesta], abortar, unidades: List[Tuple]):
+        """Envía al pool una unidad de parseo por hoja; agrega (archivo, hoja, cola, futuro) a unidades en orden"""
+        # Las hojas de todos los archivos se listan en paralelo
+        hojas = [(archivo, self._pool_parseo.submit(listar_hojas, archivo.file_path)) for archivo in archivos]
+
+        for archivo, futuro_hojas in hojas:
+            try:
+                nombres = futuro_hojas.result()
+            except Exception as e:
+                self._registrar_error(job, archivo, f"No se pudo abrir el archivo: {e}")
+                INGESTA_ERRORES.inc(tipo='archivo')
+                continue
+
+            self._actualizar(archivo, hojas=len(nombres))
+            for indice, hoja in enumerate(nombres):
+                destino = (
+                    staging.ruta_hoja(archivo.hash_sha256, indice)
+                    if archivo.hash_sha256 and staging.disponible() else None
+                )
+                # Cola acotada por hoja: cada parser se adelanta como máximo INGESTA_LOTES_EN_COLA lotes
+                cola = self._manager.Queue(maxsize=settings.INGESTA_LOTES_EN_COLA)
+                futuro = self._pool_parseo.submit(
+                    parsear_a_cola, archivo.file_path, cola, settings.INSERT_CHUNK_SIZE, hoja, destino, abortar
+                )
+                unidades.append((archivo, hoja, cola, futuro))
+
+    def _detener_unidades(self, unidades: List[Tuple], abortar):
+        """Cancela las hojas que no empezaron y vacía las colas de las que corren hasta que terminen
+
+        Sin esto, un parser con la cola llena queda bloqueado en put y ocupa un proceso del pool para siempre.
+        Tras una carga completa todas las unidades ya terminaron y no hay nada que esperar.
+        """
+        if abortar is None or all(futuro.done() for *_, futuro in unidades):
+            return
+        abortar.set()
+        for *_, futuro in unidades:
+            futuro.cancel()
+        for _, _, cola, futuro in unidades:
+            while not futuro.done():
+                try:
+                    cola.get(timeout=0.2)
+                except queue.Empty:
+                    pass
+
+    def _registrar_archivo(self, archivo: ArchivoIngesta):
+        """Guarda el hash del archivo completado para omitir sus próximas subidas"""
+        with self.engine.begin() as conexion:
+            conexion.execute(insert(ArchivoCargado), [{
+                'hash_sha256': archivo.hash_sha256,
+                'nombre': archivo.nombre,
+                'filas_insertadas': archivo.filas_procesadas,
+                'filas_duplicadas': archivo.filas_duplicadas,
+                'cargado': datetime.now(),
+            }])
+
+    def _consumir(
+        self, job: IngestionJob, unidades: List[Tuple], inserter: BulkInserter, cuarentena: CuarentenaIncidencias
+    ):
+        """Generador de lotes: recorre las hojas en el orden de envío hasta el marcador de fin de cada una"""
+        for archivo, hoja, cola, futuro in unidades:
+            insertadas, duplicadas = inserter.filas_insertadas, inserter.filas_duplicadas
+            segundos_escritura = inserter.segundos_escritura
+            while True:
+                try:
+                    lote = cola.get(timeout=1)
+                except queue.Empty:
+                    # Si el proceso del parser murió sin publicar el fin, result() lanza su error
+                    if futuro.done():
+                        futuro.result()
+                    continue
+                if lote == _FIN:
+                    break
+                if isinstance(lote, tuple) and lote[0] == ERROR:
+                    self._registrar_error(job, archivo, f"Error al procesar la hoja {hoja}: {lote[1]}")
+                    INGESTA_ERRORES.inc(tipo='hoja')
+                    continue
+                if isinstance(lote, tuple) and lote[0] == RECHAZADAS:
+                    self._registrar_rechazos(archivo, hoja, lote[1], cuarentena)
+                    continue
+                yield lote
+            resultado = futuro.result()
+            registrar_hoja_ingerida(
+                resultado,
+                inserter.segundos_escritura - segundos_escritura,
+                inserter.filas_insertadas - insertadas,
+                inserter.filas_duplicadas - duplicadas,
+            )
+
+            # Al reanudarse el generador, el último lote de la hoja ya está confirmado
+            self._actualizar(
+                archivo,
+                filas_procesadas=archivo.filas_procesadas + inserter.filas_insertadas - insertadas,
+                filas_duplicadas=archivo.filas_duplicadas + inserter.filas_duplicadas - duplicadas,
+            )
+
+    def _registrar_rechazos(
+        self, archivo: ArchivoIngesta, hoja, filas: List[Dict[str, Any]], cuarentena: CuarentenaIncidencias
+    ):
+        """Guarda las filas rechazadas de una hoja y actualiza el resumen del archivo"""
+        cuarentena.registrar(filas, archivo.hash_sha256, archivo.nombre, hoja)
+        with self._lock:
+            archivo.filas_rechazadas += len(filas)
+            archivo.rechazos.update(contar_motivos(filas))
+            faltantes = MAX_EJEMPLOS - len(archivo.ejemplos_rechazo)
+            archivo.ejemplos_rechazo.extend(
+                {'hoja': str(hoja), 'fila': fila['fila'], 'motivos': fila['motivos'], 'columnas': fila['columnas']}
+                for fila in filas[:max(faltantes, 0)]
+            )
+
+    def _registrar_error(self, job: IngestionJob, archivo: ArchivoIngesta, mensaje: str):
+        with self._lock:
+            archivo.errores.append(mensaje)
+            job.errores.append(f"{archivo.nombre}: {mensaje}" if len(job.archivos) > 1 else mensaje)
+
+    def _limpiar(self, job: IngestionJob):
+        """Elimina los archivos temporales del trabajo"""
+        for archivo in job.archivos:
+            if archivo.temporal and os.path.exists(archivo.file_path):
+                os.remove(archivo.file_path)
+        if job.directorio_temporal:
+            shutil.rmtree(job.directorio_temporal, ignore_errors=True)
+
+    def _podar(self):
+        """Olvida los trabajos terminados hace más de la retención y los que excedan el máximo (con el lock tomado)"""
+        terminados = sorted(
+            (job for job in self.jobs.values() if job.finalizado is not None), key=lambda job: job.finalizado
+        )
+        limite = datetime.now() - timedelta(seconds=settings.INGESTA_JOBS_RETENCION_SEGUNDOS)
+        sobrantes = max(len(terminados) - settings.INGESTA_JOBS_MAXIMO, 0)
+        for posicion, job in enumerate(terminados):
+            if posicion < sobrantes or job.finalizado < limite:
+                del self.jobs[job.id]
+
+    def _actualizar(self, job: Union[IngestionJob, ArchivoIngesta], **cambios):
+        with self._lock:
+            for campo, valor in cambios.items():
+                setattr(job, campo, valor)
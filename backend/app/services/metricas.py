@@ -0,0 +1,207 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Límites (en segundos) de los histogramas de latencia
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Etapas de ingesta por hoja: de décimas de segundo a varios minutos
+BUCKETS_INGESTA = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+# Operaciones SQL con etiqueta propia; el resto cuenta como 'otra'
+OPERACIONES_SQL = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'COPY')
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _formatear_etiquetas(nombres: Sequence[str], valores: Sequence[str], extra: str = '') -> str:
+    partes = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+def _numero(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+class Metrica:
+    """Base de contadores e histogramas: una serie por combinación de etiquetas"""
+
+    tipo = ''
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(etiquetas.get(nombre, '')) for nombre in self.etiquetas)
+
+    def exponer(self) -> List[str]:
+        return [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} {self.tipo}', *self._lineas()]
+
+    def _lineas(self) -> Iterable[str]:
+        raise NotImplementedError
+
+class Contador(Metrica):
+    tipo = 'counter'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def _lineas(self) -> Iterable[str]:
+        with self._lock:
+            valores = sorted(self._valores.items())
+        for clave, valor in valores:
+            yield f'{self.nombre}{_formatear_etiquetas(self.etiquetas, clave)} {_numero(valor)}'
+
+class Histograma(Metrica):
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        # clave -> [conteo por bucket (no acumulado, el último es +Inf), suma, total]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        posicion = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def _lineas(self) -> Iterable[str]:
+        with self._lock:
+            series = sorted((clave, [list(serie[0]), serie[1], serie[2]]) for clave, serie in self._series.items())
+        for clave, (conteos, suma, total) in series:
+            acumulado = 0
+            for limite, conteo in zip((*self.buckets, float('inf')), conteos):
+                acumulado += conteo
+                etiquetas = _formatear_etiquetas(self.etiquetas, clave, f'le="{_numero(limite)}"')
+                yield f'{self.nombre}_bucket{etiquetas} {acumulado}'
+            etiquetas = _formatear_etiquetas(self.etiquetas, clave)
+            yield f'{self.nombre}_sum{etiquetas} {_numero(suma)}'
+            yield f'{self.nombre}_count{etiquetas} {total}'
+
+class RegistroMetricas:
+    """Métricas del proceso en formato de texto de Prometheus (cada worker expone las suyas)"""
+
+    def __init__(self):
+        self._metricas: List[Metrica] = []
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nombre, ayuda, etiquetas))
+
+    def histograma(
+        self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_LATENCIA
+    ) -> Histograma:
+        return self._registrar(Histograma(nombre, ayuda, etiquetas, buckets))
+
+    def exponer(self) -> str:
+        return '\n'.join(linea for metrica in self._metricas for linea in metrica.exponer()) + '\n'
+
+    def _registrar(self, metrica: Metrica) -> Metrica:
+        self._metricas.append(metrica)
+        return metrica
+
+registro_metricas = RegistroMetricas()
+
+HTTP_SEGUNDOS = registro_metricas.histograma(
+    'metrovia_http_peticion_segundos', 'Latencia de las peticiones HTTP por ruta', ('metodo', 'ruta', 'estado')
+)
+HTTP_CONSULTAS_SQL = registro_metricas.histograma(
+    'metrovia_http_peticion_consultas_sql', 'Consultas SQL ejecutadas por petición', ('ruta',), BUCKETS_CONSULTAS
+)
+HTTP_SQL_SEGUNDOS = registro_metricas.histograma(
+    'metrovia_http_peticion_sql_segundos', 'Tiempo en consultas SQL por petición', ('ruta',)
+)
+SQL_CONSULTAS = registro_metricas.contador(
+    'metrovia_sql_consultas_total', 'Consultas SQL ejecutadas (API e ingesta)', ('operacion',)
+)
+SQL_SEGUNDOS = registro_metricas.contador(
+    'metrovia_sql_segundos_total', 'Tiempo acumulado en consultas SQL', ('operacion',)
+)
+INGESTA_ETAPA_SEGUNDOS = registro_metricas.histograma(
+    'metrovia_ingesta_etapa_segundos', 'Duración por hoja de cada etapa de la ingesta (leer, mapear, procesar, validar, insertar)',
+    ('etapa',), BUCKETS_INGESTA
+)
+INGESTA_FILAS = registro_metricas.contador(
+    'metrovia_ingesta_filas_total', 'Filas leídas por la ingesta según su resultado', ('resultado',)
+)
+INGESTA_FILAS_ERROR = registro_metricas.contador(
+    'metrovia_ingesta_filas_error_total', 'Filas rechazadas por la validación, por motivo', ('motivo',)
+)
+INGESTA_ERRORES = registro_metricas.contador(
+    'metrovia_ingesta_errores_total', 'Hojas o archivos que no se pudieron importar', ('tipo',)
+)
+
+class ConsultasPeticion:
+    """Consultas SQL y segundos acumulados durante una petición"""
+
+    __slots__ = ('consultas', 'segundos')
+
+    def __init__(self):
+        self.consultas = 0
+        self.segundos = 0.0
+
+# Acumulador de la petición en curso; los hilos de run_in_threadpool y run_sync heredan el contexto
+consultas_peticion: ContextVar[Optional[ConsultasPeticion]] = ContextVar('consultas_peticion', default=None)
+
+def _operacion(sentencia: str) -> str:
+    operacion = sentencia.lstrip().split(None, 1)[0].upper() if sentencia.strip() else ''
+    return operacion if operacion in OPERACIONES_SQL else 'otra'
+
+def _antes_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    conexion.info.setdefault('metricas_inicio', []).append(time.perf_counter())
+
+def _despues_de_ejecutar(conexion, cursor, sentencia, parametros, contexto, executemany):
+    inicios = conexion.info.get('metricas_inicio')
+    if not inicios:
+        return
+    segundos = time.perf_counter() - inicios.pop()
+    operacion = _operacion(sentencia)
+    SQL_CONSULTAS.inc(operacion=operacion)
+    SQL_SEGUNDOS.inc(segundos, operacion=operacion)
+    acumulado = consultas_peticion.get()
+    if acumulado is not None:
+        acumulado.consultas += 1
+        acumulado.segundos += segundos
+
+def registrar_eventos_sql():
+    """Cuenta y cronometra todas las consultas de todos los engines (también los async, por su sync_engine)"""
+    if not event.contains(Engine, 'before_cursor_execute', _antes_de_ejecutar):
+        event.listen(Engine, 'before_cursor_execute', _antes_de_ejecutar)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_ejecutar)
+
+def registrar_hoja_ingerida(resultado: Optional[Dict], segundos_insercion: float, insertadas: int, duplicadas: int):
+    """Etapas y filas de una hoja: resultado es lo que devuelve parsear_a_cola desde el proceso del parser"""
+    tiempos = (resultado or {}).get('tiempos') or {}
+    if not tiempos and not insertadas and not duplicadas:
+        # Hoja omitida (sin columna Fecha): no es una muestra de ingesta
+        return
+    for etapa, segundos in tiempos.items():
+        INGESTA_ETAPA_SEGUNDOS.observar(segundos, etapa=etapa)
+    INGESTA_ETAPA_SEGUNDOS.observar(segundos_insercion, etapa='insertar')
+    for motivo, cantidad in ((resultado or {}).get('errores_fila') or {}).items():
+        INGESTA_FILAS_ERROR.inc(cantidad, motivo=motivo)
+    INGESTA_FILAS.inc(insertadas, resultado='insertada')
+    INGESTA_FILAS.inc(duplicadas, resultado='duplicada')
+    INGESTA_FILAS.inc((resultado or {}).get('rechazadas', 0), resultado='rechazada')
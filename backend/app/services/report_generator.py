@@ -1,10 +1,45 @@
-import pandas as pd
+from collections import defaultdict
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract  # <-- AGREGAR ESTA IMPORTACIÓN
-from typing import Dict, List
-from datetime import datetime, timedelta
+from sqlalchemy import func, select, and_, or_, tuple_
+from typing import Dict, List, Optional, Sequence
+from datetime import date, datetime, timedelta
 
-from app.models.database import IncidenciaOperativa
+from app.models.database import Calendario, IncidenciaOperativa, ResumenDiario
+from app.services.analitica import CUANTILES_RETRASO
+from app.services.calendario import COLUMNAS_PERIODO, PERIODOS
+from app.services.catalogos import columna_nombre, unir_catalogos
+from app.services.rollup import valor_dimension
+from app.utils.date_ranges import rango_dia
+
+# Dimensiones del reporte diario: clave de salida -> (etiqueta, columna de daily_rollup)
+DIMENSIONES_REPORTE = {
+    'por_turno': ('turno', ResumenDiario.turno),
+    'por_troncal': ('troncal', ResumenDiario.troncal),
+    'por_tipo_incidencia': ('tipo', ResumenDiario.incidencia_primaria),
+    'por_empresa': ('empresa', ResumenDiario.empresa),
+}
+
+# Granularidades de la tendencia: inicio del periodo de cada día (calendario.inicio_*)
+GRANULARIDADES = PERIODOS
+
+# Agrupaciones de /reports/retrasos: parámetro -> dimensión de incidencias_operativas (o del almacén analítico)
+AGRUPACIONES_RETRASO = {
+    'ruta': 'codigo_de_ruta',
+    'troncal': 'troncal',
+    'turno': 'turno',
+    'dia': 'fecha',
+    'conductor': 'codigo_de_conductor',
+    'empresa': 'empresa',
+}
+
+def _fecha(valor) -> date:
+    """date de un valor agrupado (algunos drivers devuelven 'YYYY-MM-DD')"""
+    return valor if isinstance(valor, date) else datetime.strptime(str(valor)[:10], '%Y-%m-%d').date()
+
+def _orden_grupo(item):
+    """Ordena los grupos por valor, con los nulos primero (como GROUP BY en SQLite)"""
+    valor = item[0]
+    return (valor is not None, str(valor) if valor is not None else '')
 
 class ReportGenerator:
     def __init__(self, db_session: Session):
@@ -12,75 +47,115 @@ class ReportGenerator:
     
     def generar_reporte_diario(self, fecha: str) -> Dict:
         """Genera reporte consolidado del día"""
+        return self._reportes_por_dia([fecha])[fecha]
+    
+    def _reportes_por_dia(self, fechas: List[str]) -> Dict[str, Dict]:
+        """Calcula todas las dimensiones de los días indicados en una sola consulta"""
+        rangos = {fecha: rango_dia(fecha) for fecha in fechas}
+        filtro = or_(*[
+            and_(ResumenDiario.fecha >= inicio.date(), ResumenDiario.fecha < fin.date())
+            for inicio, fin in rangos.values()
+        ])
         
-        # Estadísticas básicas
-        total_incidencias = self.db.query(IncidenciaOperativa).filter(
-            func.date(IncidenciaOperativa.fecha) == fecha  # <-- Ahora func está definido
-        ).count()
-        
-        # Por turno
-        por_turno = self.db.query(
-            IncidenciaOperativa.turno,
-            func.count(IncidenciaOperativa.id).label('total')  # <-- Ahora func está definido
-        ).filter(
-            func.date(IncidenciaOperativa.fecha) == fecha
-        ).group_by(IncidenciaOperativa.turno).all()
+        # Conteos por día normalizado (YYYY-MM-DD) y dimensión
+        conteos = {
+            inicio.strftime('%Y-%m-%d'): {clave: defaultdict(int) for clave in DIMENSIONES_REPORTE}
+            for inicio, _ in rangos.values()
+        }
+        for dia, clave, valor, total in self._contar_por_dimension(filtro):
+            if dia in conteos:
+                conteos[dia][clave][valor_dimension(valor)] += total
         
-        # Por troncal
-        por_troncal = self.db.query(
-            IncidenciaOperativa.troncal,
-            func.count(IncidenciaOperativa.id).label('total')  # <-- Ahora func está definido
-        ).filter(
-            func.date(IncidenciaOperativa.fecha) == fecha
-        ).group_by(IncidenciaOperativa.troncal).all()
+        reportes = {}
+        for fecha, (inicio, _) in rangos.items():
+            grupos = {
+                clave: [
+                    {etiqueta: valor, 'total': total}
+                    for valor, total in sorted(conteos[inicio.strftime('%Y-%m-%d')][clave].items(), key=_orden_grupo)
+                ]
+                for clave, (etiqueta, _) in DIMENSIONES_REPORTE.items()
+            }
+            reportes[fecha] = {
+                'fecha': fecha,
+                # Cada incidencia cae en exactamente un turno: el total es la suma por turno
+                'total_incidencias': sum(item['total'] for item in grupos['por_turno']),
+                **grupos
+            }
         
-        # Por tipo de incidencia
-        por_tipo = self.db.query(
-            IncidenciaOperativa.incidencia_primaria,
-            func.count(IncidenciaOperativa.id).label('total')  # <-- Ahora func está definido
-        ).filter(
-            func.date(IncidenciaOperativa.fecha) == fecha
-        ).group_by(IncidenciaOperativa.incidencia_primaria).all()
+        return reportes
+    
+    def _contar_por_dimension(self, filtro):
+        """Devuelve tuplas (día, dimensión, valor, total) leyendo daily_rollup una sola vez"""
+        dia = ResumenDiario.fecha
+        total = func.sum(ResumenDiario.total)
+        columnas = [columna for _, columna in DIMENSIONES_REPORTE.values()]
+        claves = list(DIMENSIONES_REPORTE)
         
-        # Por empresa
-        por_empresa = self.db.query(
-            IncidenciaOperativa.empresa,
-            func.count(IncidenciaOperativa.id).label('total')  # <-- Ahora func está definido
-        ).filter(
-            func.date(IncidenciaOperativa.fecha) == fecha
-        ).group_by(IncidenciaOperativa.empresa).all()
+        if self.db.get_bind().dialect.name == 'postgresql':
+            # GROUPING SETS: un conjunto (día, dimensión) por cada dimensión del reporte
+            consulta = select(
+                dia, *columnas, *[func.grouping(columna) for columna in columnas], total
+            ).where(filtro).group_by(
+                func.grouping_sets(*[tuple_(dia, columna) for columna in columnas])
+            )
+            for fila in self.db.execute(consulta):
+                valores = fila[1:1 + len(columnas)]
+                agrupado = fila[1 + len(columnas):-1]
+                for clave, valor, es_total in zip(claves, valores, agrupado):
+                    if not es_total:
+                        yield str(fila[0]), clave, valor, fila[-1]
+            return
         
-        return {
-            'fecha': fecha,
-            'total_incidencias': total_incidencias,
-            'por_turno': [{'turno': item.turno, 'total': item.total} for item in por_turno],
-            'por_troncal': [{'troncal': item.troncal, 'total': item.total} for item in por_troncal],
-            'por_tipo_incidencia': [{'tipo': item.incidencia_primaria, 'total': item.total} for item in por_tipo],
-            'por_empresa': [{'empresa': item.empresa, 'total': item.total} for item in por_empresa]
-        }
+        # Resto de dialectos: un único GROUP BY por todas las dimensiones, agregado en memoria
+        consulta = select(dia, *columnas, total).where(filtro).group_by(dia, *columnas)
+        for fila in self.db.execute(consulta):
+            for clave, valor in zip(claves, fila[1:-1]):
+                yield str(fila[0]), clave, valor, fila[-1]
     
     def generar_tendencia_semanal(self, fecha_inicio: str) -> List[Dict]:
-        """Genera tendencia de incidencias por semana"""
-        tendencias = []
+        """Genera tendencia de incidencias de los últimos 7 días"""
+        return self.generar_tendencia(fecha_inicio, dias=7, granularidad='dia')
+    
+    def generar_tendencia(self, fecha_fin: str, dias: int = 7, granularidad: str = 'dia') -> List[Dict]:
+        """Tendencia de los últimos `dias` días hasta fecha_fin, agrupada por día, semana, mes o trimestre"""
+        if granularidad not in GRANULARIDADES:
+            raise ValueError(f"Granularidad no soportada: {granularidad}")
         
-        for i in range(7):  # Últimos 7 días
-            fecha = (datetime.strptime(fecha_inicio, '%Y-%m-%d') - timedelta(days=i)).strftime('%Y-%m-%d')
-            
-            total = self.db.query(IncidenciaOperativa).filter(
-                func.date(IncidenciaOperativa.fecha) == fecha  # <-- Ahora func está definido
-            ).count()
-            
-            tendencias.append({
-                'fecha': fecha,
-                'total_incidencias': total
-            })
+        fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
+        # Un fecha_fin en los primeros días del calendario no tiene `dias` días antes: se recorta en date.min
+        dias = min(dias, (fin - date.min).days + 1)
+        inicio = fin - timedelta(days=dias - 1)
+        
+        # Una sola consulta sobre el rollup, agrupada por el inicio de periodo del calendario (join por fecha)
+        periodo = COLUMNAS_PERIODO[granularidad]
+        totales_por_periodo = {
+            _fecha(valor): total
+            for valor, total in self.db.execute(
+                select(periodo, func.sum(ResumenDiario.total))
+                .select_from(
+                    ResumenDiario.__table__.join(Calendario.__table__, Calendario.fecha == ResumenDiario.fecha)
+                )
+                .where(Calendario.fecha >= inicio, Calendario.fecha <= fin)
+                .group_by(periodo)
+            )
+        }
         
-        return tendencias
+        # Rellenar con cero los periodos sin incidencias, del más reciente al más antiguo
+        periodos = {}
+        for i in range(dias):
+            inicio_periodo = GRANULARIDADES[granularidad](fin - timedelta(days=i))
+            periodos[inicio_periodo] = totales_por_periodo.get(inicio_periodo) or 0
+        
+        return [
+            {'fecha': max(periodo, inicio).isoformat(), 'total_incidencias': total}
+            for periodo, total in periodos.items()
+        ]
     
     def generar_reporte_comparativo(self, fecha1: str, fecha2: str) -> Dict:
         """Compara incidencias entre dos fechas"""
-        reporte1 = self.generar_reporte_diario(fecha1)
-        reporte2 = self.generar_reporte_diario(fecha2)
+        reportes = self._reportes_por_dia([fecha1, fecha2])
+        reporte1 = reportes[fecha1]
+        reporte2 = reportes[fecha2]
         
         return {
             'fecha1': reporte1,
@@ -92,4 +167,64 @@ class ReportGenerator:
                     reporte2['total_incidencias'] * 100
                 ) if reporte2['total_incidencias'] > 0 else 0
             }
-        }
\ No newline at end of file
+        }
+    
+    def generar_percentiles_retraso(
+        self,
+        dimension: str,
+        filtros: Optional[Dict[str, List[str]]] = None,
+        fecha_inicio: Optional[date] = None,
+        fecha_fin: Optional[date] = None,
+        cuantiles: Sequence[float] = CUANTILES_RETRASO,
+        limite: Optional[int] = None,
+    ) -> Dict:
+        """Percentiles de retraso_seg por dimensión con percentile_cont (solo PostgreSQL)
+
+        Mismo formato que AlmacenAnalitico.percentiles: grupos ordenados por el cuantil más alto.
+        """
+        tabla = IncidenciaOperativa.__table__
+        retraso = tabla.c.retraso_seg
+        grupo = (func.date(tabla.c.fecha) if dimension == 'fecha' else columna_nombre(dimension)).label(dimension)
+        percentiles = [
+            func.percentile_cont(cuantil).within_group(retraso).label(f"p{cuantil * 100:g}")
+            for cuantil in cuantiles
+        ]
+        
+        condiciones = [retraso.isnot(None)]
+        if fecha_inicio:
+            condiciones.append(tabla.c.fecha >= datetime.combine(fecha_inicio, datetime.min.time()))
+        if fecha_fin:
+            condiciones.append(tabla.c.fecha < datetime.combine(fecha_fin, datetime.min.time()) + timedelta(days=1))
+        for filtro, valores in (filtros or {}).items():
+            condiciones.append(columna_nombre(filtro).in_(valores))
+        
+        consulta = select(
+            grupo,
+            func.count(retraso).label('n'),
+            func.avg(retraso).label('promedio'),
+            *percentiles,
+            # Totales de filas y de grupos antes del LIMIT
+            func.sum(func.count(retraso)).over().label('total'),
+            func.count().over().label('grupos'),
+        ).select_from(unir_catalogos()).where(*condiciones).group_by(grupo)
+        if percentiles:
+            consulta = consulta.order_by(percentiles[-1].desc())
+        if limite:
+            consulta = consulta.limit(limite)
+        
+        filas = self.db.execute(consulta).mappings().all()
+        return {
+            'dimensiones': [dimension],
+            'columna': 'retraso_seg',
+            'total': int(filas[0]['total']) if filas else 0,
+            'grupos': int(filas[0]['grupos']) if filas else 0,
+            'filas': [
+                {
+                    dimension: str(fila[dimension]) if dimension == 'fecha' else fila[dimension],
+                    'n': fila['n'],
+                    'promedio': round(float(fila['promedio']), 2),
+                    **{percentil.name: round(float(fila[percentil.name]), 2) for percentil in percentiles},
+                }
+                for fila in filas
+            ],
+        }
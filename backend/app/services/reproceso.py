@@ -0,0 +1,203 @@
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Column, MetaData, SmallInteger, String, Table, bindparam, func, insert, or_, select, update
+from sqlalchemy.engine import Engine
+
+from app.models.database import ArchivoCargado, Calendario, IncidenciaOperativa
+from app.services import staging
+from app.services.analitica import almacen_analitico
+from app.services.cache import cache_respuestas
+from app.services.calendario import calendario_de
+from app.services.cambios import REESCRITURA, registrar_cambio
+from app.services.catalogos import CatalogoDimensiones, columna_id
+from app.services.data_processor import CAMPOS_HUELLA, DataProcessor, calcular_huellas
+from app.services.rollup import RollupService
+
+logger = logging.getLogger(__name__)
+
+# Columnas derivadas que se recalculan con las reglas actuales (se guardan como ids de catálogo)
+COLUMNAS_DERIVADAS = ('tipo_dia', 'turno', 'empresa')
+COLUMNAS_IDS = tuple(columna_id(columna) for columna in COLUMNAS_DERIVADAS)
+
+# Columnas del staging necesarias para derivar y ubicar cada fila
+COLUMNAS_LECTURA = sorted(set(CAMPOS_HUELLA) | {'fecha', 'hora_programada', 'operador'})
+
+class ReprocesadorDerivados:
+    """Recalcula tipo_dia, turno y empresa desde el staging Parquet, sin volver a leer los Excel"""
+
+    def __init__(self, engine: Engine, tamano_bloque: int = 20000):
+        self.engine = engine
+        self.tabla = IncidenciaOperativa.__table__
+        self.tamano_bloque = tamano_bloque
+        self.processor = DataProcessor()
+
+    def reprocesar(self, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None) -> Dict[str, Any]:
+        """Actualiza por huella las filas cuyos valores derivados cambiaron y reconstruye el rollup"""
+        if not staging.disponible():
+            raise RuntimeError("El staging Parquet no está disponible (STAGING_PARQUET o pyarrow)")
+
+        inicio = time.perf_counter()
+        temporal = self._tabla_temporal()
+        catalogos = CatalogoDimensiones(self.engine)
+        archivos = filas = 0
+        primera = ultima = None
+
+        with self.engine.begin() as conexion:
+            # Orden de carga: ante una misma huella en dos archivos, manda el que se insertó
+            orden = conexion.execute(
+                select(ArchivoCargado.hash_sha256).order_by(ArchivoCargado.id)
+            ).scalars().all()
+            vistas = set()
+
+            temporal.create(conexion)
+            try:
+                for df in staging.iterar_archivos(
+                    orden, columnas=COLUMNAS_LECTURA, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin
+                ):
+                    archivos += 1
+                    if df.empty:
+                        continue
+                    df = df.astype(object).where(df.notna(), None)
+                    self.processor.derivar_columnas(df)
+                    df['huella'] = calcular_huellas(df)
+
+                    df = df.drop_duplicates('huella')
+                    df = df[~df['huella'].isin(vistas)]
+                    vistas.update(df['huella'])
+                    registros = df[['huella', *COLUMNAS_DERIVADAS]].to_dict('records')
+                    # Los nombres nuevos de catálogo quedan dentro de esta misma transacción
+                    catalogos.codificar(registros, conexion)
+                    registros = [
+                        {'huella': registro['huella'], **{columna: registro[columna] for columna in COLUMNAS_IDS}}
+                        for registro in registros
+                    ]
+                    for desde in range(0, len(registros), self.tamano_bloque):
+                        conexion.execute(insert(temporal), registros[desde:desde + self.tamano_bloque])
+                    filas += len(registros)
+
+                    fechas = df['fecha'].dropna()
+                    if not fechas.empty:
+                        primera = min(filter(None, [primera, fechas.min().date()]))
+                        ultima = max(filter(None, [ultima, fechas.max().date()]))
+
+                # Un solo UPDATE ... FROM: solo se escriben las filas cuyo valor derivado cambió
+                resultado = conexion.execute(
+                    update(self.tabla)
+                    .values({columna: temporal.c[columna] for columna in COLUMNAS_IDS})
+                    .where(
+                        self.tabla.c.huella == temporal.c.huella,
+                        or_(*[
+                            self.tabla.c[columna].is_distinct_from(temporal.c[columna])
+                            for columna in COLUMNAS_IDS
+                        ])
+                    )
+                )
+                actualizadas = resultado.rowcount
+            finally:
+                temporal.drop(conexion)
+
+        claves_rollup = 0
+        if actualizadas and primera:
+            claves_rollup = RollupService(self.engine).reconstruir(primera, ultima)
+            cache_respuestas.invalidar_dias(
+                primera + timedelta(days=dia) for dia in range((ultima - primera).days + 1)
+            )
+            # Las filas cambiaron en su lugar (mismo id): el almacén se recarga completo, también en
+            # el proceso de la API, que ve el cambio registrado antes de su próxima consulta
+            almacen_analitico.invalidar()
+            registrar_cambio(self.engine, REESCRITURA, (primera, ultima))
+
+        resumen = {
+            'archivos': archivos,
+            'filas_en_staging': filas,
+            'filas_actualizadas': actualizadas,
+            'desde': primera,
+            'hasta': ultima,
+            'claves_rollup': claves_rollup,
+            'segundos': round(time.perf_counter() - inicio, 3),
+        }
+        logger.info(f"Reproceso de derivados: {resumen}")
+        return resumen
+
+    def reclasificar_tipo_dia(
+        self, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None, regenerar: bool = False
+    ) -> Dict[str, Any]:
+        """Recalcula tipo_dia desde la tabla calendario, también para filas sin staging
+
+        Un UPDATE por día sobre el rango de fechas (ix_incidencias_fecha_id); con regenerar, los años
+        del calendario se reescriben antes (p. ej. tras cambiar FESTIVOS_ADICIONALES).
+        """
+        inicio = time.perf_counter()
+        with self.engine.connect() as conexion:
+            primera, ultima = conexion.execute(
+                select(func.min(self.tabla.c.fecha), func.max(self.tabla.c.fecha))
+            ).one()
+        if primera is None:
+            return {'dias': 0, 'filas_actualizadas': 0, 'desde': None, 'hasta': None, 'claves_rollup': 0}
+        primera = max(fecha_inicio or primera.date(), primera.date())
+        ultima = min(fecha_fin or ultima.date(), ultima.date())
+
+        calendario = calendario_de(self.engine)
+        anios = range(primera.year, ultima.year + 1)
+        if regenerar:
+            calendario.regenerar(anios)
+        else:
+            calendario.asegurar(anios)
+
+        with self.engine.begin() as conexion:
+            dias = conexion.execute(
+                select(Calendario.fecha, Calendario.tipo_dia)
+                .where(Calendario.fecha >= primera, Calendario.fecha <= ultima)
+            ).all()
+            ids = CatalogoDimensiones(self.engine).ids('tipo_dia', {tipo for _, tipo in dias}, conexion)
+            # Solo se escriben las filas cuyo tipo de día cambió
+            resultado = conexion.execute(
+                update(self.tabla)
+                .where(
+                    self.tabla.c.fecha >= bindparam('desde'),
+                    self.tabla.c.fecha < bindparam('hasta'),
+                    self.tabla.c.tipo_dia_id.is_distinct_from(bindparam('tipo')),
+                )
+                .values(tipo_dia_id=bindparam('tipo')),
+                [
+                    {
+                        'desde': datetime.combine(dia, datetime.min.time()),
+                        'hasta': datetime.combine(dia + timedelta(days=1), datetime.min.time()),
+                        'tipo': ids[tipo],
+                    }
+                    for dia, tipo in dias
+                ]
+            )
+            # Algunos drivers no informan el total de un executemany (-1)
+            actualizadas = resultado.rowcount
+
+        claves_rollup = 0
+        if actualizadas:
+            claves_rollup = RollupService(self.engine).reconstruir(primera, ultima)
+            cache_respuestas.invalidar_dias(
+                primera + timedelta(days=dia) for dia in range((ultima - primera).days + 1)
+            )
+            almacen_analitico.invalidar()
+            registrar_cambio(self.engine, REESCRITURA, (primera, ultima))
+
+        resumen = {
+            'dias': len(dias),
+            'filas_actualizadas': actualizadas if actualizadas >= 0 else None,
+            'desde': primera,
+            'hasta': ultima,
+            'claves_rollup': claves_rollup,
+            'segundos': round(time.perf_counter() - inicio, 3),
+        }
+        logger.info(f"Reclasificación de tipo_dia: {resumen}")
+        return resumen
+
+    def _tabla_temporal(self) -> Table:
+        return Table(
+            'tmp_derivados', MetaData(),
+            Column('huella', String(40), primary_key=True),
+            *[Column(columna, SmallInteger) for columna in COLUMNAS_IDS],
+            prefixes=['TEMPORARY'],
+        )
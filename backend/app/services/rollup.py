@@ -0,0 +1,146 @@
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import and_, delete, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+
+from app.models.database import IncidenciaOperativa, ResumenDiario
+from app.services.catalogos import columna_nombre, unir_catalogos
+
+logger = logging.getLogger(__name__)
+
+# Dimensiones de la clave del rollup (además de la fecha)
+DIMENSIONES_ROLLUP = ('turno', 'troncal', 'empresa', 'incidencia_primaria', 'tipo_dia')
+
+# Valor con el que se guardan las dimensiones nulas dentro de daily_rollup
+SIN_VALOR = ''
+
+def valor_dimension(valor: Any) -> Optional[str]:
+    """Convierte un valor leído de daily_rollup al valor original (None si estaba vacío)"""
+    return None if valor == SIN_VALOR else valor
+
+class RollupService:
+    """Mantiene la tabla daily_rollup: acumulado por lote, reconstrucción y verificación"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.tabla = ResumenDiario.__table__
+
+    def acumular(self, conexion: Connection, filas: Iterable[Dict[str, Any]]) -> int:
+        """Suma al rollup los conteos de un lote, dentro de la transacción del llamador"""
+        conteos = Counter()
+        for fila in filas:
+            fecha = fila.get('fecha')
+            if fecha is None:
+                continue
+            clave = tuple(
+                SIN_VALOR if fila.get(dimension) is None else str(fila.get(dimension))
+                for dimension in DIMENSIONES_ROLLUP
+            )
+            conteos[(fecha.date() if isinstance(fecha, datetime) else fecha, *clave)] += 1
+
+        if not conteos:
+            return 0
+
+        registros = [
+            {'fecha': clave[0], **dict(zip(DIMENSIONES_ROLLUP, clave[1:])), 'total': total}
+            for clave, total in conteos.items()
+        ]
+        self._sumar(conexion, registros)
+        return len(registros)
+
+    def _sumar(self, conexion: Connection, registros: list):
+        """Upsert que incrementa el total de cada clave"""
+        dialecto = conexion.dialect.name
+        clave = ['fecha', *DIMENSIONES_ROLLUP]
+
+        if dialecto in ('postgresql', 'sqlite'):
+            modulo = postgresql if dialecto == 'postgresql' else sqlite
+            sentencia = modulo.insert(self.tabla)
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=clave,
+                set_={'total': self.tabla.c.total + sentencia.excluded.total},
+            )
+            conexion.execute(sentencia, registros)
+            return
+
+        # Otros dialectos: UPDATE y, si la clave no existe, INSERT
+        for registro in registros:
+            condicion = and_(*[self.tabla.c[columna] == registro[columna] for columna in clave])
+            resultado = conexion.execute(
+                update(self.tabla).where(condicion).values(total=self.tabla.c.total + registro['total'])
+            )
+            if resultado.rowcount == 0:
+                conexion.execute(insert(self.tabla), [registro])
+
+    def reconstruir(self, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None) -> int:
+        """Recalcula el rollup desde incidencias_operativas para el rango [fecha_inicio, fecha_fin]"""
+        borrado = delete(self.tabla).where(*self._filtro_rollup(fecha_inicio, fecha_fin))
+        seleccion = self._conteos_crudos().where(*self._filtro_crudo(fecha_inicio, fecha_fin))
+
+        with self.engine.begin() as conexion:
+            conexion.execute(borrado)
+            resultado = conexion.execute(
+                insert(self.tabla).from_select(['fecha', *DIMENSIONES_ROLLUP, 'total'], seleccion)
+            )
+
+        logger.info(
+            f"daily_rollup reconstruido ({fecha_inicio or 'inicio'} a {fecha_fin or 'fin'}): "
+            f"{resultado.rowcount} claves"
+        )
+        return resultado.rowcount
+
+    def verificar_consistencia(self, fecha_inicio: Optional[date] = None, fecha_fin: Optional[date] = None) -> Dict[str, Any]:
+        """Compara el rollup contra los conteos calculados desde las filas crudas"""
+        crudo = self._conteos_crudos().where(*self._filtro_crudo(fecha_inicio, fecha_fin))
+        rollup = select(
+            self.tabla.c.fecha, *[self.tabla.c[dimension] for dimension in DIMENSIONES_ROLLUP], self.tabla.c.total
+        ).where(*self._filtro_rollup(fecha_inicio, fecha_fin))
+
+        with self.engine.connect() as conexion:
+            esperado = {(str(f[0]), *f[1:-1]): f[-1] for f in conexion.execute(crudo)}
+            actual = {(str(f[0]), *f[1:-1]): f[-1] for f in conexion.execute(rollup)}
+
+        claves = set(esperado) | set(actual)
+        diferencias = [
+            {'clave': list(clave), 'crudo': esperado.get(clave, 0), 'rollup': actual.get(clave, 0)}
+            for clave in sorted(claves)
+            if esperado.get(clave, 0) != actual.get(clave, 0)
+        ]
+        return {
+            'consistente': not diferencias,
+            'claves_verificadas': len(claves),
+            'total_crudo': sum(esperado.values()),
+            'total_rollup': sum(actual.values()),
+            'diferencias': diferencias[:100],
+        }
+
+    def _conteos_crudos(self):
+        """SELECT que agrupa incidencias_operativas por la clave del rollup"""
+        # turno, tipo_dia y empresa se leen de sus catálogos con un join (no subconsulta por fila)
+        dia = func.date(IncidenciaOperativa.fecha)
+        columnas = [func.coalesce(columna_nombre(dimension), SIN_VALOR) for dimension in DIMENSIONES_ROLLUP]
+        return select(dia, *columnas, func.count()).select_from(unir_catalogos()).group_by(dia, *columnas)
+
+    def _filtro_crudo(self, fecha_inicio: Optional[date], fecha_fin: Optional[date]) -> list:
+        """Condiciones semiabiertas sobre incidencias_operativas.fecha"""
+        condiciones = []
+        if fecha_inicio:
+            condiciones.append(IncidenciaOperativa.fecha >= datetime.combine(fecha_inicio, datetime.min.time()))
+        if fecha_fin:
+            condiciones.append(
+                IncidenciaOperativa.fecha < datetime.combine(fecha_fin, datetime.min.time()) + timedelta(days=1)
+            )
+        return condiciones
+
+    def _filtro_rollup(self, fecha_inicio: Optional[date], fecha_fin: Optional[date]) -> list:
+        """Condiciones sobre daily_rollup.fecha"""
+        condiciones = []
+        if fecha_inicio:
+            condiciones.append(self.tabla.c.fecha >= fecha_inicio)
+        if fecha_fin:
+            condiciones.append(self.tabla.c.fecha <= fecha_fin)
+        return condiciones
@@ -0,0 +1,116 @@
+import os
+import shutil
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from app.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: sin él no se genera staging
+    pa = None
+    pq = None
+
+
+# Columnas limpias (antes de derivar tipo_dia/turno/empresa) que se guardan por archivo
+COLUMNAS_STAGING = (
+    'fecha', 'troncal', 'codigo_de_ruta', 'ruta', 'bus', 'bus_de_cambio', 'hora_programada',
+    'hora_real', 'ciclo', 'hora_de_incidencia', 'parada', 'incidencia_primaria',
+    'incidencia_secundaria', 'codigo_de_conductor', 'conductor', 'operador', 'observaciones',
+)
+
+def disponible() -> bool:
+    """El staging está activo y pyarrow instalado"""
+    return settings.STAGING_PARQUET and pa is not None
+
+def esquema():
+    """fecha como timestamp; el resto como texto (igual que las columnas String de la tabla)"""
+    return pa.schema([
+        (columna, pa.timestamp('us') if columna == 'fecha' else pa.string())
+        for columna in COLUMNAS_STAGING
+    ])
+
+def directorio_archivo(hash_sha256: str) -> str:
+    """Directorio de staging de un archivo: una parte Parquet por hoja"""
+    return os.path.join(settings.STAGING_DIR, hash_sha256)
+
+def ruta_hoja(hash_sha256: str, indice_hoja: int) -> str:
+    return os.path.join(directorio_archivo(hash_sha256), f"hoja_{indice_hoja:03d}.parquet")
+
+def _texto(valor: Any) -> Optional[str]:
+    return None if valor is None else str(valor)
+
+class EscritorStaging:
+    """Escribe los lotes limpios de una hoja en un Parquet comprimido, por grupos de filas"""
+
+    def __init__(self, destino: str):
+        self.destino = destino
+        self.temporal = destino + '.tmp'
+        self._writer = None
+
+    def escribir(self, lote: List[Dict[str, Any]]):
+        if not lote:
+            return
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.destino), exist_ok=True)
+            self._writer = pq.ParquetWriter(self.temporal, esquema(), compression=settings.STAGING_COMPRESION)
+        columnas = {
+            columna: [fila.get(columna) if columna == 'fecha' else _texto(fila.get(columna)) for fila in lote]
+            for columna in COLUMNAS_STAGING
+        }
+        self._writer.write_table(pa.table(columnas, schema=esquema()))
+
+    def cerrar(self):
+        """Publica la parte solo si la hoja se leyó completa"""
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self.temporal, self.destino)
+
+    def descartar(self):
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+def descartar_archivo(hash_sha256: str):
+    """Elimina el staging de un archivo que no terminó de cargarse"""
+    shutil.rmtree(directorio_archivo(hash_sha256), ignore_errors=True)
+
+def archivos_en_staging() -> List[str]:
+    """Hashes con al menos una parte publicada"""
+    if not os.path.isdir(settings.STAGING_DIR):
+        return []
+    return sorted(
+        nombre for nombre in os.listdir(settings.STAGING_DIR)
+        if any(parte.endswith('.parquet') for parte in os.listdir(directorio_archivo(nombre)))
+    )
+
+def leer_archivo(
+    hash_sha256: str,
+    columnas: Optional[List[str]] = None,
+    fecha_inicio: Optional[date] = None,
+    fecha_fin: Optional[date] = None,
+) -> pd.DataFrame:
+    """Lee las partes de un archivo (solo las columnas pedidas y, si se indica, el rango de fechas incluido)"""
+    filtros = []
+    if fecha_inicio:
+        filtros.append(('fecha', '>=', datetime.combine(fecha_inicio, datetime.min.time())))
+    if fecha_fin:
+        filtros.append(('fecha', '<', datetime.combine(fecha_fin + timedelta(days=1), datetime.min.time())))
+
+    directorio = directorio_archivo(hash_sha256)
+    partes = sorted(
+        os.path.join(directorio, parte) for parte in os.listdir(directorio) if parte.endswith('.parquet')
+    )
+    tablas = [pq.read_table(parte, columns=columnas, filters=filtros or None) for parte in partes]
+    return pa.concat_tables(tablas).to_pandas() if tablas else pd.DataFrame(columns=columnas)
+
+def iterar_archivos(orden: Optional[List[str]] = None, **opciones) -> Iterator[pd.DataFrame]:
+    """DataFrame limpio de cada archivo en staging; primero los hashes de orden, en ese orden"""
+    disponibles = archivos_en_staging()
+    prioridad = {hash_sha256: posicion for posicion, hash_sha256 in enumerate(orden or [])}
+    for hash_sha256 in sorted(disponibles, key=lambda h: (prioridad.get(h, len(prioridad)), h)):
+        yield leer_archivo(hash_sha256, **opciones)
@@ -0,0 +1,168 @@
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, delete, insert, select
+from sqlalchemy.engine import Engine
+
+from app.models.database import IncidenciaOperativa, IncidenciaRechazada
+from app.utils.validators import validar_emails, validar_horas, validar_longitudes
+
+logger = logging.getLogger(__name__)
+
+# Motivos de rechazo: se guardan en incidencias_rechazadas y etiquetan las métricas de ingesta
+FECHA_INVALIDA = 'fecha_invalida'
+HORA_INVALIDA = 'hora_invalida'
+OPERADOR_INVALIDO = 'operador_invalido'
+LONGITUD_EXCEDIDA = 'longitud_excedida'
+
+# Horas que deben poder guardarse como segundos (ciclo es un número, no una hora)
+COLUMNAS_HORA = ('hora_programada', 'hora_real', 'hora_de_incidencia')
+
+# Ejemplos de filas rechazadas por archivo en el estado de la ingesta
+MAX_EJEMPLOS = 5
+
+def longitudes_maximas() -> Dict[str, int]:
+    """Largo de las columnas String(n) de incidencias_operativas que vienen del Excel"""
+    return {
+        columna.name: columna.type.length
+        for columna in IncidenciaOperativa.__table__.columns
+        if isinstance(columna.type, String) and columna.type.length and columna.name != 'huella'
+    }
+
+def _valor_json(valor: Any) -> Any:
+    """Valores crudos de Excel (datetime, time, timedelta, NaN) como algo serializable"""
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    if isinstance(valor, (str, int, float, bool)):
+        return valor
+    return str(valor)
+
+class ValidadorIncidencias:
+    """Valida un lote por columnas y separa las filas rechazadas, con sus motivos"""
+
+    def __init__(self):
+        self.longitudes = longitudes_maximas()
+
+    def validar(
+        self, procesado: pd.DataFrame, crudo: Optional[pd.DataFrame] = None
+    ) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+        """Devuelve (filas válidas, rechazadas)
+
+        procesado es la salida de DataProcessor.procesar_dataframe; crudo, el lote antes de procesar
+        (con el número de fila de la hoja como índice), de donde se guardan los valores originales.
+        """
+        errores = self._errores(procesado)
+        if not errores:
+            return procesado, []
+
+        invalidas = np.zeros(len(procesado), dtype=bool)
+        for _, _, mascara in errores:
+            invalidas |= mascara
+        posiciones = np.flatnonzero(invalidas)
+
+        # Motivos y columnas de cada fila rechazada, en el orden de las comprobaciones
+        motivos = {posicion: [] for posicion in posiciones}
+        columnas = {posicion: [] for posicion in posiciones}
+        for motivo, columna, mascara in errores:
+            for posicion in np.flatnonzero(mascara):
+                if motivo not in motivos[posicion]:
+                    motivos[posicion].append(motivo)
+                columnas[posicion].append(columna)
+
+        origen = crudo if crudo is not None else procesado
+        valores = origen.iloc[posiciones].to_dict('records')
+        filas = origen.index[posiciones]
+        rechazadas = [
+            {
+                'fila': int(fila) if isinstance(fila, (int, np.integer)) else None,
+                'motivos': ','.join(motivos[posicion]),
+                'columnas': ','.join(columnas[posicion]),
+                'datos': json.dumps(
+                    {columna: _valor_json(valor) for columna, valor in registro.items()}, ensure_ascii=False
+                ),
+            }
+            for posicion, fila, registro in zip(posiciones, filas, valores)
+        ]
+        return procesado[~invalidas], rechazadas
+
+    def _errores(self, df: pd.DataFrame) -> List[Tuple[str, str, np.ndarray]]:
+        """(motivo, columna, máscara de filas inválidas) de cada comprobación que falla en el lote"""
+        comprobaciones = [(FECHA_INVALIDA, 'fecha', df['fecha'].isna().to_numpy())]
+        for columna in COLUMNAS_HORA:
+            if columna in df.columns:
+                comprobaciones.append((HORA_INVALIDA, columna, ~validar_horas(df[columna])))
+        if 'operador' in df.columns:
+            comprobaciones.append((OPERADOR_INVALIDO, 'operador', ~validar_emails(df['operador'])))
+        for columna, maximo in self.longitudes.items():
+            if columna in df.columns:
+                comprobaciones.append((LONGITUD_EXCEDIDA, columna, ~validar_longitudes(df[columna], maximo)))
+        return [comprobacion for comprobacion in comprobaciones if comprobacion[2].any()]
+
+def contar_motivos(rechazadas: Iterable[Dict[str, Any]]) -> Counter:
+    """Filas rechazadas por motivo (una fila con dos motivos cuenta en ambos)"""
+    return Counter(motivo for fila in rechazadas for motivo in fila['motivos'].split(','))
+
+class CuarentenaIncidencias:
+    """Tabla incidencias_rechazadas: las filas que no pasaron la validación, por archivo"""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.tabla = IncidenciaRechazada.__table__
+
+    def registrar(
+        self, filas: List[Dict[str, Any]], hash_sha256: Optional[str], archivo: str, hoja: Any
+    ) -> int:
+        """Guarda un lote de rechazadas en un solo INSERT"""
+        if not filas:
+            return 0
+        rechazada = datetime.now()
+        with self.engine.begin() as conexion:
+            conexion.execute(insert(self.tabla), [
+                {
+                    **fila, 'hash_sha256': hash_sha256, 'archivo': archivo, 'hoja': str(hoja),
+                    'rechazada': rechazada,
+                }
+                for fila in filas
+            ])
+        return len(filas)
+
+    def descartar_archivos(self, hashes: Iterable[str]):
+        """Borra los rechazos de cargas anteriores de estos archivos (se vuelven a validar)"""
+        hashes = [hash_sha256 for hash_sha256 in hashes if hash_sha256]
+        if not hashes:
+            return
+        with self.engine.begin() as conexion:
+            borradas = conexion.execute(delete(self.tabla).where(self.tabla.c.hash_sha256.in_(hashes))).rowcount
+        if borradas:
+            logger.info(f"{borradas} rechazos anteriores descartados para {len(hashes)} archivos")
+
+    def listar(
+        self, hash_sha256: Optional[str] = None, archivo: Optional[str] = None, motivo: Optional[str] = None,
+        despues_de: int = 0, limite: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Rechazos en orden de id (paginados por el último id recibido), con los datos originales"""
+        tabla = self.tabla
+        consulta = select(tabla).where(tabla.c.id > despues_de).order_by(tabla.c.id).limit(limite)
+        if hash_sha256:
+            consulta = consulta.where(tabla.c.hash_sha256 == hash_sha256)
+        if archivo:
+            consulta = consulta.where(tabla.c.archivo == archivo)
+        if motivo:
+            consulta = consulta.where((',' + tabla.c.motivos + ',').contains(f',{motivo},', autoescape=True))
+        with self.engine.connect() as conexion:
+            filas = conexion.execute(consulta).mappings().all()
+        return [
+            {
+                **fila,
+                'motivos': fila['motivos'].split(','),
+                'columnas': fila['columnas'].split(',') if fila['columnas'] else [],
+                'datos': json.loads(fila['datos']) if fila['datos'] else None,
+                'rechazada': fila['rechazada'].strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for fila in filas
+        ]
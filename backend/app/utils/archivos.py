@@ -0,0 +1,50 @@
+import hashlib
+import os
+import uuid
+import zipfile
+from typing import BinaryIO, List, Tuple
+
+# Extensiones que acepta la ingesta
+EXTENSIONES_EXCEL = ('.xlsx', '.xls')
+
+# Tamaño de bloque para copiar y calcular hashes
+TAMANO_BLOQUE = 1024 * 1024
+
+def copiar_con_hash(origen: BinaryIO, file_path: str) -> str:
+    """Copia un stream a disco por bloques y devuelve su SHA-256"""
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "wb") as buffer:
+        while True:
+            bloque = origen.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            hash_sha256.update(bloque)
+            buffer.write(bloque)
+    return hash_sha256.hexdigest()
+
+def hash_archivo(file_path: str) -> str:
+    """SHA-256 del contenido de un archivo"""
+    hash_sha256 = hashlib.sha256()
+    with open(file_path, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE), b''):
+            hash_sha256.update(bloque)
+    return hash_sha256.hexdigest()
+
+def expandir_zip(zip_path: str, destino: str) -> List[Tuple[str, str, str]]:
+    """Extrae los Excel de un zip a destino; devuelve (nombre, ruta, sha256) en orden de nombre"""
+    extraidos = []
+    with zipfile.ZipFile(zip_path) as archivo_zip:
+        miembros = sorted(
+            (miembro for miembro in archivo_zip.infolist()
+             if not miembro.is_dir()
+             and not os.path.basename(miembro.filename).startswith(('.', '~$'))
+             and '__MACOSX' not in miembro.filename
+             and miembro.filename.lower().endswith(EXTENSIONES_EXCEL)),
+            key=lambda miembro: miembro.filename
+        )
+        for miembro in miembros:
+            # Nombre propio en destino: las rutas del zip nunca se usan para escribir
+            file_path = os.path.join(destino, f"{uuid.uuid4().hex}_{os.path.basename(miembro.filename)}")
+            with archivo_zip.open(miembro) as origen:
+                extraidos.append((miembro.filename, file_path, copiar_con_hash(origen, file_path)))
+    return extraidos
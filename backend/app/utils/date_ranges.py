@@ -0,0 +1,13 @@
+from datetime import datetime, timedelta
+from typing import Tuple
+
+def rango_dia(fecha_str: str) -> Tuple[datetime, datetime]:
+    """Devuelve el rango semiabierto [inicio, fin) de un día YYYY-MM-DD"""
+    inicio = datetime.strptime(fecha_str, '%Y-%m-%d')
+    return inicio, inicio + timedelta(days=1)
+
+def rango_fechas(fecha_inicio: str, fecha_fin: str) -> Tuple[datetime, datetime]:
+    """Rango semiabierto que incluye completos los días fecha_inicio y fecha_fin"""
+    inicio, _ = rango_dia(fecha_inicio)
+    _, fin = rango_dia(fecha_fin)
+    return inicio, fin
@@ -0,0 +1,71 @@
+import json
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.types import Date, DateTime, TypeEngine
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la biblioteca estándar
+    orjson = None
+
+# numpy (almacén analítico) y claves no str (p. ej. años) se serializan sin convertir antes
+OPCIONES_ORJSON = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+def a_json(contenido: Any) -> bytes:
+    """JSON en UTF-8; los tipos poco comunes (Decimal, Timestamp...) pasan por jsonable_encoder"""
+    if orjson is not None:
+        return orjson.dumps(contenido, default=jsonable_encoder, option=OPCIONES_ORJSON)
+    return json.dumps(
+        contenido, default=jsonable_encoder, ensure_ascii=False, allow_nan=False, separators=(',', ':')
+    ).encode('utf-8')
+
+class RespuestaJSON(JSONResponse):
+    """Respuesta JSON por defecto de la API (orjson si está instalado)
+
+    Devolverla directamente desde un endpoint evita además el recorrido de jsonable_encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return a_json(content)
+
+def formatear_fecha_hora(valor: datetime) -> str:
+    """'YYYY-MM-DD HH:MM:SS' (el formato histórico de la API, más rápido que strftime)"""
+    return valor.isoformat(' ', 'seconds')
+
+def conversor_tipo(tipo: Optional[TypeEngine]) -> Optional[Callable[[Any], Any]]:
+    """Conversión previa a JSON según el tipo SQL de la columna (None si el valor sale tal cual)"""
+    if isinstance(tipo, DateTime):
+        return formatear_fecha_hora
+    if isinstance(tipo, Date):
+        return date.isoformat
+    return None
+
+def compilar_serializador(
+    nombres: Sequence[str], tipos: Sequence[Optional[TypeEngine]]
+) -> Callable[[Sequence], Dict[str, Any]]:
+    """Función tupla -> dict para una proyección; los conversores se resuelven una sola vez
+
+    Las columnas sobrantes al final de la tupla (p. ej. la clave del cursor) se ignoran.
+    """
+    nombres = tuple(nombres)
+    conversores = []
+    for nombre, tipo in zip(nombres, tipos):
+        conversor = conversor_tipo(tipo)
+        if conversor is not None:
+            conversores.append((nombre, conversor))
+
+    if not conversores:
+        return lambda fila: dict(zip(nombres, fila))
+
+    def serializar(fila: Sequence) -> Dict[str, Any]:
+        registro = dict(zip(nombres, fila))
+        for nombre, conversor in conversores:
+            valor = registro[nombre]
+            if valor is not None:
+                registro[nombre] = conversor(valor)
+        return registro
+
+    return serializar
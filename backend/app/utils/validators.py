@@ -2,6 +2,11 @@ import re
 from datetime import datetime
 from typing import Optional
 
+import numpy as np
+import pandas as pd
+
+from app.models.database import hora_a_segundos
+
 def validar_email(email: str) -> bool:
     """Valida formato de email"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -21,4 +26,27 @@ def validar_hora(hora_str: str) -> bool:
         datetime.strptime(hora_str, '%H:%M:%S')
         return True
     except ValueError:
-        return False
\ No newline at end of file
+        return False
+
+# Versiones por columna (pandas): cada valor distinto se valida una sola vez y los vacíos son válidos
+
+PATRON_EMAIL = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+def _validar_unicos(serie: pd.Series, es_valido) -> np.ndarray:
+    """Aplica es_valido a cada valor distinto y devuelve la máscara de la columna"""
+    codigos, unicos = pd.factorize(serie.to_numpy(dtype=object))
+    # El código -1 (vacío) toma el último elemento: válido
+    validos = np.append(np.array([es_valido(valor) for valor in unicos], dtype=bool), True)
+    return validos[codigos]
+
+def validar_emails(serie: pd.Series) -> np.ndarray:
+    """validar_email para toda una columna"""
+    return _validar_unicos(serie, lambda valor: PATRON_EMAIL.fullmatch(str(valor).strip()) is not None)
+
+def validar_horas(serie: pd.Series) -> np.ndarray:
+    """Horas interpretables como segundos (HH:MM[:SS], time o timedelta)"""
+    return _validar_unicos(serie, lambda valor: hora_a_segundos(valor) is not None)
+
+def validar_longitudes(serie: pd.Series, maximo: int) -> np.ndarray:
+    """Valores que caben en una columna String(maximo)"""
+    return _validar_unicos(serie, lambda valor: len(str(valor)) <= maximo)
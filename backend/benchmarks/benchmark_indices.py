@@ -0,0 +1,178 @@
+"""
+Benchmark de índices sobre incidencias_operativas.
+
+Crea una tabla sintética (por defecto 2 millones de filas) sin índices secundarios,
+mide latencia y plan de ejecución de las consultas que usan /queries y /reports,
+crea los índices del modelo (los mismos de la migración 0002) y vuelve a medir.
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_indices --filas 2000000 --url sqlite:///./bench_indices.db
+    python -m benchmarks.benchmark_indices --salida resultados_indices.json
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.database import CATALOGOS, Base, Empresa, IncidenciaOperativa, ResumenDiario
+from app.services.calendario import tipo_dia
+from app.services.catalogos import CatalogoDimensiones
+from app.services.report_generator import ReportGenerator
+from app.services.rollup import RollupService
+
+TRONCALES = ['T1', 'T2', 'T3', 'T4', 'T5']
+TURNOS = ['Mañana', 'Tarde', 'Noche', 'No definido']
+EMPRESAS = sorted(set(settings.EMPRESAS_MAPPING.values())) + ['Desconocida']
+INCIDENCIAS = [f'Incidencia {i:02d}' for i in range(40)]
+
+def poblar_tabla(engine, filas: int, dias: int, semilla: int = 42):
+    """Inserta filas sintéticas repartidas en los últimos `dias` días"""
+    aleatorio = random.Random(semilla)
+    inicio = datetime(2025, 1, 1)
+    tabla = IncidenciaOperativa.__table__
+    catalogos = CatalogoDimensiones(engine)
+    bloque = 50_000
+
+    for desde in range(0, filas, bloque):
+        lote = []
+        for _ in range(min(bloque, filas - desde)):
+            fecha = inicio + timedelta(seconds=aleatorio.randrange(dias * 86400))
+            lote.append({
+                'fecha': fecha,
+                'troncal': aleatorio.choice(TRONCALES),
+                'ruta': f'Ruta {aleatorio.randint(1, 60)}',
+                'bus': str(aleatorio.randint(1000, 1600)),
+                'hora_programada': fecha.strftime('%H:%M:%S'),
+                'incidencia_primaria': aleatorio.choice(INCIDENCIAS),
+                'tipo_dia': tipo_dia(fecha),
+                'turno': aleatorio.choice(TURNOS),
+                'empresa': aleatorio.choice(EMPRESAS),
+            })
+        # turno, tipo_dia y empresa se guardan como ids de sus catálogos
+        catalogos.codificar(lote)
+        for fila in lote:
+            for dimension in CATALOGOS:
+                del fila[dimension]
+        with engine.begin() as conexion:
+            conexion.execute(insert(tabla), lote)
+
+def consultas(dia: datetime):
+    """Consultas equivalentes a las de los endpoints, con rangos semiabiertos"""
+    I = IncidenciaOperativa
+    fin_dia = dia + timedelta(days=1)
+    return {
+        '/queries/incidencias (día + troncal)': select(I).where(
+            I.fecha >= dia, I.fecha < fin_dia, I.troncal == 'T2'
+        ),
+        '/queries/incidencias (semana + empresa)': select(I).where(
+            I.fecha >= dia, I.fecha < dia + timedelta(days=7),
+            I.empresa_id == select(Empresa.id).where(Empresa.nombre == EMPRESAS[0]).scalar_subquery()
+        ),
+        '/queries/estadisticas/diarias': select(func.count(I.id), I.turno_id).where(
+            I.fecha >= dia, I.fecha < fin_dia
+        ).group_by(I.turno_id),
+        '/queries/tendencias/mensuales': select(
+            func.extract('month', I.fecha).label('mes'), func.count(I.id)
+        ).where(
+            I.fecha >= datetime(dia.year, 1, 1), I.fecha < datetime(dia.year + 1, 1, 1)
+        ).group_by('mes'),
+        '/reports/top-incidencias': select(I.incidencia_primaria, func.count(I.id)).group_by(
+            I.incidencia_primaria
+        ).order_by(func.count(I.id).desc()).limit(10),
+    }
+
+def plan(engine, consulta) -> list:
+    """Plan de ejecución según el dialecto"""
+    sql = str(consulta.compile(engine, compile_kwargs={'literal_binds': True}))
+    prefijo = 'EXPLAIN QUERY PLAN ' if engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    with engine.connect() as conexion:
+        return [' '.join(str(c) for c in fila) for fila in conexion.execute(text(prefijo + sql))]
+
+def medir(funcion, repeticiones: int) -> dict:
+    """Latencia en milisegundos (mediana y máximo) de varias ejecuciones"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {'mediana_ms': round(statistics.median(tiempos), 2), 'max_ms': round(max(tiempos), 2)}
+
+def ejecutar_ronda(engine, dia: datetime, repeticiones: int) -> dict:
+    """Mide todas las consultas y el reporte diario completo"""
+    resultados = {}
+    for nombre, consulta in consultas(dia).items():
+        def correr(consulta=consulta):
+            with engine.connect() as conexion:
+                conexion.execute(consulta).fetchall()
+        resultados[nombre] = {**medir(correr, repeticiones), 'plan': plan(engine, consulta)}
+
+    def reporte_diario():
+        with Session(engine) as sesion:
+            ReportGenerator(sesion).generar_reporte_diario(dia.strftime('%Y-%m-%d'))
+    resultados['/reports/diario'] = medir(reporte_diario, repeticiones)
+    return resultados
+
+def main():
+    argumentos = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentos.add_argument('--url', default='sqlite:///./bench_indices.db')
+    argumentos.add_argument('--filas', type=int, default=2_000_000)
+    argumentos.add_argument('--dias', type=int, default=365)
+    argumentos.add_argument('--repeticiones', type=int, default=5)
+    argumentos.add_argument('--salida', help='Archivo JSON con los resultados')
+    opciones = argumentos.parse_args()
+
+    engine = create_engine(opciones.url)
+    tabla = IncidenciaOperativa.__table__
+    Base.metadata.drop_all(engine, tables=[tabla, ResumenDiario.__table__])
+    # Catálogos de turno/tipo_dia/empresa y daily_rollup (el reporte diario lee del rollup)
+    Base.metadata.create_all(
+        engine, tables=[catalogo.__table__ for catalogo in CATALOGOS.values()] + [ResumenDiario.__table__]
+    )
+
+    # Tabla sin índices secundarios (estado previo a la migración 0002)
+    indices = set(tabla.indexes)
+    tabla.indexes.clear()
+    tabla.create(engine)
+    tabla.indexes.update(indices)
+
+    print(f"Poblando {opciones.filas} filas...")
+    inicio = time.perf_counter()
+    poblar_tabla(engine, opciones.filas, opciones.dias)
+    RollupService(engine).reconstruir()
+    print(f"  listo en {time.perf_counter() - inicio:.1f}s")
+
+    dia = datetime(2025, 3, 12)
+    antes = ejecutar_ronda(engine, dia, opciones.repeticiones)
+
+    print("Creando índices del modelo...")
+    for indice in sorted(tabla.indexes, key=lambda i: i.name):
+        indice.create(engine)
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as conexion:
+            conexion.execute(text('ANALYZE'))
+    despues = ejecutar_ronda(engine, dia, opciones.repeticiones)
+
+    print(f"\n{'Consulta':45} {'antes (ms)':>12} {'después (ms)':>14}")
+    for nombre in antes:
+        print(f"{nombre:45} {antes[nombre]['mediana_ms']:>12} {despues[nombre]['mediana_ms']:>14}")
+        for etapa, datos in (('antes', antes[nombre]), ('después', despues[nombre])):
+            for linea in datos.get('plan', []):
+                print(f"    [{etapa}] {linea}")
+
+    if opciones.salida:
+        with open(opciones.salida, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'filas': opciones.filas,
+                'dialecto': engine.dialect.name,
+                'antes': antes,
+                'despues': despues,
+            }, archivo, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+Suite de benchmarks de la ingesta y de la API.
+
+Genera una base sintética (benchmarks.datos_sinteticos) y mide:
+  - ExcelParser.parse_excel sobre todas las hojas de un libro generado
+  - DataProcessor.procesar_fila fila por fila (y procesar_dataframe como referencia)
+  - POST /upload/ hasta que el job termina
+  - todos los GET de /queries y /reports
+Cada medición registra mediana, p95 y máximo en milisegundos, el pico de memoria Python
+(tracemalloc) y el pico de RSS de los procesos hijos (el parseo de la subida corre en el pool de
+procesos), estos dos en una corrida aparte para no distorsionar los tiempos. Los resultados se
+guardan en JSON junto con el commit, para comparar contra una corrida anterior con --comparar.
+
+Uso (desde backend/):
+    python -m benchmarks.benchmark_suite --filas-base 200000 --filas-excel 20000
+    python -m benchmarks.benchmark_suite --salida benchmarks/resultados/actual.json --comparar benchmarks/resultados/anterior.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+DIRECTORIO_RESULTADOS = os.path.join(os.path.dirname(__file__), 'resultados')
+
+def rss_descendientes() -> Optional[int]:
+    """RSS total en bytes de los procesos descendientes de este, leído de /proc (None fuera de Linux)"""
+    if not os.path.isdir('/proc/self'):
+        return None
+    padres, rss = {}, {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat', encoding='ascii', errors='replace') as archivo:
+                # El nombre del proceso va entre paréntesis y puede tener espacios
+                campos = archivo.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        padres[int(entrada)], rss[int(entrada)] = int(campos[1]), int(campos[21])
+    pendientes, total = [os.getpid()], 0
+    while pendientes:
+        padre = pendientes.pop()
+        for pid, ppid in padres.items():
+            if ppid == padre:
+                pendientes.append(pid)
+                total += rss[pid]
+    return total * os.sysconf('SC_PAGE_SIZE')
+
+class MuestreoHijos:
+    """Muestrea en un hilo el RSS de los procesos hijos mientras dura el bloque y guarda el pico
+
+    Los procesos del pool de parseo sobreviven entre subidas: `inicial` separa su RSS en reposo de
+    lo que creció durante la medición.
+    """
+
+    def __init__(self, intervalo: float = 0.05):
+        self.intervalo = intervalo
+        self.inicial: Optional[int] = None
+        self.pico: Optional[int] = None
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def __enter__(self):
+        self.inicial = self.pico = rss_descendientes()
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *_):
+        self._detener.set()
+        self._hilo.join()
+        muestra = rss_descendientes()
+        if muestra is not None:
+            self.pico = max(self.pico or 0, muestra)
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            muestra = rss_descendientes()
+            if muestra is not None:
+                self.pico = max(self.pico or 0, muestra)
+
+def medir(funcion: Callable, repeticiones: int, memoria: bool = True) -> Dict:
+    """Primera ejecución aparte (cachés frías) y estadísticas de las siguientes, en milisegundos"""
+    tiempos = []
+    for _ in range(repeticiones + 1):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    primera, resto = tiempos[0], sorted(tiempos[1:]) or tiempos
+    resultado = {
+        'primera_ms': round(primera, 2),
+        'mediana_ms': round(statistics.median(resto), 2),
+        'p95_ms': round(resto[min(len(resto) - 1, math.ceil(0.95 * len(resto)) - 1)], 2),
+        'max_ms': round(max(resto), 2),
+        'repeticiones': len(resto),
+    }
+    if memoria:
+        tracemalloc.start()
+        try:
+            with MuestreoHijos() as hijos:
+                funcion()
+            resultado['pico_memoria_mb'] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+        # tracemalloc solo ve este proceso; el parseo de la subida ocurre en los hijos
+        if hijos.pico is not None:
+            resultado['pico_rss_hijos_mb'] = round(hijos.pico / 2**20, 2)
+            resultado['aumento_rss_hijos_mb'] = round((hijos.pico - hijos.inicial) / 2**20, 2)
+    return resultado
+
+def commit_actual() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def endpoints(fecha_inicio: str, fecha_fin: str, dia: str, anio: int) -> Dict[str, tuple]:
+    """GET de /queries y /reports con parámetros representativos: nombre -> (ruta, parámetros)"""
+    return {
+        '/queries/incidencias': ('/api/v1/queries/incidencias', {'limite': 100}),
+        '/queries/incidencias (filtros + total)': ('/api/v1/queries/incidencias', {
+            'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin, 'troncal': 'T2', 'empresa': 'STG',
+            'limite': 500, 'incluir_total': True,
+        }),
+        '/queries/incidencias/total': ('/api/v1/queries/incidencias/total', {'troncal': 'T1'}),
+        '/queries/incidencias/buscar': ('/api/v1/queries/incidencias/buscar', {'q': 'avería mecánica', 'limite': 100}),
+        '/queries/incidencias/total (q)': ('/api/v1/queries/incidencias/total', {'q': 'congestion'}),
+        '/queries/incidencias/export': ('/api/v1/queries/incidencias/export', {
+            'fecha_inicio': dia, 'fecha_fin': dia, 'formato': 'csv',
+        }),
+        '/queries/estadisticas/diarias': ('/api/v1/queries/estadisticas/diarias', {'fecha': dia}),
+        '/queries/tendencias/mensuales': ('/api/v1/queries/tendencias/mensuales', {'año': anio}),
+        '/reports/diario': ('/api/v1/reports/diario', {'fecha': dia}),
+        '/reports/tendencia/semanal': ('/api/v1/reports/tendencia/semanal', {'fecha_fin': fecha_fin}),
+        '/reports/tendencia': ('/api/v1/reports/tendencia', {'fecha_fin': fecha_fin, 'dias': 90, 'granularidad': 'semana'}),
+        '/reports/comparativo': ('/api/v1/reports/comparativo', {'fecha1': dia, 'fecha2': fecha_inicio}),
+        '/reports/top-incidencias': ('/api/v1/reports/top-incidencias', {'limite': 10}),
+        '/reports/pivot': ('/api/v1/reports/pivot', {'dimensiones': 'troncal,turno,incidencia_primaria'}),
+        '/reports/retrasos': ('/api/v1/reports/retrasos', {'agrupar': 'ruta'}),
+        '/reports/cache': ('/api/v1/reports/cache', {}),
+    }
+
+def comparar(actual: Dict, anterior: Dict, tolerancia: float) -> List[str]:
+    """Mediciones cuya mediana empeoró más que la tolerancia (0.2 = 20 %)"""
+    regresiones = []
+    print(f"\n{'Medición':48} {'anterior (ms)':>14} {'actual (ms)':>12} {'cambio':>8}")
+    for nombre, datos in actual['resultados'].items():
+        previo = anterior.get('resultados', {}).get(nombre)
+        if not previo or 'mediana_ms' not in previo or 'mediana_ms' not in datos:
+            continue
+        cambio = datos['mediana_ms'] / previo['mediana_ms'] - 1 if previo['mediana_ms'] else 0
+        marca = '  <-- regresión' if cambio > tolerancia else ''
+        print(f"{nombre:48} {previo['mediana_ms']:>14} {datos['mediana_ms']:>12} {cambio:>+8.1%}{marca}")
+        if marca:
+            regresiones.append(nombre)
+    return regresiones
+
+def ejecutar(opciones: argparse.Namespace, directorio: str) -> Dict:
+    """Puebla la base, genera los libros, corre todas las mediciones y escribe el JSON"""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.models.database import Base, db
+    from app.routes.upload import job_manager
+    from app.services.cache import cache_respuestas
+    from app.services.data_processor import DataProcessor
+    from app.services.excel_parser import ExcelParser
+    from benchmarks.datos_sinteticos import GeneradorSintetico
+
+    generador = GeneradorSintetico(opciones.filas_base, dias=opciones.dias)
+    resultados = {}
+
+    print(f"Poblando {opciones.filas_base} filas en {db.engine.url}...")
+    Base.metadata.drop_all(db.engine)
+    inicio = time.perf_counter()
+    generador.poblar_base(db.engine)
+    segundos = time.perf_counter() - inicio
+    resultados['poblar_base'] = {
+        'filas': opciones.filas_base, 'segundos': round(segundos, 2),
+        'filas_por_segundo': round(opciones.filas_base / segundos),
+    }
+
+    # Libros distintos (otra semilla) para que la subida no se descarte por hash repetido
+    print(f"Generando {opciones.repeticiones_upload + 2} libros de {opciones.filas_excel} filas...")
+    libros = [
+        generador.escribir_excel(
+            os.path.join(directorio, f'incidencias_{numero}.xlsx'), opciones.filas_excel, semilla=10_000 + numero
+        )
+        for numero in range(opciones.repeticiones_upload + 2)
+    ]
+
+    # El libro trae una hoja por troncal: se parsean todas, como en la ingesta (la de resumen no tiene Fecha)
+    parser = ExcelParser()
+    hojas = parser.listar_hojas(libros[0])
+    resultados['ExcelParser.parse_excel'] = {
+        **medir(lambda: [parser.parse_excel(libros[0], hoja) for hoja in hojas], opciones.repeticiones),
+        'filas': opciones.filas_excel,
+        'hojas': len(hojas),
+    }
+
+    processor = DataProcessor()
+    crudas = parser.mapear_columnas(generador.dataframe(opciones.filas_excel, semilla=7))
+    registros = crudas.to_dict('records')
+    resultados['DataProcessor.procesar_fila'] = {
+        **medir(lambda: [processor.procesar_fila(registro) for registro in registros], opciones.repeticiones),
+        'filas': len(registros),
+    }
+    resultados['DataProcessor.procesar_dataframe'] = {
+        **medir(lambda: processor.procesar_dataframe(crudas.copy()), opciones.repeticiones),
+        'filas': len(crudas),
+    }
+
+    with TestClient(app) as cliente:
+        pendientes = iter(libros[1:])
+
+        def subir():
+            ruta = next(pendientes)
+            with open(ruta, 'rb') as archivo:
+                respuesta = cliente.post('/api/v1/upload/', files={'file': (os.path.basename(ruta), archivo)})
+            estado = job_manager.esperar(respuesta.json()['job_id'])
+            if estado['estado'] != 'completado':
+                raise RuntimeError(f"La subida de prueba terminó en {estado['estado']}: {estado.get('error')}")
+        # La corrida de memoria usa un libro más; el parseo ocurre en procesos hijos (ver pico_rss_hijos_mb)
+        resultados['POST /upload/'] = {
+            **medir(subir, max(opciones.repeticiones_upload - 1, 0)),
+            'filas': opciones.filas_excel,
+        }
+
+        fin = generador.fecha_inicio + timedelta(days=opciones.dias - 1)
+        medio = generador.fecha_inicio + timedelta(days=opciones.dias // 2)
+        casos = endpoints(
+            generador.fecha_inicio.isoformat(), fin.isoformat(), medio.isoformat(), generador.fecha_inicio.year
+        )
+
+        # Cualquier GET nuevo de /queries o /reports sin caso aparece como omitido en el JSON
+        rutas = {
+            ruta.path for ruta in app.routes
+            if 'GET' in getattr(ruta, 'methods', ()) and ruta.path.startswith(('/api/v1/queries', '/api/v1/reports'))
+        }
+        for ruta in sorted(rutas - {ruta for ruta, _ in casos.values()}):
+            resultados[f"GET {ruta.replace('/api/v1', '')}"] = {'omitido': 'sin parámetros de benchmark'}
+
+        for nombre, (ruta, parametros) in casos.items():
+            def consultar(ruta=ruta, parametros=parametros):
+                if not opciones.con_cache:
+                    cache_respuestas.limpiar()
+                respuesta = cliente.get(ruta, params=parametros)
+                if respuesta.status_code != 200:
+                    raise RuntimeError(f"{ruta} respondió {respuesta.status_code}: {respuesta.text[:200]}")
+            resultados[f"GET {nombre}"] = medir(consultar, opciones.repeticiones)
+
+    uso = resource.getrusage(resource.RUSAGE_SELF)
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss viene en KB en Linux y en bytes en macOS
+    unidad = 2**20 if sys.platform == 'darwin' else 2**10
+    salida = {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'dialecto': db.engine.dialect.name,
+        'parametros': {
+            clave: valor for clave, valor in vars(opciones).items() if clave not in ('salida', 'comparar')
+        },
+        'max_rss_mb': round(uso.ru_maxrss / unidad, 1),
+        'max_rss_hijos_mb': round(hijos.ru_maxrss / unidad, 1),
+        'resultados': resultados,
+    }
+
+    print(f"\n{'Medición':48} {'mediana (ms)':>13} {'p95 (ms)':>10} {'memoria (MB)':>13} {'RSS hijos (MB)':>15}")
+    for nombre, datos in resultados.items():
+        if 'mediana_ms' in datos:
+            print(
+                f"{nombre:48} {datos['mediana_ms']:>13} {datos['p95_ms']:>10} "
+                f"{datos.get('pico_memoria_mb', ''):>13} {'' if datos.get('pico_rss_hijos_mb') is None else datos['pico_rss_hijos_mb']:>15}"
+            )
+        elif 'omitido' in datos:
+            print(f"{nombre:48} {'omitido':>13}")
+
+    ruta_salida = opciones.salida or os.path.join(
+        DIRECTORIO_RESULTADOS, f"{datetime.now():%Y%m%d_%H%M%S}_{salida['commit'] or 'sin_commit'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(ruta_salida)), exist_ok=True)
+    with open(ruta_salida, 'w', encoding='utf-8') as archivo:
+        json.dump(salida, archivo, ensure_ascii=False, indent=2)
+    print(f"\nResultados en {ruta_salida}")
+    return salida
+
+def main():
+    argumentos = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentos.add_argument('--filas-base', type=int, default=200_000, help='Filas de la base sintética')
+    argumentos.add_argument('--filas-excel', type=int, default=20_000, help='Filas de cada Excel generado')
+    argumentos.add_argument('--dias', type=int, default=90)
+    argumentos.add_argument('--repeticiones', type=int, default=5)
+    argumentos.add_argument('--repeticiones-upload', type=int, default=2)
+    argumentos.add_argument('--url', help='Base a usar (por defecto una SQLite temporal); se borra y se puebla')
+    argumentos.add_argument('--con-cache', action='store_true', help='No vaciar la caché de respuestas entre repeticiones')
+    argumentos.add_argument('--salida', help=f'Archivo JSON (por defecto {DIRECTORIO_RESULTADOS}/<fecha>_<commit>.json)')
+    argumentos.add_argument('--comparar', help='JSON de una corrida anterior')
+    argumentos.add_argument('--tolerancia', type=float, default=0.2, help='Cambio de mediana que cuenta como regresión')
+    opciones = argumentos.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='bench_metrovia_')
+    # La configuración se lee al importar app: la base se elige antes de importar
+    os.environ['DATABASE_URL'] = opciones.url or f"sqlite:///{os.path.join(directorio, 'bench.db')}"
+    os.environ.pop('DATABASE_URL_ASYNC', None)
+
+    try:
+        salida = ejecutar(opciones, directorio)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    if opciones.comparar:
+        with open(opciones.comparar, encoding='utf-8') as archivo:
+            regresiones = comparar(salida, json.load(archivo), opciones.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones sobre {opciones.tolerancia:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
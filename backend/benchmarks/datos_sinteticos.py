@@ -0,0 +1,216 @@
+"""
+Generador de datos sintéticos de Metrovia para benchmarks.
+
+Produce DataFrames con los encabezados del Excel real (MAPEO_COLUMNAS), libros .xlsx con una
+hoja por troncal más una hoja de resumen, y bases pobladas con el mismo pipeline de la ingesta
+(DataProcessor + BulkInserter: catálogos, huellas y rollup). Una parte configurable de las horas
+sale en formatos "sucios" (HH:MM, H:MM, datetime de Excel, duraciones, vacíos) como en los
+exportes reales. Con la misma semilla los datos son idénticos.
+
+Uso (desde backend/):
+    python -m benchmarks.datos_sinteticos --filas 50000 --excel sintetico.xlsx
+    python -m benchmarks.datos_sinteticos --filas 1000000 --url sqlite:///./bench.db
+"""
+import argparse
+import time
+from datetime import date, datetime, time as hora, timedelta
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.models.database import Base
+from app.services.bulk_inserter import BulkInserter
+from app.services.data_processor import DataProcessor
+from app.services.excel_parser import ExcelParser
+
+# Tipos de incidencia y su frecuencia relativa
+INCIDENCIAS = {
+    'Retraso en salida': 30, 'Congestión vial': 18, 'Avería mecánica': 12, 'Falta de conductor': 8,
+    'Desvío de ruta': 7, 'Evasión de pasajeros': 6, 'Accidente de tránsito': 4, 'Falla de validador': 4,
+    'Puertas averiadas': 3, 'Agresión a conductor': 2, 'Bus fuera de servicio': 3, 'Manifestación': 1,
+    'Falla eléctrica': 2,
+}
+INCIDENCIAS_SECUNDARIAS = ['Reportado por supervisor', 'Reportado por usuario', 'Cámara de a bordo', 'Patio']
+OBSERVACIONES = ['Se informó a despacho', 'Bus reemplazado', 'Pasajeros transbordados', 'Sin novedad posterior']
+NOMBRES = ['Juan', 'Carlos', 'Luis', 'Jorge', 'María', 'José', 'Pedro', 'Ana', 'Miguel', 'Andrés', 'Fernando']
+APELLIDOS = ['Pérez', 'Mera', 'López', 'Morán', 'León', 'Paz', 'Vera', 'Castro', 'Zambrano', 'Cedeño', 'Alvarado']
+
+# Operadores que no están en EMPRESAS_MAPPING (empresa 'Desconocida')
+OPERADORES_EXTERNOS = ['despacho@metrovia.gob.ec', 'supervisor@metrovia-fundacion.org']
+
+# Formatos en que se escriben las horas sucias y su frecuencia relativa
+FORMATOS_SUCIOS = {'hh:mm': 4, 'h:mm': 2, 'excel_datetime': 2, 'duracion': 1, 'vacio': 1}
+
+# Día cero de las horas guardadas como datetime por Excel
+DIA_CERO_EXCEL = datetime(1899, 12, 30)
+
+SEGUNDOS_DIA = 24 * 3600
+
+class GeneradorSintetico:
+    """Incidencias sintéticas reproducibles con la estructura del Excel de Metrovia"""
+
+    def __init__(
+        self,
+        filas: int,
+        troncales: int = 7,
+        rutas_por_troncal: int = 6,
+        conductores: int = 800,
+        dias: int = 90,
+        fecha_inicio: date = date(2025, 1, 1),
+        proporcion_sucia: float = 0.15,
+        semilla: int = 42,
+    ):
+        self.filas = filas
+        self.troncales = [f'T{numero}' for numero in range(1, troncales + 1)]
+        self.rutas_por_troncal = rutas_por_troncal
+        self.conductores = conductores
+        self.dias = dias
+        self.fecha_inicio = fecha_inicio
+        self.proporcion_sucia = proporcion_sucia
+        self.semilla = semilla
+        self.operadores = list(settings.EMPRESAS_MAPPING) + OPERADORES_EXTERNOS
+
+    def dataframe(self, filas: Optional[int] = None, semilla: Optional[int] = None) -> pd.DataFrame:
+        """DataFrame con los encabezados del Excel (una fila por incidencia)"""
+        n = self.filas if filas is None else filas
+        rng = np.random.default_rng(self.semilla if semilla is None else semilla)
+
+        troncal = rng.integers(0, len(self.troncales), n)
+        ruta = rng.integers(1, self.rutas_por_troncal + 1, n)
+        codigo_ruta = np.char.add(
+            np.char.add(np.array(self.troncales)[troncal], '-R'), ruta.astype(str)
+        ).astype(object)
+
+        # Servicio de 05:00 a 23:30 con picos de la mañana y de la tarde
+        programada = np.where(
+            rng.random(n) < 0.6,
+            np.clip(rng.normal(np.where(rng.random(n) < 0.5, 7.5, 17.5), 1.5, n), 5, 23.5) * 3600,
+            rng.uniform(5, 23.5, n) * 3600,
+        ).astype(np.int64)
+        # Retrasos con cola larga y algunos adelantos; las horas reales cruzan medianoche
+        retraso = np.where(
+            rng.random(n) < 0.15, -rng.gamma(1.5, 60, n), rng.gamma(1.2, 240, n)
+        ).astype(np.int64)
+        real = (programada + retraso) % SEGUNDOS_DIA
+        incidencia = (programada + rng.integers(0, 600, n)) % SEGUNDOS_DIA
+
+        conductor = rng.integers(1, self.conductores + 1, n)
+        nombres_conductores = np.array([
+            f'{NOMBRES[numero % len(NOMBRES)]} {APELLIDOS[numero * 7 % len(APELLIDOS)]}'
+            for numero in range(self.conductores + 1)
+        ], dtype=object)
+        tipos, pesos = zip(*INCIDENCIAS.items())
+
+        return pd.DataFrame({
+            'Fecha': pd.Timestamp(self.fecha_inicio) + pd.to_timedelta(rng.integers(0, self.dias, n), unit='D'),
+            'Troncal': np.array(self.troncales, dtype=object)[troncal],
+            'Código de Ruta': codigo_ruta,
+            'Ruta': np.char.add('Ruta ', codigo_ruta.astype(str)).astype(object),
+            'Bus': rng.integers(1000, 1600, n).astype(str).astype(object),
+            'Bus de cambio': self._dispersa(rng, n, 0.05, rng.integers(1000, 1600, n).astype(str)),
+            'Hora programada': self._horas(rng, programada),
+            'Hora real': self._horas(rng, real),
+            'Ciclo': rng.integers(1, 13, n),
+            'Hora de incidencia': self._horas(rng, incidencia),
+            'Parada': np.char.add('Parada ', rng.integers(1, 41, n).astype(str)).astype(object),
+            'Incidencia primaria': np.array(tipos, dtype=object)[
+                rng.choice(len(tipos), n, p=np.array(pesos) / sum(pesos))
+            ],
+            'Incidencia secundaria': self._dispersa(rng, n, 0.2, np.array(INCIDENCIAS_SECUNDARIAS)[rng.integers(0, len(INCIDENCIAS_SECUNDARIAS), n)]),
+            'Código de conductor': np.char.add('C', np.char.zfill(conductor.astype(str), 4)).astype(object),
+            'Conductor': nombres_conductores[conductor],
+            'Operador': self._dispersa(rng, n, 0.97, np.array(self.operadores)[rng.integers(0, len(self.operadores), n)]),
+            'Observaciones': self._dispersa(rng, n, 0.1, np.array(OBSERVACIONES)[rng.integers(0, len(OBSERVACIONES), n)]),
+        })
+
+    def escribir_excel(self, ruta: str, filas: Optional[int] = None, semilla: Optional[int] = None) -> str:
+        """Libro .xlsx con una hoja por troncal y una hoja de resumen sin columna Fecha"""
+        df = self.dataframe(filas, semilla)
+        with pd.ExcelWriter(ruta, engine='openpyxl') as libro:
+            for troncal, hoja in df.groupby('Troncal', sort=True):
+                hoja.to_excel(libro, sheet_name=troncal, index=False)
+            df.groupby('Troncal').size().rename('Incidencias').reset_index().to_excel(
+                libro, sheet_name='Resumen', index=False
+            )
+        return ruta
+
+    def poblar_base(self, engine: Engine, tamano_lote: int = 100_000) -> Dict:
+        """Inserta las filas con el pipeline de la ingesta (procesado por columnas + BulkInserter)"""
+        Base.metadata.create_all(engine)
+        parser = ExcelParser()
+        processor = DataProcessor()
+        inserter = BulkInserter(engine)
+        resumen = {}
+        for desde in range(0, self.filas, tamano_lote):
+            df = parser.mapear_columnas(self.dataframe(min(tamano_lote, self.filas - desde), self.semilla + desde))
+            resumen = inserter.insertar(processor.procesar_dataframe(df).to_dict('records'))
+        return resumen
+
+    def _horas(self, rng: np.random.Generator, segundos: np.ndarray) -> np.ndarray:
+        """Horas como time (lo que entrega openpyxl); una proporción en formatos sucios"""
+        tabla_time = np.array(
+            [hora(s // 3600, s % 3600 // 60, s % 60) for s in range(SEGUNDOS_DIA)], dtype=object
+        )
+        resultado = tabla_time[segundos]
+
+        sucias = np.flatnonzero(rng.random(len(segundos)) < self.proporcion_sucia)
+        formatos, pesos = zip(*FORMATOS_SUCIOS.items())
+        elegidos = rng.choice(len(formatos), len(sucias), p=np.array(pesos) / sum(pesos))
+        for posicion, formato in enumerate(formatos):
+            indices = sucias[elegidos == posicion]
+            valores = segundos[indices]
+            if formato == 'hh:mm':
+                resultado[indices] = [f'{s // 3600:02d}:{s % 3600 // 60:02d}' for s in valores]
+            elif formato == 'h:mm':
+                resultado[indices] = [f'{s // 3600}:{s % 3600 // 60:02d}' for s in valores]
+            elif formato == 'excel_datetime':
+                resultado[indices] = [DIA_CERO_EXCEL + timedelta(seconds=int(s)) for s in valores]
+            elif formato == 'duracion':
+                resultado[indices] = [timedelta(seconds=int(s)) for s in valores]
+            else:
+                resultado[indices] = None
+        return resultado
+
+    def _dispersa(self, rng: np.random.Generator, n: int, proporcion: float, valores: np.ndarray) -> np.ndarray:
+        """Los valores dados en una proporción de las filas; el resto vacío"""
+        resultado = np.full(n, None, dtype=object)
+        presentes = rng.random(n) < proporcion
+        resultado[presentes] = valores[presentes]
+        return resultado
+
+def main():
+    argumentos = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    argumentos.add_argument('--filas', type=int, default=50_000)
+    argumentos.add_argument('--troncales', type=int, default=7)
+    argumentos.add_argument('--rutas-por-troncal', type=int, default=6)
+    argumentos.add_argument('--dias', type=int, default=90)
+    argumentos.add_argument('--proporcion-sucia', type=float, default=0.15)
+    argumentos.add_argument('--semilla', type=int, default=42)
+    argumentos.add_argument('--excel', help='Escribe un libro .xlsx en esta ruta')
+    argumentos.add_argument('--url', help='Puebla esta base de datos (p. ej. sqlite:///./bench.db)')
+    opciones = argumentos.parse_args()
+
+    generador = GeneradorSintetico(
+        opciones.filas, opciones.troncales, opciones.rutas_por_troncal, dias=opciones.dias,
+        proporcion_sucia=opciones.proporcion_sucia, semilla=opciones.semilla,
+    )
+    if opciones.excel:
+        inicio = time.perf_counter()
+        generador.escribir_excel(opciones.excel)
+        print(f"{opciones.filas} filas escritas en {opciones.excel} en {time.perf_counter() - inicio:.1f}s")
+    if opciones.url:
+        inicio = time.perf_counter()
+        resumen = generador.poblar_base(create_engine(opciones.url))
+        print(
+            f"{resumen.get('filas_insertadas', 0)} filas insertadas en {opciones.url} "
+            f"en {time.perf_counter() - inicio:.1f}s"
+        )
+    if not opciones.excel and not opciones.url:
+        argumentos.error('Indique --excel y/o --url')
+
+if __name__ == '__main__':
+    main()
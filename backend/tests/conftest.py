@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+# Base y ajustes de prueba: se fijan antes de que app.config lea el entorno (también en los procesos spawn)
+_DIRECTORIO = tempfile.mkdtemp(prefix='metrovia_pruebas_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_DIRECTORIO, 'incidencias.db')}"
+os.environ['STAGING_PARQUET'] = 'false'
+os.environ['CACHE_BACKEND'] = 'memoria'
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.models.database import Base
+
+@pytest.fixture
+def engine(tmp_path):
+    """Base SQLite vacía con todas las tablas"""
+    motor = create_engine(f"sqlite:///{tmp_path / 'incidencias.db'}")
+    Base.metadata.create_all(motor)
+    yield motor
+    motor.dispose()
+
+@pytest.fixture(scope='session')
+def cliente():
+    """Cliente de la API sobre la base de prueba, con 50 incidencias sintéticas (enero de 2025)"""
+    from app.main import app
+    from app.models.database import db
+    from benchmarks.datos_sinteticos import GeneradorSintetico
+
+    with TestClient(app) as cliente:
+        GeneradorSintetico(50, dias=5).poblar_base(db.engine)
+        yield cliente
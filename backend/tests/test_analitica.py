@@ -0,0 +1,37 @@
+from datetime import date
+
+import pytest
+
+from app.config import settings
+from app.services.analitica import AlmacenAnalitico
+from app.services.calendario import festivos
+from app.services.reproceso import ReprocesadorDerivados
+from benchmarks.datos_sinteticos import GeneradorSintetico
+
+# Lunes laborable dentro de los datos sintéticos
+DIA_REDECRETADO = date(2025, 1, 6)
+
+@pytest.fixture
+def limpiar_festivos():
+    yield
+    festivos.cache_clear()
+
+def _por_tipo_dia(almacen: AlmacenAnalitico, dia: date):
+    resultado = almacen.pivot(['tipo_dia'], fecha_inicio=dia, fecha_fin=dia)
+    return {fila['tipo_dia']: fila['total'] for fila in resultado['filas']}
+
+def test_almacen_recarga_filas_reescritas_por_otro_proceso(engine, monkeypatch, limpiar_festivos):
+    GeneradorSintetico(600, dias=10).poblar_base(engine)
+    # El almacén de la API, cargado antes de la reclasificación
+    almacen = AlmacenAnalitico(engine)
+    almacen.refrescar()
+    antes = _por_tipo_dia(almacen, DIA_REDECRETADO)
+    assert set(antes) == {'Laboral'}
+
+    # Decreto nuevo; la CLI reclasifica con su propio almacén: el de la API solo se entera por cambios_datos
+    monkeypatch.setattr(settings, 'FESTIVOS_ADICIONALES', {DIA_REDECRETADO.isoformat(): 'Feriado de prueba'})
+    resumen = ReprocesadorDerivados(engine).reclasificar_tipo_dia(regenerar=True)
+    assert resumen['filas_actualizadas'] == antes['Laboral']
+
+    almacen.refrescar()
+    assert _por_tipo_dia(almacen, DIA_REDECRETADO) == {'Festivo': antes['Laboral']}
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, select, text, update
+
+from app.models.database import TABLA_BUSQUEDA, IncidenciaOperativa
+from app.services.bulk_inserter import BulkInserter
+from app.services.busqueda import (
+    MAX_TERMINOS, coincidencias, normalizar_texto, terminos_busqueda, texto_busqueda,
+)
+from app.services.data_processor import DataProcessor
+
+# Clave -> campos de texto; el resto de la fila es igual en todas
+FILAS = {
+    'mecanica': {'incidencia_primaria': 'Avería mecánica', 'observaciones': 'Motor recalentado en la subida'},
+    'electrica': {'incidencia_primaria': 'Averia eléctrica', 'observaciones': 'Sin luces en la unidad al salir'},
+    'repetida': {'incidencia_primaria': 'Avería', 'observaciones': 'Avería otra vez en la unidad al salir'},
+    'congestion': {'incidencia_primaria': 'Congestión vehicular', 'parada': 'Parada Ñuñoa'},
+}
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('Avería MECÁNICA', 'averia mecanica'),
+    ('  Congestión\tvehicular  ', 'congestion vehicular'),
+    ('Ñuñoa pingüino', 'nunoa pinguino'),
+])
+def test_normalizar_texto(texto, esperado):
+    assert normalizar_texto(texto) == esperado
+
+def test_terminos_busqueda_sin_operadores():
+    assert terminos_busqueda('AVERÍA "mecán*" OR -motor') == ['averia', 'mecan', 'or', 'motor']
+    assert terminos_busqueda('  ') == []
+    assert len(terminos_busqueda(' '.join(f'p{numero}' for numero in range(20)))) == MAX_TERMINOS
+
+def test_texto_busqueda_omite_campos_vacios():
+    fila = {'incidencia_primaria': 'Avería', 'observaciones': '  ', 'parada': None, 'ruta': 'Ruta T1'}
+    assert texto_busqueda(fila) == 'averia ruta t1'
+    assert texto_busqueda({}) is None
+
+@pytest.fixture
+def ids(engine):
+    """Inserta FILAS y devuelve clave -> id"""
+    processor = DataProcessor()
+    filas = [
+        processor.procesar_fila({
+            'fecha': datetime(2025, 3, 3), 'troncal': 'T1', 'bus': str(1000 + numero),
+            'hora_programada': '07:30:00', 'hora_real': '07:34:00', 'codigo_de_conductor': 'C0001', **campos,
+        })
+        for numero, campos in enumerate(FILAS.values())
+    ]
+    BulkInserter(engine).insertar(filas)
+    with engine.connect() as conexion:
+        por_bus = dict(conexion.execute(select(IncidenciaOperativa.bus, IncidenciaOperativa.id)).all())
+    return {clave: por_bus[str(1000 + numero)] for numero, clave in enumerate(FILAS)}
+
+def buscar(engine, q):
+    """Ids que coinciden con q, del más al menos relevante"""
+    coincidencia = coincidencias(terminos_busqueda(q), 'sqlite')
+    with engine.connect() as conexion:
+        return conexion.execute(
+            select(coincidencia.c.id).order_by(coincidencia.c.puntaje, coincidencia.c.id)
+        ).scalars().all()
+
+@pytest.mark.parametrize('q, esperadas', [
+    ('averia', {'mecanica', 'electrica', 'repetida'}),
+    ('AVERÍA', {'mecanica', 'electrica', 'repetida'}),
+    ('aver', {'mecanica', 'electrica', 'repetida'}),
+    ('averia mecan', {'mecanica'}),
+    ('electrica', {'electrica'}),
+    ('congestión', {'congestion'}),
+    ('ñuñoa', {'congestion'}),
+    ('motor congestion', set()),
+    ('ica', set()),
+])
+def test_busqueda_sin_tildes_y_por_prefijo(engine, ids, q, esperadas):
+    assert set(buscar(engine, q)) == {ids[clave] for clave in esperadas}
+
+def test_orden_por_bm25(engine, ids):
+    # La palabra dos veces en un texto de largo parecido pesa más que una vez
+    resultado = buscar(engine, 'averia')
+    assert resultado[0] == ids['repetida']
+    assert resultado[-1] in (ids['mecanica'], ids['electrica'])
+
+def test_indice_sigue_a_la_tabla(engine, ids):
+    with engine.begin() as conexion:
+        conexion.execute(
+            update(IncidenciaOperativa.__table__)
+            .where(IncidenciaOperativa.id == ids['mecanica'])
+            .values(texto_busqueda=texto_busqueda({'incidencia_primaria': 'Ruido de frenos'}))
+        )
+        conexion.execute(delete(IncidenciaOperativa.__table__).where(IncidenciaOperativa.id == ids['congestion']))
+
+    assert set(buscar(engine, 'averia')) == {ids['electrica'], ids['repetida']}
+    assert buscar(engine, 'frenos') == [ids['mecanica']]
+    assert buscar(engine, 'congestion') == []
+    # FTS5 compara el índice con la tabla de contenido: falla si los triggers lo dejaron desfasado
+    with engine.begin() as conexion:
+        conexion.execute(text(f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}, rank) VALUES ('integrity-check', 1)"))
+
+def test_endpoint_buscar_pagina_por_relevancia(cliente):
+    # Las 50 filas sintéticas tienen 'Ruta ...' en su texto
+    todas = cliente.get('/api/v1/queries/incidencias/buscar?q=ruta&limite=1000').json()['incidencias']
+    assert len(todas) == 50
+
+    recorridas, cursor = [], None
+    while True:
+        parametros = {'q': 'ruta', 'limite': 7, 'fields': 'id', **({'cursor': cursor} if cursor else {})}
+        pagina = cliente.get('/api/v1/queries/incidencias/buscar', params=parametros).json()
+        recorridas.extend(pagina['incidencias'])
+        cursor = pagina['siguiente_cursor']
+        if cursor is None:
+            break
+
+    assert [fila['id'] for fila in recorridas] == [fila['id'] for fila in todas]
+    relevancias = [fila['relevancia'] for fila in recorridas]
+    assert relevancias == sorted(relevancias, reverse=True)
+
+def test_endpoint_buscar_errores(cliente):
+    assert cliente.get('/api/v1/queries/incidencias/buscar?q=%20*%20').status_code == 400
+    respuesta = cliente.get('/api/v1/queries/incidencias/buscar?q=ruta&cursor=no-es-un-cursor')
+    assert respuesta.status_code == 400
+    assert respuesta.json()['detail'] == 'Cursor inválido'
@@ -0,0 +1,47 @@
+import asyncio
+from datetime import date
+
+from app.services.cache import BackendMemoria, ResponseCache
+from app.services.cambios import INGESTA, registrar_cambio
+
+DIA = date(2025, 3, 3)
+OTRO_DIA = date(2025, 3, 10)
+
+def consultar(cache: ResponseCache, dia: date, calculos: list, durante=None):
+    """Pide el reporte de un día; cada cálculo se anota en calculos y puede ejecutar `durante`"""
+    async def calcular():
+        calculos.append(dia)
+        if durante:
+            durante()
+        return {'fecha': dia.isoformat(), 'calculo': len(calculos)}
+
+    return asyncio.run(cache.obtener_o_calcular('reports/diario', {'fecha': dia}, [(dia, dia)], calcular))
+
+def test_no_guarda_un_calculo_invalidado_mientras_corria():
+    cache = ResponseCache(BackendMemoria(16), ttl=300)
+    calculos = []
+    # La carga confirma e invalida el día mientras el reporte se está calculando
+    consultar(cache, DIA, calculos, durante=lambda: cache.invalidar_dias([DIA]))
+    consultar(cache, DIA, calculos)
+    consultar(cache, DIA, calculos)
+    assert calculos == [DIA, DIA]
+
+def test_invalida_con_cargas_registradas_por_otro_proceso(engine):
+    cache = ResponseCache(BackendMemoria(16), ttl=300, engine=engine, intervalo_sincronizacion=0)
+    calculos = []
+    consultar(cache, DIA, calculos)
+    consultar(cache, OTRO_DIA, calculos)
+
+    # Una carga desde la CLI: no toca esta instancia de la caché, solo cambios_datos
+    registrar_cambio(engine, INGESTA, [DIA])
+    consultar(cache, DIA, calculos)
+    consultar(cache, OTRO_DIA, calculos)
+    assert calculos == [DIA, OTRO_DIA, DIA]
+
+def test_sin_cambios_registrados_sirve_desde_la_cache(engine):
+    registrar_cambio(engine, INGESTA, [DIA])
+    cache = ResponseCache(BackendMemoria(16), ttl=300, engine=engine, intervalo_sincronizacion=0)
+    calculos = []
+    consultar(cache, DIA, calculos)
+    consultar(cache, DIA, calculos)
+    assert calculos == [DIA]
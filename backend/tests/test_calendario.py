@@ -0,0 +1,133 @@
+from datetime import date, datetime
+
+import pytest
+
+from app.config import settings
+from app.services.calendario import (
+    FESTIVO, FIN_DE_SEMANA, LABORAL, NO_DEFINIDO, dia_calendario, domingo_de_pascua, festivos, tipo_dia,
+)
+
+@pytest.fixture(autouse=True)
+def limpiar_festivos():
+    festivos.cache_clear()
+    yield
+    festivos.cache_clear()
+
+@pytest.mark.parametrize('anio, pascua', [
+    (2019, date(2019, 4, 21)),
+    (2022, date(2022, 4, 17)),
+    (2024, date(2024, 3, 31)),
+    (2025, date(2025, 4, 20)),
+    (2038, date(2038, 4, 25)),
+    (2285, date(2285, 3, 22)),
+])
+def test_domingo_de_pascua(anio, pascua):
+    assert domingo_de_pascua(anio) == pascua
+
+# Días de descanso decretados, con el traslado de la LOSEP ya aplicado
+@pytest.mark.parametrize('anio, esperados', [
+    (2022, {
+        date(2022, 2, 28): 'Carnaval',
+        date(2022, 3, 1): 'Carnaval',
+        date(2022, 4, 15): 'Viernes Santo',
+        date(2022, 5, 2): 'Día del Trabajo',                   # domingo -> lunes
+        date(2022, 5, 23): 'Batalla de Pichincha',             # martes -> lunes anterior
+        date(2022, 7, 25): 'Fundación de Guayaquil',
+        date(2022, 8, 12): 'Primer Grito de Independencia',    # miércoles -> viernes
+        date(2022, 10, 10): 'Independencia de Guayaquil',      # domingo -> lunes
+        date(2022, 11, 3): 'Día de los Difuntos',              # miércoles y jueves -> jueves y viernes
+        date(2022, 11, 4): 'Independencia de Cuenca',
+        date(2022, 12, 26): 'Navidad',                         # domingo -> lunes
+    }),
+    (2023, {
+        date(2023, 1, 2): 'Año Nuevo',                         # domingo -> lunes
+        date(2023, 2, 20): 'Carnaval',
+        date(2023, 2, 21): 'Carnaval',
+        date(2023, 4, 7): 'Viernes Santo',
+        date(2023, 5, 1): 'Día del Trabajo',
+        date(2023, 5, 26): 'Batalla de Pichincha',             # miércoles -> viernes
+        date(2023, 7, 24): 'Fundación de Guayaquil',           # martes -> lunes anterior
+        date(2023, 8, 11): 'Primer Grito de Independencia',    # jueves -> viernes
+        date(2023, 10, 9): 'Independencia de Guayaquil',
+        date(2023, 11, 2): 'Día de los Difuntos',              # jueves y viernes, sin traslado
+        date(2023, 11, 3): 'Independencia de Cuenca',
+        date(2023, 12, 25): 'Navidad',
+    }),
+    (2024, {
+        date(2024, 1, 1): 'Año Nuevo',
+        date(2024, 2, 12): 'Carnaval',
+        date(2024, 2, 13): 'Carnaval',
+        date(2024, 3, 29): 'Viernes Santo',
+        date(2024, 5, 3): 'Día del Trabajo',                   # miércoles -> viernes
+        date(2024, 5, 24): 'Batalla de Pichincha',
+        date(2024, 7, 26): 'Fundación de Guayaquil',           # jueves -> viernes
+        date(2024, 8, 9): 'Primer Grito de Independencia',     # sábado -> viernes anterior
+        date(2024, 10, 11): 'Independencia de Guayaquil',      # miércoles -> viernes
+        date(2024, 11, 1): 'Día de los Difuntos',              # sábado y domingo -> viernes y lunes
+        date(2024, 11, 4): 'Independencia de Cuenca',
+        date(2024, 12, 25): 'Navidad',                         # miércoles, solo se traslada en fin de semana
+    }),
+    (2025, {
+        date(2025, 1, 1): 'Año Nuevo',
+        date(2025, 3, 3): 'Carnaval',
+        date(2025, 3, 4): 'Carnaval',
+        date(2025, 4, 18): 'Viernes Santo',
+        date(2025, 5, 2): 'Día del Trabajo',                   # jueves -> viernes
+        date(2025, 5, 23): 'Batalla de Pichincha',             # sábado -> viernes anterior
+        date(2025, 7, 25): 'Fundación de Guayaquil',
+        date(2025, 8, 11): 'Primer Grito de Independencia',    # domingo -> lunes
+        date(2025, 10, 10): 'Independencia de Guayaquil',      # jueves -> viernes
+        date(2025, 11, 3): 'Día de los Difuntos',              # domingo y lunes -> lunes y martes
+        date(2025, 11, 4): 'Independencia de Cuenca',
+        date(2025, 12, 25): 'Navidad',
+    }),
+])
+def test_festivos_trasladados(anio, esperados):
+    assert festivos(anio) == esperados
+
+def test_anio_nuevo_en_sabado_se_descansa_el_anio_anterior():
+    # 1 de enero de 2022 fue sábado: se descansó el viernes 31 de diciembre de 2021
+    assert festivos(2021)[date(2021, 12, 31)] == 'Año Nuevo'
+    assert festivos(2021)[date(2021, 12, 24)] == 'Navidad'
+    assert not any(dia.month == 1 and dia.day <= 3 for dia in festivos(2022))
+
+def test_festivos_sin_traslado(monkeypatch):
+    monkeypatch.setattr(settings, 'FESTIVOS_TRASLADO', False)
+    dias = festivos(2024)
+    assert {date(2024, 5, 1), date(2024, 8, 10), date(2024, 10, 9), date(2024, 11, 2), date(2024, 11, 3)} <= set(dias)
+    assert not {date(2024, 5, 3), date(2024, 8, 9), date(2024, 10, 11), date(2024, 11, 1), date(2024, 11, 4)} & set(dias)
+
+def test_festivos_adicionales_agregan_y_anulan(monkeypatch):
+    monkeypatch.setattr(settings, 'FESTIVOS_ADICIONALES', {
+        '2024-04-05': 'Feriado por decreto',
+        '2024-05-03': None,
+        '2025-04-04': 'Otro año',
+    })
+    dias = festivos(2024)
+    assert dias[date(2024, 4, 5)] == 'Feriado por decreto'
+    assert date(2024, 5, 3) not in dias
+    assert date(2025, 4, 4) not in dias
+
+@pytest.mark.parametrize('fecha, esperado', [
+    (date(2024, 5, 1), LABORAL),                     # el feriado se trasladó al viernes
+    (date(2024, 5, 3), FESTIVO),
+    (date(2024, 5, 4), FIN_DE_SEMANA),
+    (date(2024, 8, 10), FIN_DE_SEMANA),              # sábado; se descansó el viernes 9
+    (date(2024, 8, 9), FESTIVO),
+    (date(2024, 11, 2), FIN_DE_SEMANA),
+    (date(2024, 11, 4), FESTIVO),
+    (date(2024, 2, 12), FESTIVO),
+    (date(2024, 3, 28), LABORAL),                    # Jueves Santo
+    (datetime(2024, 10, 11, 17, 45), FESTIVO),
+    (None, NO_DEFINIDO),
+])
+def test_tipo_dia(fecha, esperado):
+    assert tipo_dia(fecha) == esperado
+
+def test_dia_calendario_de_un_festivo_trasladado():
+    fila = dia_calendario(date(2024, 11, 1))
+    assert fila['tipo_dia'] == FESTIVO
+    assert fila['festivo'] == 'Día de los Difuntos'
+    assert fila['laborable'] is False
+    assert fila['inicio_semana'] == date(2024, 10, 28)
+    assert fila['trimestre'] == 4
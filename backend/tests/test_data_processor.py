@@ -0,0 +1,74 @@
+import math
+from datetime import time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.data_processor import DataProcessor
+from app.services.excel_parser import ExcelParser
+from benchmarks.datos_sinteticos import GeneradorSintetico
+
+def _normalizar(valor):
+    """None, NaN y NaT cuentan como el mismo vacío; Timestamp y datetime se comparan como datetime"""
+    if valor is None or valor is pd.NaT or (isinstance(valor, float) and math.isnan(valor)):
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    return valor
+
+def _fila_por_fila(df: pd.DataFrame):
+    processor = DataProcessor()
+    return [
+        {clave: _normalizar(valor) for clave, valor in processor.procesar_fila(registro).items()}
+        for registro in df.to_dict('records')
+    ]
+
+def _por_columnas(df: pd.DataFrame):
+    return [
+        {clave: _normalizar(valor) for clave, valor in registro.items()}
+        for registro in DataProcessor().procesar_dataframe(df.copy()).to_dict('records')
+    ]
+
+def test_procesar_dataframe_equivale_a_procesar_fila_en_datos_sinteticos():
+    # 15 % de horas en formatos sucios: hh:mm, h:mm, datetime de Excel, timedelta y vacías
+    df = ExcelParser().mapear_columnas(GeneradorSintetico(2000, dias=30).dataframe())
+    assert _por_columnas(df) == _fila_por_fila(df)
+
+def test_procesar_dataframe_equivale_a_procesar_fila_leyendo_el_excel(tmp_path):
+    ruta = GeneradorSintetico(400, dias=10).escribir_excel(str(tmp_path / 'sintetico.xlsx'))
+    parser = ExcelParser()
+    for hoja in parser.listar_hojas(ruta)[:2]:
+        df = parser.mapear_columnas(pd.read_excel(ruta, sheet_name=hoja))
+        assert _por_columnas(df) == _fila_por_fila(df)
+
+@pytest.mark.parametrize('columna, valores', [
+    # Horas como float de pandas (columna con vacíos) y como duración
+    ('hora_programada', [7.5, np.nan, 23.99, 0.0]),
+    ('hora_programada', [timedelta(hours=7, minutes=5), None, timedelta(hours=25), timedelta(0)]),
+    ('hora_programada', pd.to_datetime(['1899-12-30 07:30:00', None, '1899-12-30 18:45:10', '1899-12-30 00:00:00'])),
+    ('hora_programada', ['07:30', '7:05:00', 'sin hora', '']),
+    ('hora_real', [time(7, 34), '23:59:59', np.nan, time(0, 0, 1)]),
+    # Fechas como texto, inválidas y faltantes
+    ('fecha', ['2025-01-06', '2025-01-06 08:00:00', '06/01/2025', None]),
+    ('fecha', pd.to_datetime(['2024-05-03', None, '2024-05-04', '2024-05-01'])),
+    # Códigos float cuando la columna tiene vacíos
+    ('bus', [1234.0, np.nan, 1235.0, 1234.0]),
+    ('codigo_de_conductor', [' C0306 ', 305, None, '']),
+    ('operador', ['lmera@consorciostg.com.ec', None, 'desconocido@x.com', np.nan]),
+])
+def test_procesar_dataframe_equivale_a_procesar_fila_con_valores_sucios(columna, valores):
+    base = pd.DataFrame({
+        'fecha': pd.to_datetime(['2025-01-06'] * 4),
+        'bus': ['1234'] * 4,
+        'hora_programada': [time(7, 30)] * 4,
+        'hora_real': [time(7, 34)] * 4,
+        'operador': ['lmera@consorciostg.com.ec'] * 4,
+        'codigo_de_conductor': ['C0305'] * 4,
+    })
+    base[columna] = valores
+    assert _por_columnas(base) == _fila_por_fila(base)
+
+def test_procesar_dataframe_equivale_a_procesar_fila_sin_columnas_opcionales():
+    df = pd.DataFrame({'fecha': pd.to_datetime(['2025-01-06', '2025-01-11']), 'bus': ['1234', '1235']})
+    assert _por_columnas(df) == _fila_por_fila(df)
@@ -0,0 +1,58 @@
+from datetime import datetime, time
+
+import pytest
+from openpyxl import Workbook
+
+from app.services.data_processor import calcular_huella, valor_canonico
+from app.services.excel_parser import MAPEO_COLUMNAS, ExcelParser
+
+@pytest.fixture
+def hoja_con_vacios(tmp_path):
+    """Hoja con un Bus vacío: pd.read_excel lee la columna como float, openpyxl como int"""
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(list(MAPEO_COLUMNAS))
+    base = {
+        'Fecha': datetime(2025, 3, 3), 'Troncal': 'T1', 'Código de Ruta': 'T1-R1', 'Ruta': 'Ruta T1-R1',
+        'Hora programada': time(7, 30), 'Hora real': time(7, 34), 'Ciclo': 3, 'Hora de incidencia': time(7, 31),
+        'Parada': 'Parada 4', 'Incidencia primaria': 'Retraso en salida', 'Conductor': 'Juan Pérez',
+        'Operador': 'lmera@consorciostg.com.ec',
+    }
+    filas = [
+        {**base, 'Bus': 1234, 'Bus de cambio': 1500, 'Código de conductor': 305},
+        {**base, 'Bus': None, 'Bus de cambio': None, 'Código de conductor': ' C0306 '},
+        {**base, 'Bus': 1235, 'Bus de cambio': None, 'Código de conductor': 'C0307'},
+    ]
+    for fila in filas:
+        hoja.append([fila.get(encabezado) for encabezado in MAPEO_COLUMNAS])
+    ruta = tmp_path / 'vacios.xlsx'
+    libro.save(ruta)
+    return str(ruta)
+
+def test_misma_hoja_misma_huella_por_ambas_rutas(hoja_con_vacios):
+    parser = ExcelParser()
+    por_pandas = parser.parse_excel(hoja_con_vacios)
+    por_openpyxl = [fila for lote in parser.iterar_lotes(hoja_con_vacios, 10) for fila in lote]
+
+    assert len(por_pandas) == len(por_openpyxl) == 3
+    for fila_pandas, fila_openpyxl in zip(por_pandas, por_openpyxl):
+        assert calcular_huella(fila_pandas) == calcular_huella(fila_openpyxl)
+        for campo in ('bus', 'bus_de_cambio', 'codigo_de_conductor'):
+            assert fila_pandas[campo] == fila_openpyxl[campo]
+    assert [fila['bus'] for fila in por_pandas] == ['1234', None, '1235']
+    assert [fila['codigo_de_conductor'] for fila in por_pandas] == ['305', 'C0306', 'C0307']
+
+def test_huella_de_filas_cargadas_antes_de_la_forma_canonica():
+    # Filas guardadas por cargas anteriores (Bus '1234.0') coinciden con las nuevas
+    nueva = {'fecha': datetime(2025, 3, 3), 'bus': '1234', 'hora_programada': '07:30:00',
+             'incidencia_primaria': 'Retraso en salida', 'codigo_de_conductor': 'C0305'}
+    anterior = {**nueva, 'bus': '1234.0', 'incidencia_primaria': 'Retraso en salida '}
+    assert calcular_huella(anterior) == calcular_huella(nueva)
+    assert calcular_huella({**nueva, 'bus': 1234.0}) == calcular_huella(nueva)
+
+@pytest.mark.parametrize('valor, esperado', [
+    (1234, '1234'), (1234.0, '1234'), (1234.5, '1234.5'), ('1234.0', '1234'), (' C01 ', 'C01'),
+    ('', None), (None, None), (float('nan'), None),
+])
+def test_valor_canonico(valor, esperado):
+    assert valor_canonico(valor) == esperado
@@ -0,0 +1,93 @@
+import time
+
+import pytest
+
+from app.config import settings
+from app.services.bulk_inserter import BulkInserter
+from app.services.ingestion_jobs import COMPLETADO, ERROR, ArchivoIngesta, IngestionJobManager
+from benchmarks.datos_sinteticos import GeneradorSintetico
+
+def esperar_estado(manager: IngestionJobManager, job_id: str, segundos: float = 60):
+    """Estado final del trabajo; falla si sigue en cola o procesando pasado el plazo"""
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        job = manager.obtener(job_id)
+        if job['estado'] not in ('en_cola', 'procesando'):
+            return job
+        time.sleep(0.1)
+    pytest.fail(f"La ingesta {job_id} no terminó en {segundos} s")
+
+@pytest.fixture
+def libro(tmp_path):
+    """Libro de 7 hojas (una por troncal) con varios lotes por hoja"""
+    return GeneradorSintetico(2000).escribir_excel(str(tmp_path / 'incidencias.xlsx'))
+
+@pytest.fixture
+def manager(engine, monkeypatch):
+    # Lotes chicos y colas de un lote: los parsers quedan bloqueados en put si nadie consume
+    monkeypatch.setattr(settings, 'INSERT_CHUNK_SIZE', 50)
+    monkeypatch.setattr(settings, 'INGESTA_LOTES_EN_COLA', 1)
+    # Un solo proceso: una hoja que quede colgada bloquea todas las cargas siguientes
+    manager = IngestionJobManager(engine, procesos=1)
+    yield manager
+    manager.cerrar()
+
+def test_falla_del_escritor_libera_el_pool(manager, libro, monkeypatch):
+    def falla(self, bloque, inicio):
+        raise RuntimeError('fallo forzado del escritor')
+
+    with monkeypatch.context() as parche:
+        parche.setattr(BulkInserter, '_insertar_y_confirmar', falla)
+        fallido = manager.encolar_lote('fallido', [ArchivoIngesta('fallido.xlsx', libro, temporal=False)])
+        job = esperar_estado(manager, fallido.id)
+    assert job['estado'] == ERROR
+    assert 'fallo forzado del escritor' in job['errores'][0]
+
+    siguiente = manager.encolar_lote('siguiente', [ArchivoIngesta('siguiente.xlsx', libro, temporal=False)])
+    job = esperar_estado(manager, siguiente.id)
+    assert job['estado'] == COMPLETADO
+    assert job['filas_procesadas'] == 2000
+
+def test_falla_del_escritor_con_varios_archivos(manager, libro, tmp_path, monkeypatch):
+    otro = GeneradorSintetico(2000, semilla=7).escribir_excel(str(tmp_path / 'otro.xlsx'))
+    llamadas = []
+
+    def falla_al_tercer_bloque(self, bloque, inicio, original=BulkInserter._insertar_y_confirmar):
+        llamadas.append(len(bloque))
+        if len(llamadas) == 3:
+            raise RuntimeError('fallo forzado del escritor')
+        return original(self, bloque, inicio)
+
+    with monkeypatch.context() as parche:
+        parche.setattr(BulkInserter, '_insertar_y_confirmar', falla_al_tercer_bloque)
+        lote = manager.encolar_lote('lote', [
+            ArchivoIngesta('a.xlsx', libro, temporal=False), ArchivoIngesta('b.xlsx', otro, temporal=False),
+        ])
+        assert esperar_estado(manager, lote.id)['estado'] == ERROR
+
+    siguiente = manager.encolar_lote('siguiente', [ArchivoIngesta('b.xlsx', otro, temporal=False)])
+    assert esperar_estado(manager, siguiente.id)['estado'] == COMPLETADO
+
+def test_trabajos_terminados_se_olvidan(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'INGESTA_JOBS_MAXIMO', 1)
+    libros = [
+        GeneradorSintetico(60, semilla=semilla).escribir_excel(str(tmp_path / f'libro_{semilla}.xlsx'))
+        for semilla in (1, 2, 3)
+    ]
+    ids = []
+    for numero, ruta in enumerate(libros):
+        job = manager.encolar_lote(f'libro_{numero}', [ArchivoIngesta(f'libro_{numero}.xlsx', ruta, temporal=False)])
+        assert manager.esperar(job.id)['estado'] == COMPLETADO
+        ids.append(job.id)
+        # El futuro se suelta al terminar; el estado sigue disponible
+        assert job.id not in manager._futuros
+
+    # Al encolar el tercero se podó el primero (máximo 1 terminado además del nuevo)
+    assert manager.obtener(ids[0]) is None
+    assert manager.obtener(ids[1])['estado'] == COMPLETADO
+    assert manager.obtener(ids[2])['estado'] == COMPLETADO
+
+    monkeypatch.setattr(settings, 'INGESTA_JOBS_RETENCION_SEGUNDOS', 0)
+    ultimo = manager.encolar_lote('repetido', [ArchivoIngesta('libro_0.xlsx', libros[0], temporal=False)])
+    manager.esperar(ultimo.id)
+    assert set(manager.jobs) == {ultimo.id}
@@ -0,0 +1,101 @@
+import gzip
+import json
+
+import pytest
+
+def test_exportacion_sin_gzip_para_clientes_que_no_lo_anuncian(cliente):
+    respuesta = cliente.get('/api/v1/queries/incidencias/export', headers={'Accept-Encoding': 'identity'})
+    assert respuesta.status_code == 200
+    assert 'content-encoding' not in respuesta.headers
+    assert len([json.loads(linea) for linea in respuesta.text.splitlines()]) == 50
+
+def test_exportacion_con_gzip_negociado(cliente):
+    with cliente.stream(
+        'GET', '/api/v1/queries/incidencias/export', headers={'Accept-Encoding': 'gzip, deflate'}
+    ) as respuesta:
+        assert respuesta.headers['content-encoding'] == 'gzip'
+        crudo = b''.join(respuesta.iter_raw())
+    assert len(gzip.decompress(crudo).decode('utf-8').splitlines()) == 50
+
+@pytest.mark.parametrize('accept_encoding, comprimido', [
+    ('gzip;q=0, identity', False), ('*', True), ('br, GZIP;q=0.5', True), ('', False),
+])
+def test_negociacion_accept_encoding(cliente, accept_encoding, comprimido):
+    respuesta = cliente.get(
+        '/api/v1/queries/incidencias/export?formato=csv', headers={'Accept-Encoding': accept_encoding}
+    )
+    assert ('content-encoding' in respuesta.headers) == comprimido
+
+@pytest.mark.parametrize('fecha', ['2024-13-01', '2024-02-30', 'ayer'])
+def test_estadisticas_diarias_con_fecha_invalida(cliente, fecha):
+    respuesta = cliente.get(f'/api/v1/queries/estadisticas/diarias?fecha={fecha}')
+    assert respuesta.status_code == 400
+    assert respuesta.json()['detail'] == 'Formato de fecha inválido. Use YYYY-MM-DD'
+
+def test_estadisticas_diarias(cliente):
+    respuesta = cliente.get('/api/v1/queries/estadisticas/diarias?fecha=2025-01-02')
+    assert respuesta.status_code == 200
+    assert respuesta.json()['fecha'] == '2025-01-02'
+
+@pytest.mark.parametrize('anio', [0, 9999, -5])
+def test_tendencias_mensuales_con_anio_fuera_de_rango(cliente, anio):
+    assert cliente.get(f'/api/v1/queries/tendencias/mensuales?año={anio}').status_code == 422
+
+def test_tendencias_mensuales(cliente):
+    respuesta = cliente.get('/api/v1/queries/tendencias/mensuales?año=2025')
+    assert respuesta.status_code == 200
+    assert sum(tendencia['total'] for tendencia in respuesta.json()['tendencias']) == 50
+
+def _recorrer(cliente, **parametros):
+    """Páginas de /incidencias siguiendo siguiente_cursor hasta el final"""
+    paginas, cursor = [], None
+    while True:
+        respuesta = cliente.get('/api/v1/queries/incidencias', params={**parametros, **({'cursor': cursor} if cursor else {})})
+        assert respuesta.status_code == 200
+        pagina = respuesta.json()
+        paginas.append(pagina['incidencias'])
+        cursor = pagina['siguiente_cursor']
+        if cursor is None:
+            return paginas
+
+@pytest.mark.parametrize('limite', [1, 7, 50])
+def test_paginacion_por_cursor_sin_huecos_ni_repetidas(cliente, limite):
+    todas = cliente.get('/api/v1/queries/incidencias?limite=1000').json()['incidencias']
+    paginas = _recorrer(cliente, limite=limite)
+    recorridas = [fila for pagina in paginas for fila in pagina]
+
+    assert len(todas) == 50
+    assert [fila['id'] for fila in recorridas] == [fila['id'] for fila in todas]
+    assert sorted(recorridas, key=lambda fila: (fila['fecha'], fila['id'])) == recorridas
+    if limite < 50:
+        # Las fechas son a medianoche: los cortes de página caen entre filas con la misma fecha
+        assert any(anterior[-1]['fecha'] == siguiente[0]['fecha'] for anterior, siguiente in zip(paginas, paginas[1:]))
+
+def test_paginacion_con_filtros_coincide_con_el_total(cliente):
+    recorridas = [fila for pagina in _recorrer(cliente, troncal='T1', limite=3) for fila in pagina]
+    assert {fila['troncal'] for fila in recorridas} == {'T1'}
+    assert len({fila['id'] for fila in recorridas}) == len(recorridas)
+
+    total = cliente.get('/api/v1/queries/incidencias/total?troncal=T1').json()['total']
+    assert total == len(recorridas)
+    con_total = cliente.get('/api/v1/queries/incidencias?troncal=T1&limite=1&incluir_total=true').json()
+    assert con_total['total'] == total
+    assert cliente.get('/api/v1/queries/incidencias/total').json()['total'] == 50
+
+def test_proyeccion_fields(cliente):
+    incidencias = cliente.get('/api/v1/queries/incidencias?fields=id,bus,turno&limite=5').json()['incidencias']
+    assert len(incidencias) == 5
+    assert all(set(fila) == {'id', 'bus', 'turno'} for fila in incidencias)
+    # turno se lee de su catálogo: llega el nombre, no el id
+    assert {fila['turno'] for fila in incidencias} <= {'Mañana', 'Tarde', 'Noche', 'No definido'}
+
+def test_proyeccion_con_campo_desconocido(cliente):
+    respuesta = cliente.get('/api/v1/queries/incidencias?fields=id,nope,texto_busqueda')
+    assert respuesta.status_code == 400
+    assert respuesta.json()['detail'] == 'Campos desconocidos: nope, texto_busqueda'
+
+@pytest.mark.parametrize('cursor', ['no-es-un-cursor', 'MjAyNS0wMS0wMQ', 'bm8tZmVjaGF8MTI='])
+def test_cursor_invalido(cliente, cursor):
+    respuesta = cliente.get(f'/api/v1/queries/incidencias?cursor={cursor}')
+    assert respuesta.status_code == 400
+    assert respuesta.json()['detail'] == 'Cursor inválido'
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.services.cache import cache_respuestas
+from app.services.report_generator import ReportGenerator
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/reports/diario?fecha=2024-13-01',
+    '/api/v1/reports/comparativo?fecha1=2024-13-01&fecha2=2024-01-01',
+    '/api/v1/reports/comparativo?fecha1=2024-01-01&fecha2=2024-02-30',
+    '/api/v1/reports/pivot?dimensiones=troncal&fecha_inicio=2024-13-01',
+    '/api/v1/reports/retrasos?fecha_fin=ayer',
+    '/api/v1/reports/exportar?reportes=diario&fecha=2024-02-30',
+    '/api/v1/reports/exportar?reportes=tendencia&fecha_fin=31-12-2024',
+])
+def test_reportes_con_fecha_invalida(cliente, url):
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 400
+    assert respuesta.json()['detail'] == 'Formato de fecha inválido. Use YYYY-MM-DD'
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/reports/tendencia/semanal?fecha_fin=2024-13-01',
+    '/api/v1/reports/tendencia?fecha_fin=ayer',
+])
+def test_tendencias_con_fecha_invalida(cliente, url):
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 400
+    assert respuesta.json()['detail'] == 'Formato de fecha inválido. Use YYYY-MM-DD'
+
+def test_tendencia_con_granularidad_no_soportada(cliente):
+    respuesta = cliente.get('/api/v1/reports/tendencia?fecha_fin=2025-01-05&granularidad=hora')
+    assert respuesta.status_code == 400
+
+@pytest.mark.parametrize('url, periodos', [
+    ('/api/v1/reports/tendencia?fecha_fin=0001-01-05&dias=30', 5),
+    ('/api/v1/reports/tendencia?fecha_fin=0001-01-05&dias=90&granularidad=mes', 1),
+    ('/api/v1/reports/tendencia/semanal?fecha_fin=0001-01-03', 3),
+])
+def test_tendencia_al_inicio_del_calendario(cliente, url, periodos):
+    respuesta = cliente.get(url)
+    assert respuesta.status_code == 200
+    tendencia = respuesta.json()['tendencia']
+    assert len(tendencia) == periodos
+    assert tendencia[-1]['fecha'] == '0001-01-01'
+
+@pytest.mark.parametrize('url, metodo', [
+    ('/api/v1/reports/diario?fecha=2025-01-02', 'generar_reporte_diario'),
+    ('/api/v1/reports/comparativo?fecha1=2025-01-02&fecha2=2025-01-03', 'generar_reporte_comparativo'),
+    ('/api/v1/reports/tendencia?fecha_fin=2025-01-05', 'generar_tendencia'),
+])
+def test_reportes_se_calculan_fuera_del_event_loop(cliente, monkeypatch, url, metodo):
+    original = getattr(ReportGenerator, metodo)
+    hilos_con_loop = []
+
+    def espiar(self, *argumentos, **opciones):
+        try:
+            asyncio.get_running_loop()
+            hilos_con_loop.append(True)
+        except RuntimeError:
+            hilos_con_loop.append(False)
+        return original(self, *argumentos, **opciones)
+
+    monkeypatch.setattr(ReportGenerator, metodo, espiar)
+    cache_respuestas.limpiar()
+    assert cliente.get(url).status_code == 200
+    assert hilos_con_loop == [False]
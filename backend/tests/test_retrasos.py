@@ -0,0 +1,102 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import select
+
+from app.models.database import IncidenciaOperativa, db
+from app.services.analitica import AlmacenAnalitico
+from app.services.bulk_inserter import BulkInserter
+from app.services.data_processor import DataProcessor, calcular_retraso
+
+CASOS_RETRASO = [
+    ('07:30:00', '07:34:00', 240),
+    ('07:30:00', '07:25:30', -270),        # adelanto
+    ('23:55:00', '00:05:00', 600),         # cruza medianoche hacia adelante
+    ('00:05:00', '23:55:00', -600),        # adelanto que cruza medianoche hacia atrás
+    ('12:00:00', '00:00:00', -43200),      # medio día exacto: no se corrige
+    ('00:00:00', '12:00:00', 43200),
+    ('00:00:00', '12:00:01', -43199),
+    ('07:30', '07:31', 60),
+    (time(23, 50), time(0, 10), 1200),
+    (timedelta(hours=6), '06:00:30', 30),
+    (None, '07:00:00', None),
+    ('07:00:00', None, None),
+    ('sin hora', '07:00:00', None),
+    ('07:00:00', '', None),
+]
+
+@pytest.mark.parametrize('programada, real, esperado', CASOS_RETRASO)
+def test_calcular_retraso(programada, real, esperado):
+    assert calcular_retraso(programada, real) == esperado
+
+def test_retrasos_por_columnas_igual_que_por_fila():
+    df = pd.DataFrame({
+        'fecha': [datetime(2025, 3, 3)] * len(CASOS_RETRASO),
+        'hora_programada': [programada for programada, _, _ in CASOS_RETRASO],
+        'hora_real': [real for _, real, _ in CASOS_RETRASO],
+    })
+    retrasos = DataProcessor().procesar_dataframe(df)['retraso_seg'].tolist()
+    assert retrasos == [esperado for _, _, esperado in CASOS_RETRASO]
+
+# Retrasos en segundos por troncal; None = fila sin hora real (no cuenta en los percentiles)
+RETRASOS = {
+    'T1': [-120, 0, 30, 60, 600, 1800, 45, None],
+    'T2': [10, 20],
+    'T3': [-300],
+}
+
+def _percentiles_numpy(valores):
+    return dict(zip(('p50', 'p90', 'p99'), np.percentile(valores, [50, 90, 99], method='linear').round(2)))
+
+@pytest.fixture
+def engine_retrasos(engine):
+    processor = DataProcessor()
+    programada = datetime(2025, 3, 3, 8, 0)
+    filas = [
+        processor.procesar_fila({
+            'fecha': datetime(2025, 3, 3), 'troncal': troncal, 'bus': f'{troncal}-{numero}',
+            'hora_programada': programada.strftime('%H:%M:%S'),
+            'hora_real': None if retraso is None else (programada + timedelta(seconds=retraso)).strftime('%H:%M:%S'),
+        })
+        for troncal, retrasos in RETRASOS.items()
+        for numero, retraso in enumerate(retrasos)
+    ]
+    BulkInserter(engine).insertar(filas)
+    return engine
+
+def test_percentiles_como_numpy_lineal(engine_retrasos):
+    resultado = AlmacenAnalitico(engine_retrasos).percentiles(['troncal'])
+
+    assert resultado['total'] == sum(retraso is not None for retrasos in RETRASOS.values() for retraso in retrasos)
+    por_troncal = {fila['troncal']: fila for fila in resultado['filas']}
+    for troncal, retrasos in RETRASOS.items():
+        valores = [retraso for retraso in retrasos if retraso is not None]
+        fila = por_troncal[troncal]
+        assert fila['n'] == len(valores)
+        assert fila['promedio'] == round(np.mean(valores), 2)
+        assert {clave: fila[clave] for clave in ('p50', 'p90', 'p99')} == _percentiles_numpy(valores)
+    # Ordenados por p99, de mayor a menor
+    assert [fila['troncal'] for fila in resultado['filas']] == ['T1', 'T2', 'T3']
+
+def test_endpoint_retrasos(cliente):
+    por_troncal = defaultdict(list)
+    with db.engine.connect() as conexion:
+        for troncal, retraso in conexion.execute(
+            select(IncidenciaOperativa.troncal, IncidenciaOperativa.retraso_seg)
+            .where(IncidenciaOperativa.retraso_seg.isnot(None))
+        ):
+            por_troncal[troncal].append(retraso)
+
+    respuesta = cliente.get('/api/v1/reports/retrasos?agrupar=troncal')
+    assert respuesta.status_code == 200
+    filas = respuesta.json()['filas']
+    assert {fila['troncal'] for fila in filas} == set(por_troncal)
+    for fila in filas:
+        esperado = _percentiles_numpy(por_troncal[fila['troncal']])
+        assert {clave: fila[clave] for clave in esperado} == pytest.approx(esperado)
+
+def test_endpoint_retrasos_con_agrupacion_no_soportada(cliente):
+    assert cliente.get('/api/v1/reports/retrasos?agrupar=color').status_code == 400
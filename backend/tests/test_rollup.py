@@ -0,0 +1,101 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+from sqlalchemy import func, select, update
+
+from app.models.database import IncidenciaOperativa, ResumenDiario
+from app.services.bulk_inserter import BulkInserter
+from app.services.data_processor import DataProcessor
+from app.services.excel_parser import ExcelParser
+from app.services.ingestion_jobs import COMPLETADO, ArchivoIngesta, IngestionJobManager
+from app.services.rollup import RollupService
+from benchmarks.datos_sinteticos import GeneradorSintetico
+
+def _total_rollup(engine, desde=None, hasta=None):
+    consulta = select(func.coalesce(func.sum(ResumenDiario.total), 0))
+    if desde:
+        consulta = consulta.where(ResumenDiario.fecha >= desde)
+    if hasta:
+        consulta = consulta.where(ResumenDiario.fecha <= hasta)
+    with engine.connect() as conexion:
+        return conexion.execute(consulta).scalar()
+
+def _total_filas(engine):
+    with engine.connect() as conexion:
+        return conexion.execute(select(func.count()).select_from(IncidenciaOperativa)).scalar()
+
+@pytest.fixture
+def manager(engine):
+    manager = IngestionJobManager(engine, procesos=1)
+    yield manager
+    manager.cerrar()
+
+def test_rollup_consistente_tras_cargas_superpuestas(manager, engine, tmp_path):
+    generador = GeneradorSintetico(600, dias=10)
+    primero = generador.dataframe(600, semilla=1)
+    nuevas = generador.dataframe(300, semilla=2)
+    # 20 filas nuevas con operador inválido: van a cuarentena, no al rollup
+    nuevas.loc[nuevas.index[:20], 'Operador'] = 'sin-correo'
+    # El segundo archivo repite 250 filas del primero (mismas huellas)
+    segundo = pd.concat([primero.iloc[:250], nuevas], ignore_index=True)
+
+    archivos = []
+    for nombre, df in (('a.xlsx', primero), ('b.xlsx', segundo)):
+        ruta = str(tmp_path / nombre)
+        df.to_excel(ruta, sheet_name='T1', index=False)
+        archivos.append(ArchivoIngesta(nombre, ruta, temporal=False))
+
+    estados = [manager.esperar(manager.encolar_lote(archivo.nombre, [archivo]).id) for archivo in archivos]
+    assert [estado['estado'] for estado in estados] == [COMPLETADO, COMPLETADO]
+    assert estados[1]['filas_duplicadas'] >= 250
+    assert estados[1]['filas_rechazadas'] == 20
+
+    verificacion = RollupService(engine).verificar_consistencia()
+    assert verificacion['consistente'], verificacion['diferencias']
+    assert verificacion['total_rollup'] == verificacion['total_crudo'] == _total_filas(engine)
+    assert _total_filas(engine) == sum(estado['filas_procesadas'] for estado in estados)
+
+def test_reconstruir_un_subrango(engine):
+    GeneradorSintetico(500, dias=10).poblar_base(engine)
+    rollup = RollupService(engine)
+    desde, hasta = date(2025, 1, 3), date(2025, 1, 5)
+    antes_del_rango = _total_rollup(engine, hasta=date(2025, 1, 2))
+
+    # Totales corruptos dentro y fuera del rango
+    with engine.begin() as conexion:
+        conexion.execute(update(ResumenDiario.__table__).values(total=ResumenDiario.total + 1000))
+
+    rollup.reconstruir(desde, hasta)
+
+    assert rollup.verificar_consistencia(desde, hasta)['consistente']
+    # Fuera del rango no se tocó
+    assert not rollup.verificar_consistencia(date(2025, 1, 1), date(2025, 1, 2))['consistente']
+    assert _total_rollup(engine, hasta=date(2025, 1, 2)) > antes_del_rango
+    diferencias = rollup.verificar_consistencia()['diferencias']
+    assert diferencias and all(not desde.isoformat() <= clave['clave'][0] <= hasta.isoformat() for clave in diferencias)
+
+    rollup.reconstruir()
+    assert rollup.verificar_consistencia()['consistente']
+
+def test_acumular_cuenta_solo_filas_insertadas(engine):
+    crudas = ExcelParser().mapear_columnas(GeneradorSintetico(300, dias=5).dataframe())
+    filas = DataProcessor().procesar_dataframe(crudas).to_dict('records')
+
+    primera = BulkInserter(engine, tamano_bloque=100)
+    primera.insertar(filas[:200])
+    total = _total_rollup(engine)
+    assert total == primera.filas_insertadas == _total_filas(engine)
+
+    # Las 200 primeras ya están: solo cuentan las 100 nuevas
+    segunda = BulkInserter(engine, tamano_bloque=100)
+    segunda.insertar(filas)
+    assert segunda.filas_duplicadas >= 200
+    assert _total_rollup(engine) == total + segunda.filas_insertadas == _total_filas(engine)
+
+    # Todas repetidas: el rollup no cambia
+    tercera = BulkInserter(engine, tamano_bloque=100)
+    tercera.insertar(filas)
+    assert tercera.filas_insertadas == 0
+    assert _total_rollup(engine) == _total_filas(engine)
+    assert RollupService(engine).verificar_consistencia()['consistente']
@@ -0,0 +1,143 @@
+from datetime import datetime, time
+
+import pytest
+from openpyxl import Workbook
+from sqlalchemy import func, select
+
+from app.models.database import IncidenciaOperativa, db
+from app.services.bulk_inserter import BulkInserter
+from app.services.excel_parser import MAPEO_COLUMNAS
+from app.services.ingestion_jobs import COMPLETADO, ArchivoIngesta, IngestionJobManager
+from app.services.validacion import (
+    FECHA_INVALIDA, HORA_INVALIDA, LONGITUD_EXCEDIDA, OPERADOR_INVALIDO, CuarentenaIncidencias,
+)
+
+HASH = 'a' * 64
+BASE = {
+    'Fecha': datetime(2025, 3, 3), 'Troncal': 'T1', 'Código de Ruta': 'T1-R1', 'Ruta': 'Ruta T1-R1',
+    'Bus': '1234', 'Hora programada': time(7, 30), 'Hora real': time(7, 34), 'Ciclo': 3,
+    'Hora de incidencia': time(7, 31), 'Parada': 'Parada 4', 'Incidencia primaria': 'Retraso en salida',
+    'Código de conductor': 'C0305', 'Conductor': 'Juan Pérez', 'Operador': 'lmera@consorciostg.com.ec',
+}
+# Fila de la hoja (el encabezado es la 1) -> (cambios sobre BASE, motivos esperados)
+INVALIDAS = {
+    3: ({'Fecha': 'no es fecha'}, [FECHA_INVALIDA]),
+    4: ({'Hora programada': '25:99'}, [HORA_INVALIDA]),
+    5: ({'Operador': 'sin-correo'}, [OPERADOR_INVALIDO]),
+    6: ({'Parada': 'P' * 300}, [LONGITUD_EXCEDIDA]),
+    8: ({'Fecha': 'ayer', 'Operador': 'sin-correo'}, [FECHA_INVALIDA, OPERADOR_INVALIDO]),
+}
+
+@pytest.fixture
+def libro_con_invalidas(tmp_path):
+    """Filas 2, 7 y 9 válidas (horas distintas, para que no se descarten como duplicadas); el resto inválidas"""
+    libro = Workbook()
+    hoja = libro.active
+    hoja.title = 'T1'
+    hoja.append(list(MAPEO_COLUMNAS))
+    for numero in range(2, 10):
+        cambios, _ = INVALIDAS.get(numero, ({}, None))
+        fila = {**BASE, 'Hora programada': time(7, numero), **cambios}
+        hoja.append([fila.get(encabezado) for encabezado in MAPEO_COLUMNAS])
+    ruta = tmp_path / 'invalidas.xlsx'
+    libro.save(ruta)
+    return str(ruta)
+
+@pytest.fixture
+def manager(engine):
+    manager = IngestionJobManager(engine, procesos=1)
+    yield manager
+    manager.cerrar()
+
+@pytest.fixture
+def bloques_insertados(monkeypatch):
+    """Filas que llegan al BulkInserter"""
+    filas = []
+    original = BulkInserter._insertar_y_confirmar
+
+    def espiar(self, bloque, inicio):
+        filas.extend(bloque)
+        return original(self, bloque, inicio)
+
+    monkeypatch.setattr(BulkInserter, '_insertar_y_confirmar', espiar)
+    return filas
+
+def test_filas_invalidas_van_a_cuarentena(manager, engine, libro_con_invalidas, bloques_insertados):
+    job = manager.encolar_lote('invalidas', [ArchivoIngesta('invalidas.xlsx', libro_con_invalidas, HASH, temporal=False)])
+    estado = manager.esperar(job.id)
+
+    assert estado['estado'] == COMPLETADO
+    assert estado['filas_procesadas'] == 3
+    assert estado['filas_rechazadas'] == len(INVALIDAS)
+    assert estado['rechazos'] == {FECHA_INVALIDA: 2, HORA_INVALIDA: 1, OPERADOR_INVALIDO: 2, LONGITUD_EXCEDIDA: 1}
+
+    # Ninguna fila rechazada llega al inserter ni a la tabla
+    assert sorted(fila['hora_programada'] for fila in bloques_insertados) == ['07:02:00', '07:07:00', '07:09:00']
+    with engine.connect() as conexion:
+        assert conexion.execute(select(func.count()).select_from(IncidenciaOperativa)).scalar() == 3
+
+    rechazos = CuarentenaIncidencias(engine).listar(hash_sha256=HASH)
+    assert {rechazo['fila']: rechazo['motivos'] for rechazo in rechazos} == {
+        fila: motivos for fila, (_, motivos) in INVALIDAS.items()
+    }
+    por_fila = {rechazo['fila']: rechazo for rechazo in rechazos}
+    # Valores originales de la hoja, no los procesados
+    assert por_fila[3]['datos']['fecha'] == 'no es fecha'
+    assert por_fila[4]['datos']['hora_programada'] == '25:99'
+    assert por_fila[4]['columnas'] == ['hora_programada']
+    assert por_fila[5]['datos']['operador'] == 'sin-correo'
+    assert por_fila[6]['datos']['parada'] == 'P' * 300
+    assert por_fila[8]['columnas'] == ['fecha', 'operador']
+    assert all(rechazo['archivo'] == 'invalidas.xlsx' and rechazo['hoja'] == 'T1' for rechazo in rechazos)
+
+def test_nueva_carga_reemplaza_los_rechazos_del_archivo(manager, engine, libro_con_invalidas):
+    cuarentena = CuarentenaIncidencias(engine)
+    # Rechazos de un intento anterior del mismo archivo y de otro archivo
+    anterior = {'fila': 99, 'motivos': FECHA_INVALIDA, 'columnas': 'fecha', 'datos': '{}'}
+    cuarentena.registrar([anterior], HASH, 'invalidas.xlsx', 'T1')
+    cuarentena.registrar([anterior], 'b' * 64, 'otro.xlsx', 'T1')
+
+    job = manager.encolar_lote('invalidas', [ArchivoIngesta('invalidas.xlsx', libro_con_invalidas, HASH, temporal=False)])
+    assert manager.esperar(job.id)['estado'] == COMPLETADO
+
+    assert sorted(rechazo['fila'] for rechazo in cuarentena.listar(hash_sha256=HASH)) == sorted(INVALIDAS)
+    assert [rechazo['fila'] for rechazo in cuarentena.listar(hash_sha256='b' * 64)] == [99]
+
+def test_listar_filtra_por_motivo(engine):
+    cuarentena = CuarentenaIncidencias(engine)
+    cuarentena.registrar([
+        {'fila': 2, 'motivos': FECHA_INVALIDA, 'columnas': 'fecha', 'datos': '{}'},
+        {'fila': 3, 'motivos': f'{FECHA_INVALIDA},{OPERADOR_INVALIDO}', 'columnas': 'fecha,operador', 'datos': '{}'},
+        {'fila': 4, 'motivos': OPERADOR_INVALIDO, 'columnas': 'operador', 'datos': '{}'},
+    ], HASH, 'invalidas.xlsx', 'T1')
+
+    assert [rechazo['fila'] for rechazo in cuarentena.listar(motivo=OPERADOR_INVALIDO)] == [3, 4]
+    assert [rechazo['fila'] for rechazo in cuarentena.listar(motivo=FECHA_INVALIDA)] == [2, 3]
+    # El motivo se compara completo, no como subcadena
+    assert cuarentena.listar(motivo='fecha') == []
+    assert cuarentena.listar(motivo='%') == []
+
+    primera = cuarentena.listar(limite=2)
+    assert [rechazo['fila'] for rechazo in cuarentena.listar(despues_de=primera[-1]['id'])] == [4]
+
+def test_endpoint_rechazos(cliente):
+    hash_prueba = 'c' * 64
+    cuarentena = CuarentenaIncidencias(db.engine)
+    cuarentena.registrar([
+        {'fila': fila, 'motivos': HORA_INVALIDA, 'columnas': 'hora_real', 'datos': '{"hora_real": "99:00"}'}
+        for fila in (2, 3, 4)
+    ], hash_prueba, 'rechazos.xlsx', 'T2')
+    try:
+        respuesta = cliente.get(f'/api/v1/upload/rechazos?hash_sha256={hash_prueba}&motivo={HORA_INVALIDA}&limite=2')
+        assert respuesta.status_code == 200
+        pagina = respuesta.json()
+        assert [rechazo['fila'] for rechazo in pagina['rechazos']] == [2, 3]
+        assert pagina['rechazos'][0]['datos'] == {'hora_real': '99:00'}
+
+        siguiente = cliente.get(
+            f'/api/v1/upload/rechazos?hash_sha256={hash_prueba}&despues_de={pagina["siguiente_id"]}&limite=2'
+        ).json()
+        assert [rechazo['fila'] for rechazo in siguiente['rechazos']] == [4]
+        assert siguiente['siguiente_id'] is None
+    finally:
+        cuarentena.descartar_archivos([hash_prueba])
@@ -33,7 +33,8 @@ const Consultas: React.FC = () => {
   const handleBuscar = async () => {
     setIsLoading(true);
     try {
-      const resultado = await incidenciasAPI.getIncidencias(filtros);
+      // Primera página (la tabla muestra 50 filas) con el conteo total en la misma llamada
+      const resultado = await incidenciasAPI.getIncidencias({ ...filtros, limite: 50, incluir_total: true });
       setIncidencias(resultado.incidencias);
       setTotal(resultado.total);
     } catch (error) {
@@ -26,10 +26,40 @@ const Upload: React.FC = () => {
 
     setIsUploading(true);
     try {
-      const result = await incidenciasAPI.uploadFile(file);
+      const { job_id, estado, message } = await incidenciasAPI.uploadFile(file);
+
+      // Mismo contenido ya importado: el backend no lo vuelve a procesar
+      if (estado === 'duplicado') {
+        setUploadResult({ success: true, message: `ℹ️ ${message}` });
+        return;
+      }
+
+      // La importación corre en segundo plano: consultar su estado hasta que termine
+      let job = await incidenciasAPI.getUploadJob(job_id);
+      while (job.estado === 'en_cola' || job.estado === 'procesando') {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        job = await incidenciasAPI.getUploadJob(job_id);
+      }
+
+      if (job.estado === 'duplicado') {
+        setUploadResult({ success: true, message: `ℹ️ El archivo ${job.archivo} ya fue cargado` });
+        return;
+      }
+      if (job.estado === 'error') {
+        setUploadResult({
+          success: false,
+          message: `❌ Error: ${job.errores.join('; ')} (${job.filas_procesadas} filas importadas)`
+        });
+        return;
+      }
       setUploadResult({
         success: true,
-        message: `✅ ${result.message} - ${result.incidencias_importadas} incidencias importadas`
+        message: `✅ Se importaron ${job.filas_procesadas} incidencias correctamente (${job.filas_por_segundo} filas/s)` +
+          (job.filas_duplicadas ? `, ${job.filas_duplicadas} ya estaban cargadas` : '') +
+          (job.filas_rechazadas
+            ? `, ${job.filas_rechazadas} rechazadas por validación (${Object.entries(job.rechazos)
+                .map(([motivo, filas]) => `${motivo}: ${filas}`).join(', ')})`
+            : '')
       });
       setFile(null);
       // Reset file input
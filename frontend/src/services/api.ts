@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { AgrupacionRetraso, DimensionPivot, FiltrosConsulta, PivotResponse, RetrasosResponse } from '../types';
 
 const API_BASE_URL = 'http://localhost:8000/api/v1';
 
@@ -23,17 +24,35 @@ export const incidenciasAPI = {
     return response.data;
   },
 
+  // Estado de una importación en segundo plano
+  getUploadJob: async (jobId: string) => {
+    const response = await api.get(`/upload/jobs/${jobId}`);
+    return response.data;
+  },
+
   // Obtener incidencias con filtros
   getIncidencias: async (filtros: any) => {
     const params = new URLSearchParams();
     Object.entries(filtros).forEach(([key, value]) => {
-      if (value) params.append(key, value as string);
+      if (value) params.append(key, String(value));
     });
     
     const response = await api.get(`/queries/incidencias?${params}`);
     return response.data;
   },
 
+  // Búsqueda de texto libre, de la más a la menos relevante
+  buscarIncidencias: async (q: string, filtros: Omit<FiltrosConsulta, 'q'> = {}, cursor?: string) => {
+    const params = new URLSearchParams({ q });
+    Object.entries(filtros).forEach(([key, value]) => {
+      if (value) params.append(key, String(value));
+    });
+    if (cursor) params.append('cursor', cursor);
+
+    const response = await api.get(`/queries/incidencias/buscar?${params}`);
+    return response.data;
+  },
+
   // Reportes
   getReporteDiario: async (fecha: string) => {
     const response = await api.get(`/reports/diario?fecha=${fecha}`);
@@ -46,6 +65,13 @@ export const incidenciasAPI = {
     return response.data;
   },
 
+  getTendencia: async (dias: number, granularidad: 'dia' | 'semana' | 'mes' | 'trimestre' = 'dia', fechaFin?: string) => {
+    const params = new URLSearchParams({ dias: String(dias), granularidad });
+    if (fechaFin) params.append('fecha_fin', fechaFin);
+    const response = await api.get(`/reports/tendencia?${params}`);
+    return response.data;
+  },
+
   getTendenciasMensuales: async (año: number) => {
     const response = await api.get(`/queries/tendencias/mensuales?año=${año}`);
     return response.data;
@@ -60,6 +86,66 @@ export const incidenciasAPI = {
     const response = await api.get(`/reports/comparativo?fecha1=${fecha1}&fecha2=${fecha2}`);
     return response.data;
   },
+
+  // URL de descarga del libro .xlsx (el navegador la abre directamente, sin pasar por axios)
+  getUrlExportacion: (
+    reportes: ('diario' | 'comparativo' | 'tendencia')[],
+    opciones: {
+      fecha?: string;
+      fecha1?: string;
+      fecha2?: string;
+      fechaFin?: string;
+      dias?: number;
+      granularidad?: 'dia' | 'semana' | 'mes' | 'trimestre';
+      incidencias?: boolean;
+    } = {}
+  ): string => {
+    const params = new URLSearchParams({ reportes: reportes.join(',') });
+    if (opciones.fecha) params.append('fecha', opciones.fecha);
+    if (opciones.fecha1) params.append('fecha1', opciones.fecha1);
+    if (opciones.fecha2) params.append('fecha2', opciones.fecha2);
+    if (opciones.fechaFin) params.append('fecha_fin', opciones.fechaFin);
+    if (opciones.dias) params.append('dias', String(opciones.dias));
+    if (opciones.granularidad) params.append('granularidad', opciones.granularidad);
+    if (opciones.incidencias) params.append('incidencias', 'true');
+    return `${API_BASE_URL}/reports/exportar?${params}`;
+  },
+
+  getPivot: async (
+    dimensiones: DimensionPivot[],
+    filtros: Partial<Record<DimensionPivot, string[]>> = {},
+    fechaInicio?: string,
+    fechaFin?: string,
+    limite?: number
+  ): Promise<PivotResponse> => {
+    const params = new URLSearchParams({ dimensiones: dimensiones.join(',') });
+    Object.entries(filtros).forEach(([dimension, valores]) =>
+      (valores || []).forEach((valor) => params.append(dimension, valor))
+    );
+    if (fechaInicio) params.append('fecha_inicio', fechaInicio);
+    if (fechaFin) params.append('fecha_fin', fechaFin);
+    if (limite) params.append('limite', String(limite));
+    const response = await api.get(`/reports/pivot?${params}`);
+    return response.data;
+  },
+
+  getRetrasos: async (
+    agrupar: AgrupacionRetraso,
+    filtros: Partial<Record<'troncal' | 'empresa' | 'turno' | 'tipo_dia', string[]>> = {},
+    fechaInicio?: string,
+    fechaFin?: string,
+    limite?: number
+  ): Promise<RetrasosResponse> => {
+    const params = new URLSearchParams({ agrupar });
+    Object.entries(filtros).forEach(([dimension, valores]) =>
+      (valores || []).forEach((valor) => params.append(dimension, valor))
+    );
+    if (fechaInicio) params.append('fecha_inicio', fechaInicio);
+    if (fechaFin) params.append('fecha_fin', fechaFin);
+    if (limite) params.append('limite', String(limite));
+    const response = await api.get(`/reports/retrasos?${params}`);
+    return response.data;
+  },
 };
 
 export default api;
\ No newline at end of file
@@ -24,6 +24,8 @@ export interface FiltrosConsulta {
   empresa?: string;
   tipo_incidencia?: string;
   turno?: string;
+  // Texto libre sin distinguir tildes ni mayúsculas
+  q?: string;
 }
 
 export interface EstadisticasDiarias {
@@ -38,6 +40,48 @@ export interface TendenciaMensual {
   año: number;
   tendencias: Array<{ mes: number; total: number }>;
 }
+
+export type DimensionPivot =
+  | 'troncal'
+  | 'empresa'
+  | 'turno'
+  | 'tipo_dia'
+  | 'incidencia_primaria'
+  | 'codigo_de_ruta'
+  | 'codigo_de_conductor'
+  | 'fecha'
+  | 'mes'
+  | 'anio';
+
+export interface PivotResponse {
+  dimensiones: DimensionPivot[];
+  total: number;
+  grupos: number;
+  filas: Array<Partial<Record<DimensionPivot, string | number | null>> & { total: number }>;
+  filas_en_memoria: number;
+  milisegundos: number;
+}
+
+export type AgrupacionRetraso = 'ruta' | 'troncal' | 'turno' | 'dia' | 'conductor' | 'empresa';
+
+export interface RetrasosResponse {
+  agrupacion: AgrupacionRetraso;
+  fuente: 'postgresql' | 'analitica';
+  dimensiones: DimensionPivot[];
+  columna: string;
+  total: number;
+  grupos: number;
+  // Segundos de hora_real - hora_programada (negativo = adelanto)
+  filas: Array<Partial<Record<DimensionPivot, string | null>> & {
+    n: number;
+    promedio: number;
+    p50: number;
+    p90: number;
+    p99: number;
+  }>;
+  filas_en_memoria?: number;
+  milisegundos?: number;
+}
 export interface Usuario {
   id: number;
   email: string;